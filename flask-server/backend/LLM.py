@@ -1,33 +1,415 @@
-import ast
+import asyncio
 import re
 import os
 import time
-import torch
+import threading
+from contextlib import aclosing, asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from .models.model_factory import ModelFactory
-
-# Check for GPU availability
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {DEVICE}")
+from .llm_cache import ResponseCache, canonical_request, file_fingerprint, make_key
+from .stream_parser import FinalOutputParser, parse_final_output
+from .schemas import RECIPE_LIST_SCHEMA, RECIPE_SCHEMA, parse_json, repair_prompt
+from .singleflight import SingleFlight
+from .prompts import PromptRegistry
+from . import admission, cancellation, metrics, progress
 
 start_time = time.time()
-STEPS = 0
-PROGRESS = 0
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 system_prompt_path = os.path.join(current_dir, 'system_prompt')
 system_prompt2_path = os.path.join(current_dir, 'system_prompt2')
 
+_device = None
+
+
+def get_device() -> str:
+    """Return "cuda" or "cpu". torch is only imported the first time this is called."""
+    global _device
+    if _device is None:
+        try:
+            import torch
+            _device = "cuda" if torch.cuda.is_available() else "cpu"
+        except ImportError:
+            _device = "cpu"
+    return _device
+
+
 # Initialize the AI model and handle potential initialization errors
 try:
-    model = ModelFactory.create_model(device=DEVICE)
-    if DEVICE == "cuda":
-        print(f"Successfully initialized AI model on GPU: {torch.cuda.get_device_name(0)}")
-    else:
-        print("Successfully initialized AI model on CPU")
+    model = ModelFactory.create_model()
+    print(f"Successfully initialized AI model: {model.provider}")
 except Exception as e:
     print(f"Error initializing AI model: {e}")
     raise
 
+# System prompts, loaded once; LLM_PROMPT_VARIANT=compact sends condensed instructions and
+# LLM_PROMPT_FEW_SHOT worked examples
+prompts = PromptRegistry(
+    current_dir,
+    variant=os.getenv('LLM_PROMPT_VARIANT', 'full'),
+    few_shot=int(os.getenv('LLM_PROMPT_FEW_SHOT')) if os.getenv('LLM_PROMPT_FEW_SHOT') else None
+)
+
+# Two-tier response cache (in-process LRU + SQLite), invalidated when the system prompts change
+if os.getenv('LLM_CACHE_ENABLED', '1') != '0':
+    response_cache = ResponseCache(
+        path=os.getenv('LLM_CACHE_PATH', os.path.join(current_dir, 'cache', 'llm_cache.sqlite3')),
+        max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1024')),
+        ttl=float(os.getenv('LLM_CACHE_TTL', '86400')),
+        watched_files=prompts.paths(),
+        flush_interval=float(os.getenv('LLM_CACHE_FLUSH_INTERVAL', '1'))
+    )
+else:
+    response_cache = None
+
+# Semantic cache: serve recipes generated for similar, constraint-compatible requests
+SEMANTIC_NAMESPACES = ('create_recipe_list', 'write_recipe')
+if os.getenv('SEMANTIC_CACHE_ENABLED', '0') == '1':
+    from .semantic_cache import SemanticCache
+    semantic_cache = SemanticCache(
+        path=os.getenv('SEMANTIC_CACHE_PATH', os.path.join(current_dir, 'cache', 'semantic_cache.npz')),
+        threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.85')),
+        max_entries=int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '5000')),
+        ttl=float(os.getenv('LLM_CACHE_TTL', '86400')),
+        save_interval=float(os.getenv('SEMANTIC_CACHE_SAVE_INTERVAL', '5'))
+    )
+    if response_cache is not None:
+        response_cache.on_invalidate(lambda fingerprint: semantic_cache.invalidate())
+else:
+    semantic_cache = None
+_prompt_fingerprint = file_fingerprint(prompts.paths())
+
+CACHE_EVENTS = metrics.REGISTRY.register(metrics.Gauge(
+    'llm_cache_events', 'Response cache lookups and writes since startup', ('event',)))
+SEMANTIC_CACHE_EVENTS = metrics.REGISTRY.register(metrics.Gauge(
+    'llm_semantic_cache_events', 'Semantic cache lookups by result since startup', ('event',)))
+
+
+def _collect_cache_stats():
+    if response_cache is not None:
+        stats = response_cache.get_stats()
+        for event in ('memory_hits', 'disk_hits', 'misses', 'sets', 'invalidations'):
+            CACHE_EVENTS.set(stats[event], event=event)
+    if semantic_cache is not None:
+        stats = semantic_cache.get_stats()
+        for event in ('hits', 'misses', 'incompatible', 'sets'):
+            SEMANTIC_CACHE_EVENTS.set(stats[event], event=event)
+
+
+metrics.REGISTRY.add_collector(_collect_cache_stats)
+
+
+def _cache_key(namespace, *parts):
+    return make_key(namespace, model.provider, getattr(model, 'model', ''), response_cache.fingerprint,
+                    prompts.signature, *parts)
+
+
+def _semantic_scope():
+    fingerprint = response_cache.fingerprint if response_cache is not None else _prompt_fingerprint
+    return f"{model.provider}:{getattr(model, 'model', '')}:{fingerprint}:{prompts.signature}"
+
+
+def _cache_get(namespace, *parts):
+    cached = None
+    if response_cache is not None:
+        response_cache.check_watched_files()
+        cached = response_cache.get(_cache_key(namespace, *parts))
+    if cached is None and semantic_cache is not None and namespace in SEMANTIC_NAMESPACES:
+        cached = semantic_cache.get(namespace, parts[0], scope=_semantic_scope())
+    return cached
+
+
+def _cache_set(namespace, value, *parts):
+    if not value:
+        return
+    if response_cache is not None:
+        response_cache.set(_cache_key(namespace, *parts), value)
+    if semantic_cache is not None and namespace in SEMANTIC_NAMESPACES:
+        semantic_cache.set(namespace, parts[0], value, scope=_semantic_scope())
+
+
+# Stream responses into the incremental parser so generation stops at </final_output>
+STREAM_PARSE = os.getenv('LLM_STREAM_PARSE', '1') != '0'
+
+# Ask providers for schema-constrained JSON, repairing invalid output instead of regenerating
+STRUCTURED_OUTPUT = os.getenv('LLM_STRUCTURED_OUTPUT', '0') == '1'
+STRUCTURED_MAX_REPAIRS = int(os.getenv('LLM_STRUCTURED_MAX_REPAIRS', '2'))
+
+# Start writing recipes while the recipe list is still streaming
+PIPELINE = os.getenv('LLM_PIPELINE', '1') != '0'
+
+# Model calls needed per request, by pipeline stage: {stage: {attempts: count}}
+RETRY_STATS = {}
+_retry_stats_lock = threading.Lock()
+
+
+def _model_labels() -> dict:
+    """Provider and model labels of pipeline metrics."""
+    return {'provider': model.provider, 'model': getattr(model, 'model', '')}
+
+
+def record_attempts(stage: str, attempts: int, success: bool):
+    """Record how many model calls a request needed."""
+    with _retry_stats_lock:
+        stats = RETRY_STATS.setdefault(stage, {'attempts': {}, 'requests': 0, 'failures': 0})
+        stats['attempts'][attempts] = stats['attempts'].get(attempts, 0) + 1
+        stats['requests'] += 1
+        if not success:
+            stats['failures'] += 1
+    metrics.LLM_ATTEMPTS.observe(attempts, stage=stage, outcome='ok' if success else 'failed', **_model_labels())
+
+
+def get_retry_stats() -> dict:
+    """Return per-stage request counts, failures and p50/p99 of model calls per request."""
+    with _retry_stats_lock:
+        snapshot = {stage: {'attempts': dict(stats['attempts']), 'requests': stats['requests'],
+                            'failures': stats['failures']}
+                    for stage, stats in RETRY_STATS.items()}
+
+    for stats in snapshot.values():
+        ordered = sorted(stats['attempts'].items())
+        for name, quantile in (('p50', 0.5), ('p99', 0.99)):
+            threshold = quantile * stats['requests']
+            seen = 0
+            for attempts, count in ordered:
+                seen += count
+                if seen >= threshold:
+                    stats[name] = attempts
+                    break
+    return snapshot
+
+
+# Concurrent identical requests share one generation
+recipe_flights = SingleFlight('llm')
+
+
+def _flight_key(stage, request_key):
+    return make_key(stage, model.provider, getattr(model, 'model', ''), request_key)
+
+
+def _do_flight(key, fn, *args):
+    """recipe_flights.do(), running the call again if it was shared with a request that got cancelled."""
+    while True:
+        try:
+            return recipe_flights.do(key, fn, *args)
+        except cancellation.Cancelled:
+            cancellation.check()
+
+
+async def _ado_flight(key, factory):
+    """Async version of _do_flight()."""
+    while True:
+        try:
+            return await recipe_flights.ado(key, factory)
+        except cancellation.Cancelled:
+            cancellation.check()
+
+
+# Upper bound on concurrent chat calls per provider, e.g. OLLAMA_MAX_IN_FLIGHT=2
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', '4'))
+
+
+def max_in_flight(provider: str) -> int:
+    value = os.getenv(f'{provider.upper()}_MAX_IN_FLIGHT')
+    try:
+        return max(1, int(value)) if value else max(1, DEFAULT_MAX_IN_FLIGHT)
+    except ValueError:
+        print(f"Invalid {provider.upper()}_MAX_IN_FLIGHT value: {value}")
+        return max(1, DEFAULT_MAX_IN_FLIGHT)
+
+
+def _provider_limiter(provider: str) -> admission.AdaptiveLimiter:
+    """
+    Admission control of a provider's chat calls, shared by the sync and async pipelines
+
+    At most max_in_flight(provider) calls run at once. With <PROVIDER>_QUEUE_BUDGET
+    set, calls are rejected once the expected wait in line exceeds it (seconds); off
+    by default, since a request's own recipe writes queue behind each other. With
+    ADMISSION_ADAPTIVE=1 the limit adapts to <PROVIDER>_LATENCY_TARGET (default 30s).
+    """
+    return admission.limiter(provider, max_in_flight(provider), latency_target=30)
+
+
+def _raise_if_cancelled(token):
+    """Stop the current model call if its request was cancelled."""
+    if token is not None and token.cancelled:
+        metrics.LLM_CANCELLED.inc(stage=metrics.current_stage.get())
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def _in_flight_slot(provider: str, token=None):
+    """Hold one of the provider's in-flight slots, giving up while waiting if the request is cancelled."""
+    with _provider_limiter(provider).slot(lambda: _raise_if_cancelled(token)):
+        _raise_if_cancelled(token)
+        yield
+
+
+def _received(stream):
+    """Chunks of a model stream; one that fails mid-way ends with the chunks received, to be parsed or retried."""
+    try:
+        yield from stream
+    except cancellation.Cancelled:
+        raise
+    except Exception as e:
+        print(f"Model stream failed: {e}")
+
+
+def chat(messages, on_token=None, use_cache=False, parser=None):
+    """
+    Send messages to the model, respecting the provider's max-in-flight limit.
+
+    When on_token is given the response is streamed and on_token is called with
+    every chunk as it arrives; the full response is still returned.
+    When parser (a FinalOutputParser) is given the response is streamed into it and
+    the generation is stopped as soon as the parser has seen the complete final output.
+    With use_cache, a response stored by remember_chat() for the same messages is returned instead.
+    If the current request is cancelled (see cancellation), the call raises Cancelled
+    instead of waiting for a slot, and a streamed generation is stopped at the next chunk.
+    """
+    if use_cache:
+        cached = _cache_get('chat', messages)
+        if cached is not None:
+            if parser is not None:
+                parser.feed(cached)
+            return cached
+
+    token = cancellation.current()
+    with _in_flight_slot(model.provider, token):
+        if on_token is None and (parser is None or not STREAM_PARSE):
+            response = model.chat(messages)
+            if parser is not None:
+                parser.feed(response)
+            return response
+
+        chunks = []
+        stream = model.stream(messages)
+        try:
+            for chunk in _received(stream):
+                _raise_if_cancelled(token)
+                chunks.append(chunk)
+                if on_token is not None:
+                    on_token(chunk)
+                if parser is not None and parser.feed(chunk):
+                    # Final output complete (or invalid): stop generating
+                    break
+        finally:
+            stream.close()
+        return ''.join(chunks)
+
+
+# The retry, parse, record and cache logic of a generation is written once, as a
+# generator of model calls: it yields ('structured', messages, schema, name) or
+# ('chat', messages, use_cache, parser) and is sent each response. _run() makes the
+# calls with chat() for the sync pipeline, _arun() with achat() for the async one.
+
+def _structured_steps(messages, schema, name):
+    """
+    Steps generating a JSON object matching schema.
+
+    Invalid output is not regenerated from scratch: the model is re-prompted with
+    its previous output and the validation errors, up to STRUCTURED_MAX_REPAIRS times.
+    Returns (value, attempts): value is None if no valid output was produced.
+    """
+    messages = list(messages)
+    attempts = 0
+    while attempts <= STRUCTURED_MAX_REPAIRS:
+        attempts += 1
+        progress.step()
+
+        raw = yield 'structured', messages, schema, name
+        value, errors = parse_json(raw, schema)
+        if not errors:
+            return value, attempts
+
+        print(f"Invalid structured {name} (attempt {attempts}): {errors[:3]}")
+        metrics.LLM_PARSE_FAILURES.inc(stage=metrics.current_stage.get(), **_model_labels())
+        if not raw:
+            break
+        messages = messages + [
+            {'role': 'assistant', 'content': raw},
+            {'role': 'user', 'content': repair_prompt(errors)}
+        ]
+
+    return None, attempts
+
+
+def _generation_steps(stage, messages, request_key, schema, name, new_parser, failed, field=None):
+    """
+    Steps of a pipeline stage: structured output if the model supports it (its
+    `field` if given), else free-text generations parsed by new_parser() until one
+    parses (at most 10). The value is cached and the attempts recorded; returns
+    the value, or `failed`.
+    """
+    attempts = 0
+    if STRUCTURED_OUTPUT and model.supports_structured_output:
+        value, attempts = yield from _structured_steps(messages, schema, name)
+        if value is not None:
+            value = value[field] if field else value
+            record_attempts(stage, attempts, True)
+            _cache_set(stage, value, request_key)
+            return value
+        print("Structured output failed, falling back to free-text generation")
+
+    count = 0
+    while count < 10:
+        count += 1
+        progress.step()
+
+        parser = new_parser()
+        response = yield 'chat', messages, count == 1, parser
+        if not response:
+            print("No response from model")
+            continue
+
+        value = parser.result()
+        if value is None:
+            print(f"Could not parse {name}: {parser.error}")
+            print(f"Response was: {response[:200]}...")  # Print first 200 chars of response
+            metrics.LLM_PARSE_FAILURES.inc(stage=stage, **_model_labels())
+            continue
+
+        remember_chat(messages, response)
+        record_attempts(stage, attempts + count, True)
+        _cache_set(stage, value, request_key)
+        return value
+
+    record_attempts(stage, attempts + count, False)
+    return failed
+
+
+def _run(steps, on_token=None):
+    """Make the model calls of steps (see _generation_steps) with the sync pipeline; returns their result."""
+    try:
+        step = next(steps)
+        while True:
+            if step[0] == 'structured':
+                _, messages, schema, name = step
+                with _in_flight_slot(model.provider, cancellation.current()):
+                    response = model.chat_structured(messages, schema, name=name)
+            else:
+                _, messages, use_cache, parser = step
+                response = chat(messages, on_token=on_token, use_cache=use_cache, parser=parser)
+            step = steps.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+def generate_structured(messages, schema, name):
+    """
+    Generate a JSON object matching schema (see _structured_steps).
+
+    Returns:
+        (value, attempts): value is None if no valid output was produced
+    """
+    return _run(_structured_steps(messages, schema, name))
+
+
+def remember_chat(messages, response):
+    """Cache a chat response once it has been parsed successfully."""
+    _cache_set('chat', response, messages)
+
+
 # Function to extract recipe content from XML-like or formatted content
 def extract_recipe(xml_content, pattern):
     match = re.search(pattern, xml_content, re.DOTALL)
@@ -40,54 +422,32 @@ def extract_recipe(xml_content, pattern):
 
 # Function to parse a list of recipes from content
 def parse_recipe_list(xml_content):
-    try:
-        dict_strs = extract_recipe(xml_content, r'<final_output>([\s\S]*?)</final_output>')
-        recipe_list = []
-        for dict_single in ast.literal_eval(dict_strs):
-            recipe_list.append(dict_single)
-    except:
-        try:
-            dict_strs = extract_recipe(xml_content, r'python([\s\S] * ?)')
-            recipe_list = []
-            for dict_single in ast.literal_eval(dict_strs):
-                recipe_list.append(dict_single)
-        except:
-            try:
-                dict_strs = extract_recipe(xml_content, r'([\s\S] * ?)')
-                recipe_list = []
-                for dict_single in ast.literal_eval(dict_strs):
-                    recipe_list.append(dict_single)
-            except:
-                try:
-                    dict_strs = '[' + extract_recipe(xml_content, r'\[(.*?)\]') + ']'
-                    recipe_list = []
-                    for dict_single in ast.literal_eval(dict_strs):
-                        recipe_list.append(dict_single)
-                except:
-                    return None
-    return recipe_list
+    return parse_final_output(xml_content, 'list')
 
 
 # Optional: Convert the extracted content into an actual dictionary
 def parse_recipe_dict(xml_content):
-    dict_str = extract_recipe(xml_content, r'<final_output>\s*({[\s\S]*?})\s*</final_output>')
-    if dict_str:
-        try:
-            return eval(dict_str)  # Caution: Use eval() only with trusted input
-        except:
-            return None
-    return None
+    return parse_final_output(xml_content, 'dict')
 
 
-# Function to create a recipe dictionary
-def write_recipe(name: str, description: str, ingredients: list[str] = None, cost: int = 0, cuisine: str = None,
-                 serving_size: int = 0, meal_type: str = None,
-                 allergies=None, diet: str = None) -> dict[str, str]:
-    if allergies is None:
-        allergies = ['None']
+def is_recipe_summary(recipe) -> bool:
+    """Check an entry of the recipe list: {'recipe': str, 'description': str}."""
+    return (isinstance(recipe, dict)
+            and isinstance(recipe.get('recipe'), str)
+            and isinstance(recipe.get('description'), str))
+
+
+def is_recipe(recipe) -> bool:
+    """Check a written recipe: {'ingredients': list, 'instructions': list}."""
+    return (isinstance(recipe, dict)
+            and isinstance(recipe.get('ingredients'), list)
+            and isinstance(recipe.get('instructions'), list))
+
 
-    with open(system_prompt_path, 'r') as f:
-        system_prompt = {'role': 'system', 'content': str(f.read())}
+def recipe_messages(name, description, ingredients=None, cost=0, cuisine=None, serving_size=0, meal_type=None,
+                    allergies=None, diet=None):
+    """Build the [system, user] messages for write_recipe."""
+    system_prompt = {'role': 'system', 'content': prompts.system('write_recipe')}
 
     user_prompt = {'role': 'user', 'content': f"Recipe Name: {name}; "
                                               f"Description: {description}; "
@@ -99,36 +459,13 @@ def write_recipe(name: str, description: str, ingredients: list[str] = None, cos
                                               f"{'Allergies: ' + ', '.join(allergies) + '; ' if allergies else ''}"
                                               f"{'Diet: ' + diet + '; ' if diet else ''}"}
 
-    count = 0
-    while count < 10:
-        count += 1
-        global STEPS
-        STEPS += 1
-        
-        response = model.chat([system_prompt, user_prompt])
-        
-        try:
-            recipe_dict = parse_recipe_dict(response)
-            assert isinstance(recipe_dict, dict)
-            assert isinstance(recipe_dict['ingredients'], list)
-            assert isinstance(recipe_dict['instructions'], list)
-            return recipe_dict
-        except Exception as e:
-            print(f"Error parsing recipe: {e}")
-            pass
-
-    return False
+    return [system_prompt, user_prompt]
 
 
-# Function to create a list of recipes
-def create_recipe_list(ingredients: list[str] = None, cost: int = 0, cuisine: str = None, serving_size: int = 0,
-                       meal_type: str = None,
-                       allergies=None, diet: str = None) -> list[dict[str, str]]:
-    if allergies is None:
-        allergies = ['None']
-
-    with open(system_prompt2_path, 'r') as f:
-        system_prompt = {'role': 'system', 'content': str(f.read())}
+def recipe_list_messages(ingredients=None, cost=0, cuisine=None, serving_size=0, meal_type=None,
+                         allergies=None, diet=None):
+    """Build the [system, user] messages for create_recipe_list."""
+    system_prompt = {'role': 'system', 'content': prompts.system('create_recipe_list')}
 
     # Capture ingredients passed from Flask as a list of strings
     user_prompt = {'role': 'user', 'content': f"The ingredients are: {', '.join(ingredients)}; "
@@ -139,47 +476,458 @@ def create_recipe_list(ingredients: list[str] = None, cost: int = 0, cuisine: st
                                               f"{'Allergies: ' + ', '.join(allergies) + '; ' if allergies else ''}"
                                               f"{'Diet: ' + diet + '; ' if diet else ''}"}
 
-    count = 0
-    while count < 10:
-        count += 1
-        global STEPS
-        STEPS += 1
+    return [system_prompt, user_prompt]
 
-        response = model.chat([system_prompt, user_prompt])
-        if not response:
-            print("No response from model")
-            continue
 
+def _write_recipe_steps(messages, request_key):
+    return _generation_steps('write_recipe', messages, request_key, RECIPE_SCHEMA, 'recipe',
+                             lambda: FinalOutputParser('dict', validate=is_recipe), False)
+
+
+def _write_recipe(messages, request_key, on_token=None):
+    """Generate a recipe for the given messages, retrying until it parses."""
+    return _run(_write_recipe_steps(messages, request_key), on_token)
+
+
+# Function to create a recipe dictionary
+def write_recipe(name: str, description: str, ingredients: list[str] = None, cost: int = 0, cuisine: str = None,
+                 serving_size: int = 0, meal_type: str = None,
+                 allergies=None, diet: str = None, on_token=None) -> dict[str, str]:
+    if allergies is None:
+        allergies = ['None']
+
+    request_key = canonical_request(ingredients, cost, cuisine, serving_size, meal_type, allergies, diet,
+                                    name=name, description=description)
+    cached = _cache_get('write_recipe', request_key)
+    if cached is not None:
+        return cached
+
+    messages = recipe_messages(name, description, ingredients, cost, cuisine, serving_size,
+                               meal_type, allergies, diet)
+
+    # Identical concurrent requests wait for the same generation
+    with metrics.stage('write_recipe'):
+        return _do_flight(_flight_key('write_recipe', request_key),
+                          _write_recipe, messages, request_key, on_token)
+
+
+def _list_parser(on_item=None):
+    """Parser of one recipe list attempt, calling on_item(entry, index) with positions in that attempt."""
+    parser = FinalOutputParser('list', validate=is_recipe_summary)
+    if on_item is not None:
+        parser.on_item = lambda item: on_item(item, len(parser.items) - 1)
+    return parser
+
+
+def _recipe_list_steps(messages, request_key, on_item=None):
+    return _generation_steps('create_recipe_list', messages, request_key, RECIPE_LIST_SCHEMA, 'recipe_list',
+                             lambda: _list_parser(on_item), [], field='recipes')
+
+
+def _create_recipe_list(messages, request_key, on_token=None, on_item=None):
+    """Generate a recipe list for the given messages, retrying until it parses."""
+    return _run(_recipe_list_steps(messages, request_key, on_item), on_token)
+
+
+# Function to create a list of recipes
+def create_recipe_list(ingredients: list[str] = None, cost: int = 0, cuisine: str = None, serving_size: int = 0,
+                       meal_type: str = None,
+                       allergies=None, diet: str = None, on_token=None, on_item=None) -> list[dict[str, str]]:
+    """
+    Generate a list of recipe summaries.
+
+    on_item, if given, is called as on_item(entry, index) with every entry as soon as
+    it has been streamed and validated, before the list is complete; index is its
+    position in the list of that attempt. Entries of attempts that later fail to
+    parse are reported too, so the returned list is authoritative.
+    """
+    if allergies is None:
+        allergies = ['None']
+
+    request_key = canonical_request(ingredients, cost, cuisine, serving_size, meal_type, allergies, diet)
+    cached = _cache_get('create_recipe_list', request_key)
+    if cached is not None:
+        return cached
+
+    messages = recipe_list_messages(ingredients, cost, cuisine, serving_size, meal_type,
+                                    allergies, diet)
+
+    # Identical concurrent requests wait for the same generation
+    with metrics.stage('create_recipe_list'):
+        return _do_flight(_flight_key('create_recipe_list', request_key),
+                          _create_recipe_list, messages, request_key, on_token, on_item)
+
+
+def _format_recipe(recipe_info, recipe):
+    if not recipe:
+        return None
+    return {
+        "name": recipe_info['recipe'],
+        "description": recipe_info['description'],
+        "ingredients": recipe['ingredients'],
+        "instructions": recipe['instructions']
+    }
+
+
+def _write_entry(recipe_info, request, on_token=None):
+    """Write the recipe of one recipe list entry; None on failure."""
+    try:
+        recipe = write_recipe(name=recipe_info['recipe'], description=recipe_info['description'],
+                              on_token=on_token, **request)
+        return _format_recipe(recipe_info, recipe)
+    except (cancellation.Cancelled, admission.Rejected):
+        raise
+    except Exception as e:
+        print(f"Error writing recipe: {e}")
+        return None
+
+
+# Function to write every recipe of a recipe list concurrently, yielding recipes as they finish
+def iter_recipes(recipe_list: list[dict[str, str]], ingredients: list[str] = None, cost: int = 0,
+                 cuisine: str = None, serving_size: int = 0, meal_type: str = None,
+                 allergies=None, diet: str = None, max_workers: int = None, on_token=None):
+    """
+    Write all recipes in recipe_list in parallel and yield (index, recipe) pairs in completion order.
+
+    index is the position in recipe_list; recipe is None when generation failed.
+    on_token, if given, is called as on_token(index, chunk) for every streamed chunk.
+    The number of concurrent model calls is bounded per provider (see max_in_flight).
+    Recipes not started yet are dropped when the generator is closed or the request
+    is cancelled; running ones stop at their next chunk.
+    """
+    if not recipe_list:
+        return
+
+    if max_workers is None:
+        max_workers = max_in_flight(model.provider)
+    max_workers = max(1, min(max_workers, len(recipe_list)))
+
+    request = dict(ingredients=ingredients, cost=cost, cuisine=cuisine, serving_size=serving_size,
+                   meal_type=meal_type, allergies=allergies, diet=diet)
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='write_recipe')
+    try:
+        futures = {cancellation.submit(executor, _write_entry, recipe_info, request,
+                                       (lambda chunk, index=index: on_token(index, chunk)) if on_token else None): index
+                   for index, recipe_info in enumerate(recipe_list)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Function to write every recipe of a recipe list concurrently
+def write_recipes(recipe_list: list[dict[str, str]], ingredients: list[str] = None, cost: int = 0,
+                  cuisine: str = None, serving_size: int = 0, meal_type: str = None,
+                  allergies=None, diet: str = None, max_workers: int = None) -> list[dict]:
+    """
+    Write all recipes in recipe_list in parallel.
+
+    Results keep the order of recipe_list; recipes that fail to generate are dropped.
+    """
+    results = [None] * len(recipe_list or [])
+    for index, recipe in iter_recipes(recipe_list, ingredients=ingredients, cost=cost, cuisine=cuisine,
+                                      serving_size=serving_size, meal_type=meal_type,
+                                      allergies=allergies, diet=diet, max_workers=max_workers):
+        results[index] = recipe
+
+    return [recipe for recipe in results if recipe]
+
+
+def _entry_key(recipe_info):
+    return recipe_info['recipe'], recipe_info['description']
+
+
+def iter_generated_recipes(ingredients: list[str] = None, cost: int = 0, cuisine: str = None,
+                           serving_size: int = 0, meal_type: str = None, allergies=None, diet: str = None,
+                           max_workers: int = None, on_token=None, pipelined: bool = None):
+    """
+    Create a recipe list and write its recipes.
+
+    Yields ('recipe_list', recipe_list) once the list is complete, then ('recipe', index, recipe)
+    in completion order, like iter_recipes(). on_token, if given, is called as
+    on_token(index, chunk) for every streamed chunk, with index None for the list.
+
+    With pipelined (default: LLM_PIPELINE), each recipe is started as soon as its
+    list entry has been streamed, so writing overlaps the list generation and the
+    first recipes are usually done about one list-generation call earlier.
+
+    When the request is cancelled (see cancellation), pending recipes are dropped,
+    running model calls stop at their next chunk and Cancelled is raised.
+    """
+    request = dict(ingredients=ingredients, cost=cost, cuisine=cuisine, serving_size=serving_size,
+                   meal_type=meal_type, allergies=allergies, diet=diet)
+    list_on_token = (lambda chunk: on_token(None, chunk)) if on_token else None
+    if not (PIPELINE if pipelined is None else pipelined):
+        recipe_list = create_recipe_list(on_token=list_on_token, **request)
+        yield 'recipe_list', recipe_list
+        for index, recipe in iter_recipes(recipe_list, max_workers=max_workers, on_token=on_token, **request):
+            yield 'recipe', index, recipe
+        return
+
+    if max_workers is None:
+        max_workers = max_in_flight(model.provider)
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='write_recipe')
+    futures = {}
+    lock = threading.Lock()
+
+    def dispatch(recipe_info, index):
+        # Keyed by position too, so tokens are always reported under the entry's final index
+        key = _entry_key(recipe_info), index
+        with lock:
+            if key not in futures:
+                futures[key] = cancellation.submit(
+                    executor, _write_entry, recipe_info, request,
+                    (lambda chunk: on_token(index, chunk)) if on_token else None)
+
+    try:
+        recipe_list = create_recipe_list(on_token=list_on_token, on_item=dispatch, **request)
+        # Entries that were not streamed (cache hits, coalesced or structured calls) start now
+        for index, recipe_info in enumerate(recipe_list or []):
+            dispatch(recipe_info, index)
+        yield 'recipe_list', recipe_list
+        if not recipe_list:
+            return
+
+        indexes = {futures[_entry_key(recipe_info), index]: index for index, recipe_info in enumerate(recipe_list)}
+        for future in futures.values():
+            if future not in indexes:
+                # Written for an attempt that failed to parse
+                future.cancel()
+        for future in as_completed(indexes):
+            yield 'recipe', indexes[future], future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_recipes(ingredients: list[str] = None, cost: int = 0, cuisine: str = None, serving_size: int = 0,
+                     meal_type: str = None, allergies=None, diet: str = None, pipelined: bool = None):
+    """
+    Create a recipe list and write every recipe of it.
+
+    Returns (recipe_list, recipes) with recipes in list order; recipes that fail to
+    generate are dropped. With pipelined (default: LLM_PIPELINE), recipes are
+    written while the list is still streaming.
+    """
+    recipe_list, results = [], []
+    for event in iter_generated_recipes(ingredients=ingredients, cost=cost, cuisine=cuisine,
+                                        serving_size=serving_size, meal_type=meal_type, allergies=allergies,
+                                        diet=diet, pipelined=pipelined):
+        if event[0] == 'recipe_list':
+            recipe_list = event[1] or []
+            results = [None] * len(recipe_list)
+        else:
+            results[event[1]] = event[2]
+    return recipe_list, [recipe for recipe in results if recipe]
+
+
+# Async pipeline: the same stages on top of BaseModel.achat()/astream(), so a
+# single event loop can multiplex many in-flight generations
+
+@asynccontextmanager
+async def _ain_flight_slot(provider: str, token=None):
+    """Async version of _in_flight_slot(); waiting is also interrupted by task cancellation."""
+    async with _provider_limiter(provider).aslot(lambda: _raise_if_cancelled(token)):
+        _raise_if_cancelled(token)
+        yield
+
+
+async def _areceived(stream):
+    """Async version of _received()."""
+    try:
+        async for chunk in stream:
+            yield chunk
+    except cancellation.Cancelled:
+        raise
+    except Exception as e:
+        print(f"Model stream failed: {e}")
+
+
+async def achat(messages, on_token=None, use_cache=False, parser=None):
+    """Async version of chat()."""
+    if use_cache:
+        cached = _cache_get('chat', messages)
+        if cached is not None:
+            if parser is not None:
+                parser.feed(cached)
+            return cached
+
+    token = cancellation.current()
+    async with _ain_flight_slot(model.provider, token):
+        if on_token is None and (parser is None or not STREAM_PARSE):
+            response = await model.achat(messages)
+            if parser is not None:
+                parser.feed(response)
+            return response
+
+        chunks = []
+        stream = model.astream(messages)
         try:
-            recipe_list_dict = parse_recipe_list(response)
-            if not recipe_list_dict:
-                print("Could not parse recipe list")
-                continue
-                
-            if not isinstance(recipe_list_dict, list):
-                print(f"Expected list but got {type(recipe_list_dict)}")
-                continue
-                
-            if not recipe_list_dict:
-                print("Empty recipe list")
-                continue
-                
-            if not isinstance(recipe_list_dict[0], dict):
-                print(f"Expected dict but got {type(recipe_list_dict[0])}")
-                continue
-                
-            if not all(isinstance(recipe.get('recipe'), str) and isinstance(recipe.get('description'), str) 
-                      for recipe in recipe_list_dict):
-                print("Invalid recipe format")
-                continue
-
-            return recipe_list_dict
-        except Exception as e:
-            print(f"Error parsing recipe list: {e}")
-            print(f"Response was: {response[:200]}...")  # Print first 200 chars of response
-            continue
+            async for chunk in _areceived(stream):
+                _raise_if_cancelled(token)
+                chunks.append(chunk)
+                if on_token is not None:
+                    on_token(chunk)
+                if parser is not None and parser.feed(chunk):
+                    break
+        finally:
+            await stream.aclose()
+        return ''.join(chunks)
+
+
+async def _arun(steps, on_token=None):
+    """Async version of _run()."""
+    try:
+        step = next(steps)
+        while True:
+            if step[0] == 'structured':
+                _, messages, schema, name = step
+                async with _ain_flight_slot(model.provider, cancellation.current()):
+                    response = await model.achat_structured(messages, schema, name=name)
+            else:
+                _, messages, use_cache, parser = step
+                response = await achat(messages, on_token=on_token, use_cache=use_cache, parser=parser)
+            step = steps.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+async def agenerate_structured(messages, schema, name):
+    """Async version of generate_structured()."""
+    return await _arun(_structured_steps(messages, schema, name))
+
+
+async def _awrite_recipe(messages, request_key, on_token=None):
+    """Async version of _write_recipe()."""
+    return await _arun(_write_recipe_steps(messages, request_key), on_token)
+
+
+async def awrite_recipe(name: str, description: str, ingredients: list[str] = None, cost: int = 0,
+                        cuisine: str = None, serving_size: int = 0, meal_type: str = None,
+                        allergies=None, diet: str = None, on_token=None) -> dict[str, str]:
+    """Async version of write_recipe()."""
+    if allergies is None:
+        allergies = ['None']
+
+    request_key = canonical_request(ingredients, cost, cuisine, serving_size, meal_type, allergies, diet,
+                                    name=name, description=description)
+    cached = _cache_get('write_recipe', request_key)
+    if cached is not None:
+        return cached
+
+    messages = recipe_messages(name, description, ingredients, cost, cuisine, serving_size, meal_type,
+                               allergies, diet)
+
+    with metrics.stage('write_recipe'):
+        return await _ado_flight(_flight_key('write_recipe', request_key),
+                                 lambda: _awrite_recipe(messages, request_key, on_token))
+
+
+async def _acreate_recipe_list(messages, request_key, on_token=None, on_item=None):
+    """Async version of _create_recipe_list()."""
+    return await _arun(_recipe_list_steps(messages, request_key, on_item), on_token)
+
+
+async def acreate_recipe_list(ingredients: list[str] = None, cost: int = 0, cuisine: str = None,
+                              serving_size: int = 0, meal_type: str = None,
+                              allergies=None, diet: str = None, on_token=None,
+                              on_item=None) -> list[dict[str, str]]:
+    """Async version of create_recipe_list()."""
+    if allergies is None:
+        allergies = ['None']
+
+    request_key = canonical_request(ingredients, cost, cuisine, serving_size, meal_type, allergies, diet)
+    cached = _cache_get('create_recipe_list', request_key)
+    if cached is not None:
+        return cached
+
+    messages = recipe_list_messages(ingredients, cost, cuisine, serving_size, meal_type, allergies, diet)
+
+    with metrics.stage('create_recipe_list'):
+        return await _ado_flight(_flight_key('create_recipe_list', request_key),
+                                 lambda: _acreate_recipe_list(messages, request_key, on_token, on_item))
+
+
+async def _awrite_entry(recipe_info, request, on_token=None):
+    """Async version of _write_entry()."""
+    try:
+        recipe = await awrite_recipe(name=recipe_info['recipe'], description=recipe_info['description'],
+                                     on_token=on_token, **request)
+        return _format_recipe(recipe_info, recipe)
+    except (cancellation.Cancelled, admission.Rejected):
+        raise
+    except Exception as e:
+        print(f"Error writing recipe: {e}")
+        return None
+
+
+async def awrite_recipes(recipe_list: list[dict[str, str]], ingredients: list[str] = None, cost: int = 0,
+                         cuisine: str = None, serving_size: int = 0, meal_type: str = None,
+                         allergies=None, diet: str = None) -> list[dict]:
+    """Async version of write_recipes(); concurrency is bounded by the per-provider limiter."""
+    request = dict(ingredients=ingredients, cost=cost, cuisine=cuisine, serving_size=serving_size,
+                   meal_type=meal_type, allergies=allergies, diet=diet)
+    results = await asyncio.gather(*(_awrite_entry(recipe_info, request) for recipe_info in recipe_list or []))
+    return [recipe for recipe in results if recipe]
+
+
+async def aiter_generated_recipes(ingredients: list[str] = None, cost: int = 0, cuisine: str = None,
+                                  serving_size: int = 0, meal_type: str = None, allergies=None, diet: str = None,
+                                  on_token=None, pipelined: bool = None):
+    """
+    Async version of iter_generated_recipes()
+
+    Recipes are written by tasks on the running loop instead of worker threads;
+    their concurrency is bounded by the per-provider limiter.
+    """
+    request = dict(ingredients=ingredients, cost=cost, cuisine=cuisine, serving_size=serving_size,
+                   meal_type=meal_type, allergies=allergies, diet=diet)
+    list_on_token = (lambda chunk: on_token(None, chunk)) if on_token else None
+    tasks = {}
+
+    def dispatch(recipe_info, index):
+        key = _entry_key(recipe_info), index
+        if key not in tasks:
+            tasks[key] = asyncio.ensure_future(_awrite_entry(
+                recipe_info, request, (lambda chunk: on_token(index, chunk)) if on_token else None))
+
+    try:
+        pipelined = PIPELINE if pipelined is None else pipelined
+        recipe_list = await acreate_recipe_list(on_token=list_on_token, on_item=dispatch if pipelined else None,
+                                                **request)
+        for index, recipe_info in enumerate(recipe_list or []):
+            dispatch(recipe_info, index)
+        yield 'recipe_list', recipe_list
+        if not recipe_list:
+            return
+
+        indexes = {tasks[_entry_key(recipe_info), index]: index for index, recipe_info in enumerate(recipe_list)}
+        pending = set(indexes)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield 'recipe', indexes[task], task.result()
+    finally:
+        # Writes not awaited anymore, or started for attempts that failed to parse
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+
 
-    return []
+async def agenerate_recipes(ingredients: list[str] = None, cost: int = 0, cuisine: str = None,
+                            serving_size: int = 0, meal_type: str = None,
+                            allergies=None, diet: str = None, pipelined: bool = None):
+    """Async version of generate_recipes(); returns (recipe_list, recipes)."""
+    recipe_list, results = [], []
+    async with aclosing(aiter_generated_recipes(ingredients=ingredients, cost=cost, cuisine=cuisine,
+                                                serving_size=serving_size, meal_type=meal_type,
+                                                allergies=allergies, diet=diet, pipelined=pipelined)) as events:
+        async for event in events:
+            if event[0] == 'recipe_list':
+                recipe_list = event[1] or []
+                results = [None] * len(recipe_list)
+            else:
+                results[event[1]] = event[2]
+    return recipe_list, [recipe for recipe in results if recipe]
 
 
 if __name__ == "__main__":
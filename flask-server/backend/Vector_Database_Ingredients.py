@@ -1,53 +1,40 @@
-import weaviate
-from weaviate.classes import config as wvcc
-from weaviate.classes.query import MetadataQuery
-from weaviate.collections.classes.filters import Filter
-import pandas as pd
 import yaml
 from typing import Dict, List, Any, Optional
 import atexit
+import time
+from .ingest import ingredient_ingestion
+from .snapshot import Snapshot, boot_collection
+from .vector_store import create_store
+
+# Properties embedded by the in-process vector store: lookups are by ingredient name
+VECTOR_PROPERTIES = ('ingredient',)
 
 class IngredientsDB:
     def __init__(self, collection_name: str = "Ingredients", schema_path: str = "schema.yaml"):
         """Initialize the ingredients database with error handling and connection management."""
+        started = time.perf_counter()
         try:
-            self.client = weaviate.connect_to_local()
+            self.store = create_store(collection_name.lower(), vector_properties=VECTOR_PROPERTIES)
             self.collection_name = collection_name
             self.schema_path = schema_path
+            # Throughput report of the last import, if this process ran one
+            self.ingest_report = None
+            self.snapshot = Snapshot(self.store)
             atexit.register(self.close)
             
-            self._ensure_collection()
+            self._ensure_collection(started)
             
         except Exception as e:
             print(f"Failed to initialize IngredientsDB: {e}")
             raise
 
-    def _ensure_collection(self) -> None:
-        """Ensure collection exists and is properly initialized."""
+    def _ensure_collection(self, started: Optional[float] = None) -> None:
+        """Ensure collection exists and is properly initialized (see snapshot.boot_collection)."""
         try:
-            collection_name = self.collection_name.lower()
-            
-            try:
-                # Try to get existing collection
-                self.collection = self.client.collections.get(collection_name)
-                print(f"Using existing collection: {collection_name}")
-                
-                # Check if collection has data
-                count = self.collection.query.fetch_objects(limit=1)
-                if hasattr(count, 'objects') and len(count.objects) > 0:
-                    print(f"Collection has existing data")
-                    return
-                
-                print("Collection exists but is empty")
-                
-            except weaviate.exceptions.UnexpectedStatusCodeError:
-                print("Collection does not exist")
-            
-            # Only create if collection doesn't exist or is empty
-            print("Creating new collection...")
-            self._create_collection()
-            self._initialize_data()
-            
+            # Existing collection, then the local snapshot, then an import
+            self.boot_report = boot_collection(self.store, ingredient_ingestion(self.store), self._create_collection,
+                                               self._initialize_data, self.sync, self.snapshot, started=started)
+
         except Exception as e:
             print(f"Error ensuring collection: {e}")
             raise
@@ -58,84 +45,48 @@ class IngredientsDB:
             with open(self.schema_path, 'r') as file:
                 schema = yaml.safe_load(file)
 
-            properties = [
-                wvcc.Property(name=prop['name'], data_type=wvcc.DataType.TEXT)
-                for prop in schema['properties']
-            ]
-
-            self.collection = self.client.collections.create(
-                name=self.collection_name.lower(),
-                vectorizer_config=wvcc.Configure.Vectorizer.text2vec_transformers(),
-                properties=properties
-            )
+            self.store.create([prop['name'] for prop in schema['properties']])
             print(f"Created collection: {self.collection_name}")
             
         except Exception as e:
             print(f"Error creating collection: {e}")
             raise
 
-    def _initialize_data(self) -> None:
-        """Initialize database with ingredient data."""
+    def _initialize_data(self, restart: bool = True) -> None:
+        """Initialize database with ingredient data, streamed by row group (see ingest.Ingestion)."""
         try:
             print("Loading data from HuggingFace...")
-            df = pd.read_parquet(
-                "hf://datasets/foodvisor-nyu/labeled-food-ingredients/data/train-00000-of-00001.parquet"
-            )
-            
-            ingredients_list = df.to_dict('records')
-            self._batch_import(ingredients_list)
-            
+            # restart=False resumes an interrupted import from its checkpoint
+            self.ingest_report = ingredient_ingestion(self.store).run(restart=restart)
+
         except Exception as e:
             print(f"Error initializing data: {e}")
             raise
 
-    def _batch_import(self, ingredients: List[Dict[str, Any]]) -> None:
-        """Import ingredients in batches with progress tracking."""
+    def sync(self) -> Dict[str, Any]:
+        """Apply the changes of the source dataset to the collection (see ingest.Ingestion.sync)."""
         try:
-            total = len(ingredients)
-            batch_size = 100
-            batches = (total + batch_size - 1) // batch_size
-
-            print(f"\nImporting {total} ingredients in {batches} batches:")
-
-            for i in range(batches):
-                start = i * batch_size
-                end = min(start + batch_size, total)
-                
-                with self.collection.batch.dynamic() as batch:
-                    for ingredient in ingredients[start:end]:
-                        cleaned = {
-                            k: str(v) if v is not None else ''
-                            for k, v in ingredient.items()
-                            if k in ['ingredient', 'class', 'reason', 'int_label', 'prompt']
-                        }
-                        batch.add_object(properties=cleaned)
-                
-                print(f"\rProgress: {((i + 1) / batches * 100):.1f}% ({end}/{total})", end='')
-            print("\nImport completed!")
-            
+            ingestion = ingredient_ingestion(self.store)
+            self.ingest_report = ingestion.sync()
+            self.snapshot.refresh(ingestion.source, self.ingest_report)
+            return self.ingest_report
         except Exception as e:
-            print(f"Error in batch import: {e}")
+            print(f"Error syncing collection: {e}")
             raise
 
     def search_similar_ingredients(self, ingredient: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Search for similar ingredients with error handling."""
         try:
-            response = self.collection.query.near_text(
-                query=ingredient,
-                limit=limit,
-                return_metadata=MetadataQuery(distance=True)
-            )
+            hits = self.store.near_text(ingredient, limit)
 
             results = []
-            if hasattr(response, 'objects'):
-                for obj in response.objects:
-                    results.append({
-                        "ingredient": obj.properties.get("ingredient", ""),
-                        "class": obj.properties.get("class", ""),
-                        "reason": obj.properties.get("reason", ""),
-                        "similarity_score": 1 - getattr(obj.metadata, 'distance', 0)
-                    })
+            for hit in hits:
+                results.append({
+                    "ingredient": hit['properties'].get("ingredient", ""),
+                    "class": hit['properties'].get("class", ""),
+                    "reason": hit['properties'].get("reason", ""),
+                    "similarity_score": 1 - hit['distance']
+                })
 
             return sorted(results, key=lambda x: x['similarity_score'], reverse=True)
             
@@ -146,8 +97,8 @@ class IngredientsDB:
     def close(self) -> None:
         """Safely close database connection."""
         try:
-            if hasattr(self, 'client'):
-                self.client.close()
+            if hasattr(self, 'store'):
+                self.store.close()
         except Exception as e:
             print(f"Error closing connection: {e}")
 
@@ -0,0 +1,312 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import REGISTRY, Counter, Gauge
+
+ADMISSION_LIMIT = REGISTRY.register(Gauge(
+    'admission_limit', 'Current concurrency limit per backend', ('backend',)))
+ADMISSION_IN_FLIGHT = REGISTRY.register(Gauge(
+    'admission_in_flight', 'Calls currently admitted per backend', ('backend',)))
+ADMISSION_QUEUED = REGISTRY.register(Gauge(
+    'admission_queued', 'Calls waiting for admission per backend', ('backend',)))
+ADMISSION_REJECTIONS = REGISTRY.register(Counter(
+    'admission_rejections_total', 'Calls rejected by admission control, by backend and reason',
+    ('backend', 'reason')))
+RATE_LIMITED = REGISTRY.register(Counter(
+    'rate_limited_requests_total', 'HTTP requests rejected by the per-client rate limit', ('route',)))
+
+# How often a waiting call re-checks its deadline and its request's cancel token
+POLL_INTERVAL = 0.1
+
+
+class Rejected(Exception):
+    """Raised when a call is not admitted; retry_after is a hint in seconds."""
+
+    def __init__(self, backend: str, reason: str, retry_after: float):
+        super().__init__(f"{backend} is overloaded ({reason}), retry in {math.ceil(retry_after)}s")
+        self.backend = backend
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"Invalid {name} value: {value}")
+        return default
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit of one backend, optionally adapted to its latency (AIMD)
+
+    At most `limit` calls run at once; the others wait in line. A call is
+    rejected at once when the expected wait for the calls ahead of it (at the
+    recent average latency) exceeds `queue_budget` seconds, and after waiting
+    that long in any case, so a spike fails fast instead of piling up.
+
+    With a `latency_target`, the limit grows by one call per window of calls
+    completing within the target (additive increase) and is cut by `backoff`
+    when a call is slower (multiplicative decrease, at most once per target
+    interval), between `min_limit` and `max_limit`. Failing backends are left
+    to the circuit breaker.
+    """
+
+    def __init__(self, name: str, max_limit: int, min_limit: int = 1, latency_target: Optional[float] = None,
+                 queue_budget: Optional[float] = None, backoff: float = 0.75):
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.latency_target = latency_target
+        self.queue_budget = queue_budget
+        self.backoff = backoff
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.queued = 0
+        self.average_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._waiters = set()
+        self.stats = {'admitted': 0, 'rejected': 0, 'increases': 0, 'decreases': 0}
+
+    def _try_admit(self) -> bool:
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self.stats['admitted'] += 1
+            return True
+        return False
+
+    def _expected_wait(self) -> float:
+        return (self.queued + 1) * (self.average_latency or 0.0) / max(1, int(self.limit))
+
+    def _reject(self, reason: str) -> Rejected:
+        self.stats['rejected'] += 1
+        ADMISSION_REJECTIONS.inc(backend=self.name, reason=reason)
+        return Rejected(self.name, reason, self._expected_wait())
+
+    def _enter_queue(self, wake: Callable[[], Any]) -> bool:
+        """Admit the call or put it in line (False); raise Rejected if the line is too long. Holds the lock."""
+        if not self.queued and self._try_admit():
+            return True
+        if self.queue_budget is not None and self._expected_wait() > self.queue_budget:
+            raise self._reject('queue_budget')
+        self.queued += 1
+        self._waiters.add(wake)
+        return False
+
+    def _leave_queue(self, wake: Callable[[], Any]) -> None:
+        self.queued -= 1
+        self._waiters.discard(wake)
+
+    def _deadline_passed(self, started: float) -> bool:
+        return self.queue_budget is not None and time.monotonic() - started > self.queue_budget
+
+    def acquire(self, check: Optional[Callable[[], Any]] = None) -> None:
+        """Wait for admission or raise Rejected; check, if given, is called while waiting and may raise to give up."""
+        started = time.monotonic()
+        event = threading.Event()
+        with self._lock:
+            if self._enter_queue(event.set):
+                return
+        try:
+            while True:
+                event.wait(POLL_INTERVAL)
+                event.clear()
+                if check is not None:
+                    check()
+                with self._lock:
+                    if self._try_admit():
+                        return
+                    if self._deadline_passed(started):
+                        raise self._reject('wait_timeout')
+        finally:
+            with self._lock:
+                self._leave_queue(event.set)
+
+    async def aacquire(self, check: Optional[Callable[[], Any]] = None) -> None:
+        """Async version of acquire(); waiting is also interrupted by task cancellation."""
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+
+        def wake():
+            loop.call_soon_threadsafe(woken.set)
+
+        with self._lock:
+            if self._enter_queue(wake):
+                return
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(woken.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                woken.clear()
+                if check is not None:
+                    check()
+                with self._lock:
+                    if self._try_admit():
+                        return
+                    if self._deadline_passed(started):
+                        raise self._reject('wait_timeout')
+        finally:
+            with self._lock:
+                self._leave_queue(wake)
+
+    def release(self, latency: float) -> None:
+        """Free the slot of a call that took `latency` seconds and adapt the limit."""
+        with self._lock:
+            self.in_flight -= 1
+            self.average_latency = (latency if self.average_latency is None
+                                    else 0.8 * self.average_latency + 0.2 * latency)
+            if self.latency_target is not None:
+                now = time.monotonic()
+                if latency <= self.latency_target:
+                    if self.limit < self.max_limit:
+                        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                        self.stats['increases'] += 1
+                elif now - self._last_decrease > self.latency_target:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+                    self.stats['decreases'] += 1
+            waiters = list(self._waiters)
+        for wake in waiters:
+            wake()
+
+    @contextmanager
+    def slot(self, check: Optional[Callable[[], Any]] = None):
+        """Hold one slot for the duration of the block."""
+        self.acquire(check)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def aslot(self, check: Optional[Callable[[], Any]] = None):
+        """Async version of slot()."""
+        await self.aacquire(check)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(limit=round(self.limit, 2), max_limit=self.max_limit, min_limit=self.min_limit,
+                         in_flight=self.in_flight, queued=self.queued, latency_target=self.latency_target,
+                         queue_budget=self.queue_budget,
+                         average_latency=round(self.average_latency, 4) if self.average_latency else None)
+        return stats
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(backend: str, max_limit: int, latency_target: Optional[float] = None,
+            queue_budget: Optional[float] = None) -> AdaptiveLimiter:
+    """
+    Return the process-wide limiter of a backend, creating it on first use
+
+    The arguments are defaults, overridden by <BACKEND>_LATENCY_TARGET and
+    <BACKEND>_QUEUE_BUDGET (seconds) and <BACKEND>_MIN_CONCURRENCY. Limits only
+    adapt with ADMISSION_ADAPTIVE=1; otherwise they stay at max_limit.
+    """
+    with _limiters_lock:
+        if backend not in _limiters:
+            prefix = backend.upper()
+            adaptive = os.getenv('ADMISSION_ADAPTIVE', '0') == '1'
+            _limiters[backend] = AdaptiveLimiter(
+                backend, max_limit,
+                min_limit=int(_env_float(f'{prefix}_MIN_CONCURRENCY', 1)),
+                latency_target=_env_float(f'{prefix}_LATENCY_TARGET', latency_target) if adaptive else None,
+                queue_budget=_env_float(f'{prefix}_QUEUE_BUDGET', queue_budget)
+            )
+        return _limiters[backend]
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.get_stats() for name, limiter in limiters.items()}
+
+
+def _collect_limiter_stats():
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    for limiter in limiters:
+        ADMISSION_LIMIT.set(int(limiter.limit), backend=limiter.name)
+        ADMISSION_IN_FLIGHT.set(limiter.in_flight, backend=limiter.name)
+        ADMISSION_QUEUED.set(limiter.queued, backend=limiter.name)
+
+
+REGISTRY.add_collector(_collect_limiter_stats)
+
+
+class TokenBucketLimiter:
+    """
+    Per-client token buckets refilled at `rate` tokens per second, holding at most `burst`
+
+    Buckets of the least recently seen clients are dropped beyond `max_clients`.
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client: str, cost: float = 1.0) -> float:
+        """Take cost tokens from the client's bucket; return 0 if allowed, else seconds until it would be."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+def rate_limiter(route: str) -> Optional[TokenBucketLimiter]:
+    """
+    Token bucket limiter for a class of routes, from RATE_LIMIT_<ROUTE>_PER_MINUTE
+
+    RATE_LIMIT_<ROUTE>_BURST (default: the per-minute rate) caps bursts. Returns
+    None when no rate is configured.
+    """
+    per_minute = _env_float(f'RATE_LIMIT_{route.upper()}_PER_MINUTE', None)
+    if not per_minute:
+        return None
+    return TokenBucketLimiter(per_minute / 60, _env_float(f'RATE_LIMIT_{route.upper()}_BURST', per_minute))
+
+
+def vector_db_limiter() -> AdaptiveLimiter:
+    """
+    Admission control of vector database queries
+
+    At most WEAVIATE_MAX_IN_FLIGHT (default 16) queries run at once; queries are
+    rejected once the expected wait exceeds WEAVIATE_QUEUE_BUDGET (default 5s),
+    and with ADMISSION_ADAPTIVE=1 the limit adapts to WEAVIATE_LATENCY_TARGET (default 0.5s).
+    """
+    return limiter('weaviate', int(os.getenv('WEAVIATE_MAX_IN_FLIGHT', '16')), latency_target=0.5, queue_budget=5)
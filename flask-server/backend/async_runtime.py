@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+
+class AsyncRuntime:
+    """
+    A single event loop running in a background thread
+
+    Synchronous code (e.g. Flask views) submits coroutines to it, so all async
+    model calls of the process share one loop and its pooled HTTP connections.
+    """
+
+    def __init__(self, name: str = 'async-runtime'):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self.loop is None:
+                ready = threading.Event()
+
+                def _run():
+                    self.loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(self.loop)
+                    ready.set()
+                    self.loop.run_forever()
+
+                self._thread = threading.Thread(target=_run, name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+        return self.loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the loop and return a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and wait for its result."""
+        return self.submit(coro).result(timeout)
+
+    def stop(self) -> None:
+        with self._lock:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self._thread.join(timeout=5)
+                self.loop = None
+
+
+runtime = AsyncRuntime()
+
+
+def run_async(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the shared runtime loop from synchronous code."""
+    return runtime.run(coro, timeout)
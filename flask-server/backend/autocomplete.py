@@ -0,0 +1,143 @@
+import bisect
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .metrics import DB_QUERY_LATENCY, REGISTRY, Counter as MetricCounter
+
+AUTOCOMPLETE_LOOKUPS = REGISTRY.register(MetricCounter(
+    'autocomplete_lookups_total', 'Ingredient suggestion lookups, by the source that answered them', ('source',)))
+
+
+def normalize(text: str) -> str:
+    """Case-fold and keep words only, so 'Garlic  Powder,' and 'garlic powder' match."""
+    return ' '.join(re.findall(r'[a-z0-9]+', str(text).casefold()))
+
+
+def _trigrams(text: str) -> List[str]:
+    # Padded at the start only: queries are prefixes, so their last trigram is not a word end
+    padded = f" {text}"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class AutocompleteIndex:
+    """
+    Lexical index of ingredient names for typeahead
+
+    Every name is indexed under each of its word starts ('black pepper' under
+    'black pepper' and 'pepper') in one sorted array, so a prefix is a bisected
+    range. Matches of the whole name rank before matches of a later word, then
+    by popularity (how often the name occurs in the catalog), then shortest
+    first. When the prefix matches fewer names than asked for, names sharing
+    enough character trigrams with the query are added, so typos like 'garlci'
+    still complete.
+    """
+
+    def __init__(self, names: Iterable[str], fuzzy_threshold: float = 0.5):
+        self.fuzzy_threshold = fuzzy_threshold
+        counts: Counter = Counter()
+        display: Dict[str, Counter] = {}
+        for name in names:
+            key = normalize(name)
+            if key:
+                counts[key] += 1
+                display.setdefault(key, Counter())[' '.join(str(name).split())] += 1
+
+        # Names in rank order: most popular first, then shortest, then alphabetical
+        self.names = sorted(counts, key=lambda key: (-counts[key], len(key), key))
+        self.display = [display[key].most_common(1)[0][0] for key in self.names]
+        self.popularity = [counts[key] for key in self.names]
+
+        entries = []
+        trigrams: Dict[str, List[int]] = {}
+        for rank, key in enumerate(self.names):
+            words = key.split(' ')
+            for start in range(len(words)):
+                entries.append((' '.join(words[start:]), 0 if start == 0 else 1, rank))
+            for trigram in set(_trigrams(key)):
+                trigrams.setdefault(trigram, []).append(rank)
+        entries.sort()
+        self._keys = [key for key, _, _ in entries]
+        # Sort order of a match: whole-name matches first, then by rank
+        self._order = np.array([tier * len(self.names) + rank for _, tier, rank in entries], dtype=np.int64)
+        self._trigrams = {trigram: np.array(ranks, dtype=np.int32) for trigram, ranks in trigrams.items()}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _prefix(self, query: str, limit: int) -> List[int]:
+        start = bisect.bisect_left(self._keys, query)
+        end = bisect.bisect_left(self._keys, query + '\uffff', start)
+        if start == end:
+            return []
+        order = self._order[start:end]
+        # A name matched by two of its words is listed twice; take enough to fill the limit
+        take = min(len(order), 2 * limit)
+        if take < len(order):
+            order = order[np.argpartition(order, take - 1)[:take]]
+        ranks = []
+        for position in np.sort(order):
+            rank = int(position % len(self.names))
+            if rank not in ranks:
+                ranks.append(rank)
+                if len(ranks) == limit:
+                    break
+        return ranks
+
+    def _fuzzy(self, query: str, limit: int, exclude: List[int]) -> List[int]:
+        query_trigrams = set(_trigrams(query))
+        postings = [self._trigrams[trigram] for trigram in query_trigrams if trigram in self._trigrams]
+        if not postings:
+            return []
+        overlap = np.bincount(np.concatenate(postings), minlength=len(self.names))
+        # Share of the query's trigrams found in the name
+        scores = overlap / len(query_trigrams)
+        scores[exclude] = 0
+        candidates = np.flatnonzero(scores >= self.fuzzy_threshold)
+        if not len(candidates):
+            return []
+        # Best score first; among equal scores the lower rank (more popular) first
+        best = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [int(rank) for rank in best[:limit]]
+
+    def suggest(self, query: str, limit: int = 5) -> List[str]:
+        """Up to limit ingredient names completing query, best first."""
+        query = normalize(query)
+        if not query or limit <= 0 or not self.names:
+            return []
+        ranks = self._prefix(query, limit)
+        if len(ranks) < limit and len(query) >= 3:
+            ranks += self._fuzzy(query, limit - len(ranks), ranks)
+        return [self.display[rank] for rank in ranks]
+
+    @classmethod
+    def from_store(cls, store, prop: str = 'ingredient', **kwargs) -> 'AutocompleteIndex':
+        """Index the values of one property over every object of a vector store."""
+        return cls((properties.get(prop, '') for properties in store.iter_objects()), **kwargs)
+
+
+def suggest_ingredients(index: Optional[AutocompleteIndex], search: Callable[[str, int], List[Dict]], query: str,
+                        limit: int = 5, min_hits: int = 3, collection: str = 'Ingredients') -> List[str]:
+    """
+    Ingredient names completing a partially typed query
+
+    The autocomplete index answers when it finds at least min(limit, min_hits)
+    names; otherwise its names are completed with the hits of search(query, limit),
+    a vector search of the ingredient collection.
+    """
+    names = []
+    if index is not None:
+        with DB_QUERY_LATENCY.time(collection=collection, operation='autocomplete'):
+            names = index.suggest(query, limit)
+        if len(names) >= min(limit, min_hits):
+            AUTOCOMPLETE_LOOKUPS.inc(source='index')
+            return names
+
+    AUTOCOMPLETE_LOOKUPS.inc(source='vector_search')
+    for hit in search(query, limit):
+        name = hit['properties'].get('ingredient')
+        if name and name.lower() not in (known.lower() for known in names):
+            names.append(name)
+    return names[:limit]
@@ -0,0 +1,168 @@
+import asyncio
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+from .metrics import REGISTRY, Counter
+
+REQUESTS_CANCELLED = REGISTRY.register(Counter(
+    'requests_cancelled_total', 'Generation requests cancelled, by reason', ('reason',)))
+
+_current = contextvars.ContextVar('cancel_token', default=None)
+
+
+class Cancelled(Exception):
+    """Raised inside a request's work once the request has been cancelled."""
+
+
+class CancelToken:
+    """
+    Cancellation flag of one request
+
+    Work checks the token between model calls and stream chunks; cancel() sets it
+    once and runs the registered callbacks (e.g. to cancel an asyncio task).
+    """
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], Any]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = 'cancelled') -> bool:
+        """Cancel the request; returns False if it was already cancelled."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        REQUESTS_CANCELLED.inc(reason=reason)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in cancel callback of request {self.request_id}: {e}")
+        return True
+
+    def on_cancel(self, callback: Callable[[], Any]) -> Callable[[], None]:
+        """Call callback when the token is cancelled (now, if it already is); returns a remover."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise Cancelled(f"Request {self.request_id} cancelled: {self.reason}")
+
+
+def current() -> Optional[CancelToken]:
+    """Token of the request being served by the calling thread or task, if any."""
+    return _current.get()
+
+
+def check() -> None:
+    """Raise Cancelled if the current request has been cancelled."""
+    token = _current.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def scope(token: Optional[CancelToken]):
+    """Make token the current cancel token inside the block."""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def submit(executor, fn: Callable[..., Any], *args, **kwargs):
+    """executor.submit() in a copy of the caller's context, so the cancel token and progress follow the work."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+async def bind(token: CancelToken, coro: Coroutine) -> Any:
+    """
+    Await coro with token as the current cancel token
+
+    Cancelling the token cancels the task awaiting bind(), so an async
+    generation stops at its next await instead of its next chunk; the
+    cancellation surfaces as Cancelled.
+    """
+    _current.set(token)
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    remove = token.on_cancel(lambda: loop.call_soon_threadsafe(task.cancel))
+    try:
+        return await coro
+    except asyncio.CancelledError:
+        token.raise_if_cancelled()
+        raise
+    finally:
+        remove()
+
+
+class CancelRegistry:
+    """
+    Tokens of the requests in flight, by request id
+
+    A request registers its id while it runs so a later call (e.g. POST
+    /cancel/<request_id>) can cancel it from another thread.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[str, CancelToken] = {}
+        self._lock = threading.Lock()
+
+    def register(self, request_id: str, token: Optional[CancelToken] = None) -> CancelToken:
+        token = token or CancelToken(request_id)
+        with self._lock:
+            self._tokens[request_id] = token
+        return token
+
+    def unregister(self, token: CancelToken) -> None:
+        with self._lock:
+            if self._tokens.get(token.request_id) is token:
+                del self._tokens[token.request_id]
+
+    def cancel(self, request_id: str, reason: str = 'cancel_endpoint') -> bool:
+        """Cancel the request with this id; returns False if no such request is in flight."""
+        with self._lock:
+            token = self._tokens.get(request_id)
+        if token is None:
+            return False
+        token.cancel(reason)
+        return True
+
+    @contextmanager
+    def track(self, request_id: str):
+        """Register request_id for the duration of the block, with its token as the current one."""
+        token = self.register(request_id)
+        try:
+            with scope(token):
+                yield token
+        finally:
+            self.unregister(token)
+
+    def in_flight(self) -> List[str]:
+        with self._lock:
+            return list(self._tokens)
+
+
+registry = CancelRegistry()
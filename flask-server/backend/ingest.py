@@ -0,0 +1,415 @@
+import hashlib
+import json
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .metrics import REGISTRY, Counter
+
+RECIPES_SOURCE = ("hf://datasets/Hieu-Pham/kaggle_food_recipes/"
+                  "Food Ingredients and Recipe Dataset with Image Name Mapping.csv")
+INGREDIENTS_SOURCE = "hf://datasets/foodvisor-nyu/labeled-food-ingredients/data/train-00000-of-00001.parquet"
+
+RECIPE_COLUMNS = {'Title': 'title', 'Ingredients': 'ingredients', 'Instructions': 'instructions'}
+INGREDIENT_FIELDS = ['ingredient', 'class', 'reason', 'int_label', 'prompt']
+
+# Properties identifying an object across imports; the others are its content and may change.
+# An ingredient is a labeled example: its name in the context of a prompt.
+RECIPE_KEY = ['title', 'ingredients']
+INGREDIENT_KEY = ['ingredient', 'prompt']
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'ingest')
+
+INGEST_ROWS = REGISTRY.register(Counter(
+    'ingest_rows_total', 'Source rows ingested, by collection and outcome', ('collection', 'outcome')))
+SYNC_OBJECTS = REGISTRY.register(Counter(
+    'sync_objects_total', 'Objects compared by collection syncs, by collection and change', ('collection', 'change')))
+
+
+def object_id(collection: str, properties: Dict[str, str], key: Sequence[str]) -> str:
+    """
+    Deterministic UUID of an object: a UUIDv5 of its collection and key properties
+
+    Key values are compared case-insensitively and with whitespace collapsed,
+    so reformatting a title does not make it a new object.
+    """
+    values = '\x1f'.join(' '.join(str(properties.get(prop, '')).split()).casefold() for prop in key)
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{collection.lower()}/{values}"))
+
+
+def content_hash(properties: Dict[str, Any], fields: Sequence[str]) -> str:
+    """Hash of the imported properties of an object, to tell whether it changed."""
+    values = ['' if properties.get(field) is None else str(properties.get(field)) for field in fields]
+    return hashlib.sha256(json.dumps(values).encode('utf-8')).hexdigest()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def read_chunks(source: str, chunk_size: int, skip: int = 0):
+    """
+    Yield the source as DataFrames of up to chunk_size rows, starting after its first `skip` rows
+
+    CSV files are parsed chunk by chunk; Parquet files are read batch by batch,
+    skipping whole row groups before `skip`. Remote paths (e.g. hf://) go
+    through fsspec, like pandas does.
+    """
+    import pandas as pd
+
+    if not source.endswith('.parquet'):
+        yield from pd.read_csv(source, chunksize=chunk_size, skiprows=range(1, skip + 1))
+        return
+
+    import fsspec
+    import pyarrow.parquet as pq
+
+    with fsspec.open(source, 'rb') as f:
+        parquet = pq.ParquetFile(f)
+        # First row group holding a row after `skip`, and the rows before it
+        first = 0
+        offset = 0
+        while first < parquet.num_row_groups and offset + parquet.metadata.row_group(first).num_rows <= skip:
+            offset += parquet.metadata.row_group(first).num_rows
+            first += 1
+        # Rows of the first row group read that come before `skip`
+        remaining = skip - offset
+        for batch in parquet.iter_batches(batch_size=chunk_size, row_groups=range(first, parquet.num_row_groups)):
+            if remaining >= batch.num_rows:
+                remaining -= batch.num_rows
+                continue
+            yield batch.slice(remaining).to_pandas()
+            remaining = 0
+
+
+def source_rows(source: str) -> Optional[int]:
+    """Number of rows of the source if it can be known without reading it (Parquet metadata)."""
+    if not source.endswith('.parquet'):
+        return None
+    try:
+        import fsspec
+        import pyarrow.parquet as pq
+        with fsspec.open(source, 'rb') as f:
+            return pq.ParquetFile(f).metadata.num_rows
+    except Exception:
+        return None
+
+
+def clean_recipes(df):
+    """Recipe properties of a chunk of the recipes dataset; rows missing a title, ingredients or instructions are dropped."""
+    df = df.reindex(columns=list(RECIPE_COLUMNS)).rename(columns=RECIPE_COLUMNS)
+    df = df.fillna('').astype(str).apply(lambda column: column.str.strip())
+    return df[(df != '').all(axis=1)]
+
+
+def clean_ingredients(df):
+    """Ingredient properties of a chunk of the ingredients dataset; rows without an ingredient name are dropped."""
+    df = df.reindex(columns=INGREDIENT_FIELDS).fillna('').astype(str)
+    df['ingredient'] = df['ingredient'].str.strip()
+    return df[df['ingredient'] != '']
+
+
+class Checkpoint:
+    """
+    Durable progress of one ingestion: source rows consumed and objects written
+
+    Saved atomically (written to a temporary file, fsynced, then renamed), so
+    it always describes a state the collection has actually reached.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable ingest checkpoint {self.path}: {e}")
+            return None
+
+    def save(self, state: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(dict(state, updated_at=time.time()), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class BatchWriter:
+    """
+    Write objects to a store in fixed-size batches from a pool of threads
+
+    Objects are buffered into batches of exactly `batch_size`, which `workers`
+    threads write concurrently. At most two batches per worker are in flight, so
+    memory stays bounded. drain() waits until everything written so far is in
+    the store.
+    """
+
+    def __init__(self, store, batch_size: int, workers: int):
+        self.store = store
+        self.batch_size = batch_size
+        self.workers = workers
+        self.written = 0
+        self._buffer: List[Dict[str, str]] = []
+        self._ids: List[str] = []
+        self._in_flight: deque = deque()
+        self._executor = None
+
+    def __enter__(self) -> 'BatchWriter':
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix=f'ingest-{self.store.name}')
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for future in self._in_flight:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def write(self, objects: List[Dict[str, str]], ids: List[str]) -> None:
+        self._buffer.extend(objects)
+        self._ids.extend(ids)
+        while len(self._buffer) >= self.batch_size:
+            self._submit(self._buffer[:self.batch_size], self._ids[:self.batch_size])
+            self._buffer = self._buffer[self.batch_size:]
+            self._ids = self._ids[self.batch_size:]
+
+    def _submit(self, batch: List[Dict[str, str]], ids: List[str]) -> None:
+        while len(self._in_flight) >= 2 * self.workers:
+            self._collect(self._in_flight.popleft())
+        self._in_flight.append(self._executor.submit(self.store.add, batch, ids))
+
+    def _collect(self, future) -> None:
+        added = future.result()
+        self.written += added
+        INGEST_ROWS.inc(added, collection=self.store.name, outcome='written')
+
+    def drain(self) -> None:
+        if self._buffer:
+            self._submit(self._buffer, self._ids)
+            self._buffer = []
+            self._ids = []
+        while self._in_flight:
+            self._collect(self._in_flight.popleft())
+
+
+class Ingestion:
+    """
+    Stream a dataset into a vector store in concurrent fixed-size batches
+
+    The source is read `chunk_size` rows at a time and cleaned with vectorized
+    column operations. Clean rows are written by a BatchWriter. Every object is
+    written under object_id() of its `key` properties, so writing the same row
+    twice replaces the object instead of duplicating it.
+
+    run() imports the whole source. Every `checkpoint_every` source rows, the
+    in-flight batches are drained and the store is flushed. Then the number of
+    source rows consumed is checkpointed. An interrupted import therefore
+    resumes after the last checkpointed row; rows written after it are written
+    again, idempotently.
+
+    sync() brings an existing collection in line with the source: it hashes
+    the `fields` of every object in the collection and of every source row, and
+    only writes the rows that are new or changed and deletes the objects no
+    longer in the source.
+    """
+
+    def __init__(self, store, source: str, clean: Callable, checkpoint_path: str, key: Sequence[str],
+                 fields: Sequence[str], batch_size: int = 100, workers: int = 4, chunk_size: int = 2000,
+                 checkpoint_every: int = 5000):
+        self.store = store
+        self.source = source
+        self.clean = clean
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.key = list(key)
+        self.fields = list(fields)
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.checkpoint_every = max(self.chunk_size, checkpoint_every)
+
+    def incomplete(self) -> bool:
+        """Whether an earlier run of this ingestion stopped before the end of the source."""
+        state = self.checkpoint.load()
+        return bool(state) and state.get('source') == self.source and not state.get('complete')
+
+    def _writer(self) -> BatchWriter:
+        return BatchWriter(self.store, self.batch_size, self.workers)
+
+    def _records(self, chunk):
+        """Clean records of a source chunk and the number of rows dropped."""
+        cleaned = self.clean(chunk)
+        dropped = len(chunk) - len(cleaned)
+        INGEST_ROWS.inc(dropped, collection=self.store.name, outcome='skipped')
+        return cleaned.to_dict('records'), dropped
+
+    def run(self, restart: bool = False) -> Dict[str, Any]:
+        """Ingest the source, resuming from the checkpoint unless restart; returns a throughput report."""
+        state = None if restart else self.checkpoint.load()
+        if state and (state.get('source') != self.source or state.get('complete')):
+            state = None
+        resumed_from = state['rows_done'] if state else 0
+        rows_done = resumed_from
+        already_written = state['objects_written'] if state else 0
+        skipped = 0
+        total = source_rows(self.source)
+        if resumed_from:
+            print(f"\nResuming import of {self.store.name} after row {resumed_from} "
+                  f"({already_written} objects already written)")
+        else:
+            print(f"\nStarting import of {self.store.name} from {self.source}")
+            self.checkpoint.save({'source': self.source, 'rows_done': 0, 'objects_written': 0, 'complete': False})
+
+        started = time.perf_counter()
+        last_checkpoint = rows_done
+        with self._writer() as writer:
+            for chunk in read_chunks(self.source, self.chunk_size, skip=rows_done):
+                rows_done += len(chunk)
+                records, dropped = self._records(chunk)
+                skipped += dropped
+                writer.write(records, [object_id(self.store.name, record, self.key) for record in records])
+
+                if rows_done - last_checkpoint >= self.checkpoint_every:
+                    writer.drain()
+                    self.store.flush()
+                    self.checkpoint.save({'source': self.source, 'rows_done': rows_done,
+                                          'objects_written': already_written + writer.written,
+                                          'complete': False})
+                    last_checkpoint = rows_done
+                self._print_progress(rows_done, total, resumed_from, started)
+
+            writer.drain()
+            self.store.flush()
+        written = already_written + writer.written
+
+        self.checkpoint.save({'source': self.source, 'rows_done': rows_done, 'objects_written': written,
+                              'complete': True})
+        seconds = time.perf_counter() - started
+        peak_rss = peak_rss_mb()
+        report = {
+            'mode': 'import',
+            'collection': self.store.name,
+            'source': self.source,
+            'resumed_from': resumed_from,
+            'rows_read': rows_done - resumed_from,
+            'rows_skipped': skipped,
+            'objects_written': written,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round((rows_done - resumed_from) / seconds, 1) if seconds else None,
+            'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+        }
+        print(f"\nImport completed: {report['rows_read']} rows in {report['seconds']}s "
+              f"({report['rows_per_second']} rows/s, {report['rows_skipped']} skipped, "
+              f"peak RSS {report['peak_rss_mb']} MB)")
+        return report
+
+    def sync(self) -> Dict[str, Any]:
+        """Write only the differences between the source and the collection; returns a report of the changes."""
+        print(f"\nSyncing {self.store.name} with {self.source}")
+        started = time.perf_counter()
+        existing = {object_id: content_hash(properties, self.fields)
+                    for object_id, properties in self.store.items()}
+        compared = time.perf_counter()
+
+        # Hash of the latest source row seen per id: when a key occurs twice, the last row wins, like in run()
+        seen: Dict[str, str] = {}
+        changes = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0}
+        rows_read = 0
+        skipped = 0
+        with self._writer() as writer:
+            for chunk in read_chunks(self.source, self.chunk_size):
+                rows_read += len(chunk)
+                records, dropped = self._records(chunk)
+                skipped += dropped
+                changed = []
+                ids = []
+                for record in records:
+                    record_id = object_id(self.store.name, record, self.key)
+                    digest = content_hash(record, self.fields)
+                    if record_id in seen:
+                        changes['duplicates'] += 1
+                        current = seen[record_id]
+                    else:
+                        current = existing.get(record_id)
+                        change = 'inserted' if current is None else 'unchanged' if current == digest else 'updated'
+                        changes[change] += 1
+                    seen[record_id] = digest
+                    if digest != current:
+                        changed.append(record)
+                        ids.append(record_id)
+                writer.write(changed, ids)
+            writer.drain()
+
+        gone = [object_id for object_id in existing if object_id not in seen]
+        deleted = self.store.delete_ids(gone) if gone else 0
+        self.store.flush()
+        self.checkpoint.save({'source': self.source, 'rows_done': rows_read, 'objects_written': len(seen),
+                              'complete': True})
+        for change in ('inserted', 'updated', 'unchanged'):
+            SYNC_OBJECTS.inc(changes[change], collection=self.store.name, change=change)
+        SYNC_OBJECTS.inc(deleted, collection=self.store.name, change='deleted')
+
+        seconds = time.perf_counter() - started
+        report = {
+            'mode': 'sync',
+            'collection': self.store.name,
+            'source': self.source,
+            'rows_read': rows_read,
+            'rows_skipped': skipped,
+            'objects_before': len(existing),
+            'objects_after': len(seen),
+            **changes,
+            'deleted': deleted,
+            'objects_written': writer.written,
+            'seconds_listing_collection': round(compared - started, 3),
+            'seconds': round(seconds, 3),
+        }
+        print(f"Sync completed in {report['seconds']}s: {report['inserted']} inserted, "
+              f"{report['updated']} updated, {report['deleted']} deleted, {report['unchanged']} unchanged")
+        return report
+
+    def _print_progress(self, rows_done: int, total: Optional[int], resumed_from: int, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        rate = (rows_done - resumed_from) / elapsed if elapsed else 0.0
+        done = f"{rows_done / total * 100:.1f}% ({rows_done}/{total} rows)" if total else f"{rows_done} rows"
+        print(f"\rProgress: {done}, {rate:.0f} rows/s", end='', flush=True)
+
+
+def _ingestion(store, source: str, clean: Callable, key: Sequence[str], fields: Sequence[str],
+               **kwargs) -> Ingestion:
+    """Ingestion of a collection with the INGEST_* settings; its checkpoint is named after the collection."""
+    checkpoint_dir = os.getenv('INGEST_CHECKPOINT_DIR', DEFAULT_CHECKPOINT_DIR)
+    settings = dict(
+        batch_size=int(os.getenv('INGEST_BATCH_SIZE', '100')),
+        workers=int(os.getenv('INGEST_WORKERS', '4')),
+        chunk_size=int(os.getenv('INGEST_CHUNK_SIZE', '2000')),
+        checkpoint_every=int(os.getenv('INGEST_CHECKPOINT_EVERY', '5000')),
+    )
+    settings.update(kwargs)
+    return Ingestion(store, source, clean, os.path.join(checkpoint_dir, f"{store.name.lower()}.json"), key, fields,
+                     **settings)
+
+
+def recipe_ingestion(store, **kwargs) -> Ingestion:
+    return _ingestion(store, os.getenv('RECIPES_SOURCE', RECIPES_SOURCE), clean_recipes, RECIPE_KEY,
+                      list(RECIPE_COLUMNS.values()), **kwargs)
+
+
+def ingredient_ingestion(store, **kwargs) -> Ingestion:
+    return _ingestion(store, os.getenv('INGREDIENTS_SOURCE', INGREDIENTS_SOURCE), clean_ingredients,
+                      INGREDIENT_KEY, INGREDIENT_FIELDS, **kwargs)
@@ -1,79 +1,53 @@
-import atexit
-import yaml
-import pandas as pd
-import weaviate
-from weaviate.classes import config as wvcc
-from weaviate.classes.query import MetadataQuery
-from weaviate.collections.classes.filters import Filter
+import os
+from contextlib import contextmanager
 from typing import Dict, List, Any
+from .admission import Rejected
+from .autocomplete import AutocompleteIndex, suggest_ingredients
+from .ingest import INGREDIENT_FIELDS, INGREDIENT_KEY, object_id
+from .metrics import DB_QUERY_LATENCY
 from .Vector_Database_Ingredients import IngredientsDB, get_similar_ingredients
 
 class IngredientDBEfficient(IngredientsDB):
     def __init__(self, collection_name="Ingredients", schema_path="schema.yaml"):
+        # The base class connects to the collection, creating and filling it if needed
         super().__init__(collection_name, schema_path)
-        atexit.register(self.close)
-
-        try:
-            # Try to get the existing collection first
-            self.collection = self.client.collections.get(self.collection_name)
-            print(f"Connected to existing collection: {self.collection_name}")
-        except weaviate.exceptions.UnexpectedStatusCodeError:
-            # If collection doesn't exist, create it
-            print(f"Creating new collection: {self.collection_name}")
-            self._create_collection_from_schema()
-            self._initialize_from_huggingface()
-
-    def _create_collection_from_schema(self):
-        try:
-            with open(self.schema_path, 'r') as file:
-                schema = yaml.safe_load(file)
-
-            properties = [
-                wvcc.Property(
-                    name=prop['name'],
-                    data_type=wvcc.DataType.TEXT
-                ) for prop in schema['properties']
-            ]
-
-            self.collection = self.client.collections.create(
-                name=self.collection_name,
-                vectorizer_config=wvcc.Configure.Vectorizer.text2vec_transformers(),
-                properties=properties
-            )
-        except weaviate.exceptions.UnexpectedStatusCodeError as e:
-            # If collection was created in the meantime, try to get it
-            if "already exists" in str(e):
-                self.collection = self.client.collections.get(self.collection_name)
-            else:
-                raise
-
-    def _initialize_from_huggingface(self):
+        self.autocomplete = None
+        # Fall back to vector search when the autocomplete index finds fewer names than this
+        self.autocomplete_min_hits = int(os.getenv('AUTOCOMPLETE_MIN_HITS', '3'))
+
+    def load_autocomplete(self) -> None:
+        """Build the in-memory autocomplete index over every ingredient name (AUTOCOMPLETE_ENABLED=0 skips it)."""
+        if os.getenv('AUTOCOMPLETE_ENABLED', '1') != '1':
+            return
         try:
-            print("Loading data from HuggingFace...")
-            df = pd.read_parquet(
-                "hf://datasets/foodvisor-nyu/labeled-food-ingredients/data/train-00000-of-00001.parquet")
-            print(f"Loaded {len(df)} records from HuggingFace")
-
-            ingredients_list = df.to_dict('records')
-            success = self.batch_import_ingredients(ingredients_list)
-            if success:
-                print(f"Successfully imported {len(ingredients_list)} ingredients")
-            else:
-                print("Failed to import ingredients")
+            self.autocomplete = AutocompleteIndex.from_store(
+                self.store, fuzzy_threshold=float(os.getenv('AUTOCOMPLETE_FUZZY_THRESHOLD', '0.5')))
+            print(f"Loaded autocomplete index with {len(self.autocomplete)} ingredient names")
         except Exception as e:
-            print(f"Error loading data from HuggingFace: {e}")
-            raise
+            print(f"Error building autocomplete index, suggestions will use vector search: {e}")
+
+    def sync(self) -> Dict[str, Any]:
+        report = super().sync()
+        # Rebuild the index from the synced collection, unless it is not loaded yet
+        if getattr(self, 'autocomplete', None) is not None:
+            self.load_autocomplete()
+        return report
 
     def batch_import_ingredients(self, ingredients_list: List[Dict[str, Any]]) -> bool:
+        import pandas as pd
+
         try:
-            with self.collection.batch.dynamic() as batch:
-                for ingredient in ingredients_list:
-                    cleaned_ingredient = {
-                        k: '' if pd.isna(v) else str(v)
-                        for k, v in ingredient.items()
-                        if k in ['ingredient', 'class', 'reason', 'int_label', 'prompt']
-                    }
-                    batch.add_object(properties=cleaned_ingredient)
+            ingredients = [
+                {
+                    k: '' if pd.isna(v) else str(v)
+                    for k, v in ingredient.items()
+                    if k in INGREDIENT_FIELDS
+                }
+                for ingredient in ingredients_list
+            ]
+            self.store.add(ingredients, [object_id(self.store.name, ingredient, INGREDIENT_KEY)
+                                         for ingredient in ingredients])
+            self.store.flush()
             return True
         except Exception as e:
             print(f"Error in batch import: {e}")
@@ -81,27 +55,9 @@ class IngredientDBEfficient(IngredientsDB):
 
     def get_statistics(self) -> Dict:
         try:
-            # Get total count
-            total_count_response = self.collection.aggregate.over_all(
-                total_count=True
-            )
-            total_count = total_count_response.total_count
-
-            # Get class distribution using aggregate
-            class_counts = self.collection.aggregate.over_all().group_by(
-                property_name="class"
-            ).objects
-
-            class_distribution = {}
-            for group in class_counts:
-                if hasattr(group, 'properties'):
-                    class_name = group.properties.get('class', 'unknown')
-                    count = group.count
-                    class_distribution[class_name] = count
-
             return {
-                "total_ingredients": total_count,
-                "class_distribution": class_distribution
+                "total_ingredients": self.store.count(),
+                "class_distribution": self.store.group_counts('class')
             }
         except Exception as e:
             print(f"Error getting statistics: {e}")
@@ -109,53 +65,43 @@ class IngredientDBEfficient(IngredientsDB):
 
     def search_similar_ingredients(self, query_text: str, limit: int = 5) -> List[Dict]:
         try:
-            response = self.collection.query.near_text(
-                query=query_text,
-                limit=limit,
-                return_metadata=MetadataQuery(distance=True)
-            )
-
-            results = []
-            if hasattr(response, 'objects'):
-                for obj in response.objects:
-                    results.append({
-                        "properties": obj.properties,
-                        "distance": getattr(obj.metadata, 'distance', 0)
-                    })
-            return results
+            with self._query('search_similar'):
+                return self.store.near_text(query_text, limit)
+        except Rejected:
+            raise
         except Exception as e:
             print(f"Error in similarity search: {e}")
             return []
 
+    def suggest_ingredients(self, query: str, limit: int = 5) -> List[str]:
+        """Ingredient names completing a partially typed query (see autocomplete.suggest_ingredients)."""
+        return suggest_ingredients(self.autocomplete, self.search_similar_ingredients, query, limit,
+                                   self.autocomplete_min_hits, self.collection_name)
+
     def search_by_class(self, class_type: str, limit: int = 5) -> List[Dict]:
         try:
-            # Create filter using Filter class
-            class_filter = Filter.by_property("class") == class_type
-
-            response = self.collection.query.fetch_objects(
-                limit=limit,
-                filters=class_filter
-            )
+            with self._query('search_by_class'):
+                objects = self.store.fetch(limit, filters={"class": class_type})
 
             results = []
-            if hasattr(response, 'objects'):
-                for obj in response.objects:
-                    results.append({
-                        "ingredient": obj.properties.get("ingredient", ""),
-                        "class": obj.properties.get("class", ""),
-                        "reason": obj.properties.get("reason", "")
-                    })
+            for properties in objects:
+                results.append({
+                    "ingredient": properties.get("ingredient", ""),
+                    "class": properties.get("class", ""),
+                    "reason": properties.get("reason", "")
+                })
             return results
+        except Rejected:
+            raise
         except Exception as e:
             print(f"Error in class search: {e}")
             return []
 
-    def close(self):
-        try:
-            if hasattr(self, 'client'):
-                self.client.close()
-        except Exception as e:
-            print(f"Error closing connection: {e}")
+    @contextmanager
+    def _query(self, operation: str):
+        """Admit (see VectorStore.admit) and time one query of this collection."""
+        with self.store.admit(), DB_QUERY_LATENCY.time(collection=self.collection_name, operation=operation):
+            yield
 
     def search_similar_ingredients_by_name(self, ingredient_name: str, limit: int = 5) -> List[Dict]:
         """
@@ -170,25 +116,23 @@ class IngredientDBEfficient(IngredientsDB):
         """
         try:
             # Use near_text instead of hybrid for better compatibility
-            response = self.collection.query.near_text(
-                query=ingredient_name,
-                limit=limit,
-                return_metadata=MetadataQuery(distance=True)
-            )
+            with self._query('search_by_name'):
+                hits = self.store.near_text(ingredient_name, limit)
 
             results = []
-            if hasattr(response, 'objects'):
-                for obj in response.objects:
-                    results.append({
-                        "ingredient": obj.properties.get("ingredient", ""),
-                        "class": obj.properties.get("class", ""),
-                        "reason": obj.properties.get("reason", ""),
-                        "similarity_score": 1 - getattr(obj.metadata, 'distance', 0)
-                    })
+            for hit in hits:
+                results.append({
+                    "ingredient": hit['properties'].get("ingredient", ""),
+                    "class": hit['properties'].get("class", ""),
+                    "reason": hit['properties'].get("reason", ""),
+                    "similarity_score": 1 - hit['distance']
+                })
 
             # Sort results by similarity score
             results.sort(key=lambda x: x['similarity_score'], reverse=True)
             return results
+        except Rejected:
+            raise
         except Exception as e:
             print(f"Error in name similarity search: {e}")
             return []
@@ -198,22 +142,21 @@ class IngredientDBEfficient(IngredientsDB):
         Get full details for a specific ingredient by exact name match.
         """
         try:
-            filter_by_name = Filter.by_property("ingredient") == ingredient_name
-            response = self.collection.query.fetch_objects(
-                limit=1,
-                filters=filter_by_name
-            )
-
-            if hasattr(response, 'objects') and len(response.objects) > 0:
-                obj = response.objects[0]
+            with self._query('get_details'):
+                objects = self.store.fetch(1, filters={"ingredient": ingredient_name})
+
+            if objects:
+                properties = objects[0]
                 return {
-                    "ingredient": obj.properties.get("ingredient", ""),
-                    "class": obj.properties.get("class", ""),
-                    "reason": obj.properties.get("reason", ""),
-                    "int_label": obj.properties.get("int_label", ""),
-                    "prompt": obj.properties.get("prompt", "")
+                    "ingredient": properties.get("ingredient", ""),
+                    "class": properties.get("class", ""),
+                    "reason": properties.get("reason", ""),
+                    "int_label": properties.get("int_label", ""),
+                    "prompt": properties.get("prompt", "")
                 }
             return {}
+        except Rejected:
+            raise
         except Exception as e:
             print(f"Error getting ingredient details: {e}")
             return {}
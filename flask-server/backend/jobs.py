@@ -0,0 +1,277 @@
+import bisect
+import itertools
+import math
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from . import cancellation, progress
+from .metrics import REGISTRY, Counter, Gauge, Histogram
+
+# Priority classes, most urgent first
+PRIORITIES = ('interactive', 'default', 'batch')
+
+JOBS_QUEUED = REGISTRY.register(Gauge(
+    'jobs_queued', 'Generation jobs waiting for a worker', ('provider',)))
+JOBS_RUNNING = REGISTRY.register(Gauge(
+    'jobs_running', 'Generation jobs being run', ('provider',)))
+JOBS_FINISHED = REGISTRY.register(Counter(
+    'jobs_finished_total', 'Generation jobs finished, by status', ('status',)))
+JOBS_REJECTED = REGISTRY.register(Counter(
+    'jobs_rejected_total', 'Generation jobs rejected because the queue was full', ('priority',)))
+JOB_QUEUE_WAIT = REGISTRY.register(Histogram(
+    'job_queue_wait_seconds', 'Time jobs spent queued before a worker started them', ('priority',)))
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit() when the queue is at capacity."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Job:
+    """
+    One queued generation
+
+    fn(job) runs on a worker thread with the job's cancel token and progress as
+    the current ones, and returns the job result. Every change of status or
+    progress bumps `version`, so watchers can wait for the next change.
+    """
+
+    TERMINAL = ('succeeded', 'failed', 'cancelled')
+
+    def __init__(self, fn: Callable[['Job'], Any], provider: str, priority: str = 'default',
+                 request: Optional[Dict[str, Any]] = None, job_id: Optional[str] = None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority} (expected one of {', '.join(PRIORITIES)})")
+        self.id = job_id or uuid.uuid4().hex
+        self.fn = fn
+        self.provider = provider
+        self.priority = priority
+        self.request = request or {}
+        self.status = 'queued'
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.token = cancellation.CancelToken(self.id)
+        self.version = 0
+        self._changed = threading.Condition()
+        self.progress = progress.Progress(on_change=self.notify)
+
+    @property
+    def done(self) -> bool:
+        return self.status in self.TERMINAL
+
+    def notify(self) -> None:
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait(self, version: int, timeout: Optional[float] = None) -> int:
+        """Wait until the job changes after `version` (or timeout); return the current version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def _set_status(self, status: str, **fields) -> None:
+        self.status = status
+        for name, value in fields.items():
+            setattr(self, name, value)
+        if status in self.TERMINAL:
+            self.finished_at = time.time()
+        self.notify()
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = {
+            'id': self.id,
+            'status': self.status,
+            'priority': self.priority,
+            'provider': self.provider,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': self.progress.snapshot(),
+        }
+        if self.result is not None:
+            job['result'] = self.result
+        if self.error is not None:
+            job['error'] = self.error
+        return job
+
+
+class JobQueue:
+    """
+    Bounded priority queue of generation jobs served by a pool of worker threads
+
+    Workers take the oldest job of the most urgent priority class whose provider
+    is below its concurrency limit, so a saturated provider does not block jobs
+    for another one. submit() raises QueueFull, with a Retry-After estimate from
+    the recent job durations, once `max_queued` jobs are waiting. Finished jobs
+    are kept for `retention` seconds so clients can fetch their results; they are
+    forgotten when a job is submitted or finishes.
+    """
+
+    def __init__(self, workers: int = 4, max_queued: int = 100,
+                 provider_limit: Optional[Callable[[str], int]] = None, retention: float = 3600):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.provider_limit = provider_limit or (lambda provider: self.workers)
+        self.retention = retention
+        self._cond = threading.Condition()
+        self._queue: List = []
+        self._sequence = itertools.count()
+        self._jobs: Dict[str, Job] = {}
+        self._running: Dict[str, int] = {}
+        self._threads: List[threading.Thread] = []
+        # Moving average of job run time, for Retry-After; a guess until the first job finishes
+        self._average_duration = 30.0
+        REGISTRY.add_collector(self._collect)
+
+    def submit(self, job: Job) -> Job:
+        with self._cond:
+            self._purge()
+            if len(self._queue) >= self.max_queued:
+                JOBS_REJECTED.inc(priority=job.priority)
+                raise QueueFull(self.retry_after())
+            bisect.insort(self._queue, (PRIORITIES.index(job.priority), next(self._sequence), job.id))
+            self._jobs[job.id] = job
+            cancellation.registry.register(job.id, job.token)
+            self._start_workers()
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job: a queued job is dropped, a running one is stopped through its cancel token."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            queue = [entry for entry in self._queue if entry[2] != job_id]
+            if len(queue) < len(self._queue):
+                self._queue = queue
+                job.token.cancel('job_cancelled')
+                cancellation.registry.unregister(job.token)
+                job._set_status('cancelled')
+                JOBS_FINISHED.inc(status='cancelled')
+                return job
+        job.token.cancel('job_cancelled')
+        return job
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Number of queued jobs ahead of this one, None if it is not queued."""
+        with self._cond:
+            for index, entry in enumerate(self._queue):
+                if entry[2] == job_id:
+                    return index
+        return None
+
+    def retry_after(self) -> int:
+        """Seconds until a slot in the queue is likely to free up."""
+        return max(1, math.ceil(self._average_duration * (len(self._queue) + 1) / self.workers))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            statuses: Dict[str, int] = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {'workers': self.workers, 'max_queued': self.max_queued, 'queued': len(self._queue),
+                    'running': dict(self._running), 'jobs': statuses,
+                    'average_duration': round(self._average_duration, 3)}
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f'job-worker-{len(self._threads)}', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _limit(self, provider: str) -> int:
+        try:
+            return self.provider_limit(provider)
+        except Exception as e:
+            print(f"Error reading the concurrency limit of {provider}: {e}")
+            return self.workers
+
+    def _next_runnable(self) -> Optional[Job]:
+        for index, (_, _, job_id) in enumerate(self._queue):
+            job = self._jobs[job_id]
+            if self._running.get(job.provider, 0) < self._limit(job.provider):
+                del self._queue[index]
+                return job
+        return None
+
+    def _work(self) -> None:
+        while True:
+            job = None
+            try:
+                with self._cond:
+                    job = self._next_runnable()
+                    while job is None:
+                        self._cond.wait()
+                        job = self._next_runnable()
+                    self._running[job.provider] = self._running.get(job.provider, 0) + 1
+                try:
+                    self._run(job)
+                finally:
+                    with self._cond:
+                        self._running[job.provider] -= 1
+                        self._purge()
+                        self._cond.notify_all()
+            except Exception as e:
+                # A worker must outlive any job: fail this one and take the next
+                print(f"Error in job worker: {e}")
+                if job is not None and not job.done:
+                    job._set_status('failed', error=str(e))
+                    JOBS_FINISHED.inc(status='failed')
+
+    def _run(self, job: Job) -> None:
+        started = time.time()
+        JOB_QUEUE_WAIT.observe(started - job.created_at, priority=job.priority)
+        if job.token.cancelled:
+            cancellation.registry.unregister(job.token)
+            job._set_status('cancelled')
+            JOBS_FINISHED.inc(status='cancelled')
+            return
+
+        job._set_status('running', started_at=started)
+        job.progress.update(stage='running')
+        try:
+            with cancellation.scope(job.token), progress.scope(job.progress):
+                result = job.fn(job)
+            job.progress.update(stage='done')
+            job._set_status('succeeded', result=result)
+        except cancellation.Cancelled:
+            job._set_status('cancelled')
+        except Exception as e:
+            print(f"Error running job {job.id}: {e}")
+            job._set_status('failed', error=str(e))
+        finally:
+            cancellation.registry.unregister(job.token)
+        JOBS_FINISHED.inc(status=job.status)
+        with self._cond:
+            self._average_duration = 0.8 * self._average_duration + 0.2 * (job.finished_at - started)
+
+    def _purge(self) -> None:
+        """Forget finished jobs older than the retention period."""
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.done and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _collect(self) -> None:
+        with self._cond:
+            queued: Dict[str, int] = {}
+            for _, _, job_id in self._queue:
+                provider = self._jobs[job_id].provider
+                queued[provider] = queued.get(provider, 0) + 1
+            for provider in set(queued) | set(self._running):
+                JOBS_QUEUED.set(queued.get(provider, 0), provider=provider)
+                JOBS_RUNNING.set(self._running.get(provider, 0), provider=provider)
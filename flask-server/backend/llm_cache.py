@@ -0,0 +1,314 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _normalize_text(value) -> str:
+    return ' '.join(str(value).split()).casefold() if value else ''
+
+
+def _normalize_list(values) -> List[str]:
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = values.split(',')
+    return sorted({_normalize_text(v) for v in values if _normalize_text(v)})
+
+
+def canonical_request(ingredients: List[str] = None, cost: int = 0, cuisine: str = None, serving_size: int = 0,
+                      meal_type: str = None, allergies=None, diet: str = None, **extra) -> Dict[str, Any]:
+    """
+    Build a canonical form of a recipe request.
+
+    Ingredients and allergies are case-folded, deduplicated and sorted so that
+    "chicken, garlic" and "Garlic, Chicken" produce the same request.
+    """
+    request = {
+        'ingredients': _normalize_list(ingredients),
+        'cost': int(cost or 0),
+        'cuisine': _normalize_text(cuisine),
+        'serving_size': int(serving_size or 0),
+        'meal_type': _normalize_text(meal_type),
+        'allergies': [a for a in _normalize_list(allergies) if a != 'none'],
+        'diet': _normalize_text(diet),
+    }
+    for key, value in extra.items():
+        request[key] = _normalize_list(value) if isinstance(value, (list, tuple, set)) else _normalize_text(value)
+    return request
+
+
+def file_fingerprint(paths: List[str]) -> str:
+    """Hash the contents of the given files."""
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(b'<missing>')
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def make_key(namespace: str, *parts) -> str:
+    """Build a cache key from a namespace and JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM responses.
+
+    The first tier is an in-process LRU with a TTL, the second a SQLite database
+    in WAL mode so that several worker processes can share cached responses.
+    Values must be JSON-serializable.
+
+    set() only updates the LRU and queues the row: a background thread writes the
+    queued rows in one transaction every flush_interval seconds (and at exit), and
+    deletes expired rows after every purge_every sets.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 1024, ttl: float = 86400,
+                 watched_files: Optional[List[str]] = None, flush_interval: float = 1.0,
+                 purge_every: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.purge_every = purge_every
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # Held while writing to the database; always taken before _lock
+        self._write_lock = threading.Lock()
+        self._writer = None
+        # Lookups read through one connection per thread, opened on first use
+        self._readers = threading.local()
+        self._reader_connections: List[sqlite3.Connection] = []
+        # Bumped by delete() and invalidate() so a lookup racing them does not cache what they removed
+        self._generation = 0
+        # Rows not written to the database yet: {key: (serialized, expires_at)}
+        self._pending: Dict[str, tuple] = {}
+        self._sets_since_purge = 0
+        self._closed = threading.Event()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0, 'invalidations': 0, 'purged': 0}
+
+        self._watched_files = list(watched_files or [])
+        self._watched_mtimes = self._mtimes()
+        self.fingerprint = file_fingerprint(self._watched_files)
+        self._invalidation_hooks: List[Callable[[str], None]] = []
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._writer = sqlite3.connect(path, check_same_thread=False, timeout=5)
+                self._writer.execute('PRAGMA journal_mode=WAL')
+                self._writer.execute('PRAGMA synchronous=NORMAL')
+                self._writer.execute('CREATE TABLE IF NOT EXISTS cache ('
+                                     'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+                self._writer.commit()
+            except sqlite3.Error as e:
+                print(f"Error opening LLM cache database {path}: {e}")
+                self._writer = None
+            else:
+                threading.Thread(target=self._flush_loop, name='llm-cache-writer', daemon=True).start()
+                atexit.register(self.flush)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return json.loads(value)
+                del self._memory[key]
+            row = self._pending.get(key)
+            generation = self._generation
+
+        # The SELECT runs unlocked: in WAL mode it reads the last committed rows
+        # without waiting for the writer, and other lookups never wait for it
+        if row is None:
+            row = self._select(key)
+
+        with self._lock:
+            if row is None:
+                # Flushed between the two checks: in neither place while it was being committed
+                row = self._pending.get(key)
+            if row is not None and row[1] > now:
+                if generation == self._generation:
+                    self._remember(key, row[0], row[1])
+                self.stats['disk_hits'] += 1
+                return json.loads(row[0])
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        serialized = json.dumps(value)
+        with self._lock:
+            self._remember(key, serialized, expires_at)
+            self.stats['sets'] += 1
+            if self._writer is not None:
+                self._pending[key] = (serialized, expires_at)
+                self._sets_since_purge += 1
+
+    def delete(self, key: str) -> None:
+        with self._write_lock:
+            with self._lock:
+                self._memory.pop(key, None)
+                self._pending.pop(key, None)
+                self._generation += 1
+            if self._writer is not None:
+                try:
+                    self._writer.execute('DELETE FROM cache WHERE key = ?', (key,))
+                    self._writer.commit()
+                except sqlite3.Error as e:
+                    print(f"Error deleting from LLM cache: {e}")
+
+    def invalidate(self, namespace: Optional[str] = None) -> None:
+        """Drop all entries, or only those whose key starts with 'namespace:'."""
+        with self._write_lock:
+            with self._lock:
+                for entries in (self._memory, self._pending):
+                    if namespace is None:
+                        entries.clear()
+                    else:
+                        for key in [k for k in entries if k.startswith(f"{namespace}:")]:
+                            del entries[key]
+                self._generation += 1
+                self.stats['invalidations'] += 1
+            if self._writer is not None:
+                try:
+                    if namespace is None:
+                        self._writer.execute('DELETE FROM cache')
+                    else:
+                        self._writer.execute('DELETE FROM cache WHERE key LIKE ?', (f"{namespace}:%",))
+                    self._writer.commit()
+                except sqlite3.Error as e:
+                    print(f"Error invalidating LLM cache: {e}")
+
+    def flush(self) -> None:
+        """Write queued rows to the database now, and delete expired rows if a purge is due."""
+        with self._write_lock:
+            if self._writer is None:
+                return
+            with self._lock:
+                rows, self._pending = self._pending, {}
+                purge = self._sets_since_purge >= self.purge_every
+                if purge:
+                    self._sets_since_purge = 0
+            if not rows and not purge:
+                return
+            try:
+                self._writer.executemany('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                                         [(key, value, expires_at) for key, (value, expires_at) in rows.items()])
+                if purge:
+                    purged = self._writer.execute('DELETE FROM cache WHERE expires_at < ?', (time.time(),)).rowcount
+                    with self._lock:
+                        self.stats['purged'] += purged
+                self._writer.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing LLM cache: {e}")
+
+    def on_invalidate(self, hook: Callable[[str], None]) -> None:
+        """Register a hook called with the new fingerprint when a watched file changes."""
+        self._invalidation_hooks.append(hook)
+
+    def check_watched_files(self) -> bool:
+        """
+        Invalidate the cache if any watched file (e.g. a system prompt) changed.
+
+        Only file modification times are compared on the hot path; contents are
+        hashed again only when a modification time changes.
+
+        Returns:
+            bool: True if the cache was invalidated
+        """
+        mtimes = self._mtimes()
+        if mtimes == self._watched_mtimes:
+            return False
+        self._watched_mtimes = mtimes
+
+        fingerprint = file_fingerprint(self._watched_files)
+        if fingerprint == self.fingerprint:
+            return False
+
+        print(f"Watched files changed, invalidating LLM cache ({self.fingerprint} -> {fingerprint})")
+        self.fingerprint = fingerprint
+        self.invalidate()
+        for hook in self._invalidation_hooks:
+            try:
+                hook(fingerprint)
+            except Exception as e:
+                print(f"Error in cache invalidation hook: {e}")
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self._memory)
+        hits = stats['memory_hits'] + stats['disk_hits']
+        lookups = hits + stats['misses']
+        stats['hit_rate'] = hits / lookups if lookups else 0.0
+        return stats
+
+    def close(self) -> None:
+        self._closed.set()
+        self.flush()
+        with self._write_lock, self._lock:
+            for db in self._reader_connections + [self._writer]:
+                if db is not None:
+                    try:
+                        db.close()
+                    except sqlite3.Error as e:
+                        print(f"Error closing LLM cache: {e}")
+            self._reader_connections = []
+            self._writer = None
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def _select(self, key: str) -> Optional[tuple]:
+        """Read a row through this thread's connection."""
+        if self._writer is None:
+            return None
+        db = getattr(self._readers, 'db', None)
+        try:
+            if db is None:
+                db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+                with self._lock:
+                    if self._writer is None:
+                        db.close()
+                        return None
+                    self._reader_connections.append(db)
+                self._readers.db = db
+            return db.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error as e:
+            # Also raised if close() closed the connection meanwhile
+            print(f"Error reading LLM cache: {e}")
+            return None
+
+    def _remember(self, key: str, serialized: str, expires_at: float) -> None:
+        self._memory[key] = (expires_at, serialized)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _mtimes(self) -> List[Optional[float]]:
+        mtimes = []
+        for path in self._watched_files:
+            try:
+                mtimes.append(os.path.getmtime(path))
+            except OSError:
+                mtimes.append(None)
+        return mtimes
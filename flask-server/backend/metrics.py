@@ -0,0 +1,208 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Pipeline stage of the current model call ('create_recipe_list', 'write_recipe', ...)
+current_stage = contextvars.ContextVar('llm_stage', default='unknown')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = 'le="' + _format_value(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, inf)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callback run before rendering, e.g. to refresh gauges from other stats."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Error in metrics collector: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_LLM_LABELS = ('provider', 'model', 'stage')
+
+LLM_CALLS = REGISTRY.register(Counter(
+    'llm_calls_total', 'Model calls by method and outcome', _LLM_LABELS + ('method', 'outcome')))
+LLM_LATENCY = REGISTRY.register(Histogram(
+    'llm_call_duration_seconds', 'Duration of model calls', _LLM_LABELS + ('method',)))
+LLM_TTFT = REGISTRY.register(Histogram(
+    'llm_time_to_first_token_seconds', 'Time to the first streamed chunk', _LLM_LABELS))
+LLM_PROMPT_TOKENS = REGISTRY.register(Counter(
+    'llm_prompt_tokens_total', 'Prompt tokens sent (estimated at 4 characters per token)', _LLM_LABELS))
+LLM_COMPLETION_TOKENS = REGISTRY.register(Counter(
+    'llm_completion_tokens_total', 'Completion tokens received (estimated at 4 characters per token)',
+    _LLM_LABELS))
+LLM_TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    'llm_tokens_per_second', 'Completion throughput per call', _LLM_LABELS,
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500)))
+LLM_PROVIDER_PROMPT_TOKENS = REGISTRY.register(Counter(
+    'llm_provider_prompt_tokens_total',
+    'Prompt tokens reported by the provider, by kind (input, cache_read, cache_write, evaluated)',
+    _LLM_LABELS + ('kind',)))
+LLM_PARSE_FAILURES = REGISTRY.register(Counter(
+    'llm_parse_failures_total', 'Model responses that could not be parsed', _LLM_LABELS))
+LLM_ATTEMPTS = REGISTRY.register(Histogram(
+    'llm_attempts_per_request', 'Model calls needed per pipeline request', _LLM_LABELS + ('outcome',),
+    buckets=(1, 2, 3, 4, 5, 7, 10, 15, 20)))
+LLM_CANCELLED = REGISTRY.register(Counter(
+    'llm_cancelled_calls_total', 'Model calls stopped or skipped because the request was cancelled', ('stage',)))
+DB_QUERY_LATENCY = REGISTRY.register(Histogram(
+    'vector_db_query_duration_seconds', 'Duration of vector database queries', ('collection', 'operation')))
+
+
+def estimate_tokens(text) -> int:
+    """Rough token count used when the provider does not report usage."""
+    if not text:
+        return 0
+    if not isinstance(text, str):
+        text = ' '.join(str(m.get('content', '')) if isinstance(m, dict) else str(m) for m in text)
+    return max(1, len(text) // 4)
+
+
+def record_prompt_usage(provider: str, model: str, **tokens) -> None:
+    """Record prompt token counts reported by a provider, e.g. record_prompt_usage(..., input=812, cache_read=1100)."""
+    for kind, count in tokens.items():
+        if count:
+            LLM_PROVIDER_PROMPT_TOKENS.inc(count, provider=provider, model=model, stage=current_stage.get(), kind=kind)
+
+
+@contextmanager
+def stage(name: str):
+    """Label model calls made inside the block with a pipeline stage."""
+    token = current_stage.set(name)
+    try:
+        yield
+    finally:
+        current_stage.reset(token)
@@ -1,39 +1,158 @@
+import json
 import os
 import anthropic
-from typing import List, Dict
-from .base_model import BaseModel
+from typing import Any, List, Dict, Iterator, AsyncIterator
+from .base_model import BaseModel, async_http_limits
+from ..metrics import record_prompt_usage
 
 class AnthropicModel(BaseModel):
+    provider = 'anthropic'
+    supports_structured_output = True
+
     def __init__(self):
         api_key = os.getenv('ANTHROPIC_API_KEY')
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable is not set")
+        self.api_key = api_key
         self.client = anthropic.Anthropic(api_key=api_key)
         self.model = os.getenv('ANTHROPIC_MODEL', 'claude-3-opus-20240229')
+        # Mark the system prompt as a cacheable prefix
+        self.prompt_cache = os.getenv('ANTHROPIC_PROMPT_CACHE', '1') != '0'
         print(f"Initialized Anthropic with model: {self.model}")
 
+    def _request(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Build the messages.create() arguments
+
+        System messages go in the top-level `system` parameter, marked with
+        cache_control so the static system prompt is served from the prompt cache.
+        """
+        request = {
+            'model': self.model,
+            'max_tokens': 4096,
+            'messages': [msg for msg in messages if msg['role'] != 'system']
+        }
+        system = [msg['content'] for msg in messages if msg['role'] == 'system']
+        if system:
+            block = {'type': 'text', 'text': '\n\n'.join(system)}
+            if self.prompt_cache:
+                block['cache_control'] = {'type': 'ephemeral'}
+            request['system'] = [block]
+        return request
+
+    def _record_usage(self, usage) -> None:
+        if usage is not None:
+            record_prompt_usage(self.provider, self.model,
+                                input=getattr(usage, 'input_tokens', 0) or 0,
+                                cache_read=getattr(usage, 'cache_read_input_tokens', 0) or 0,
+                                cache_write=getattr(usage, 'cache_creation_input_tokens', 0) or 0)
+
+    def _record_stream_usage(self, stream) -> None:
+        try:
+            snapshot = stream.current_message_snapshot
+        except AssertionError:
+            # No event received yet
+            return
+        self._record_usage(snapshot.usage)
+
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         try:
-            # Convert messages to Anthropic format
-            formatted_messages = []
-            for msg in messages:
-                if msg['role'] == 'system':
-                    # Prepend system message to first user message
-                    formatted_messages.append({
-                        'role': 'user',
-                        'content': f"System: {msg['content']}"
-                    })
-                else:
-                    formatted_messages.append(msg)
+            response = self.client.messages.create(**self._request(messages))
+            self._record_usage(response.usage)
+            return response.content[0].text
+        except Exception as e:
+            print(f"Error in Anthropic chat: {e}")
+            return ""
 
+    def chat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = 'output',
+                        **kwargs) -> str:
+        try:
+            # Force a tool call whose input schema is the requested output schema
             response = self.client.messages.create(
-                model=self.model,
-                messages=formatted_messages,
-                max_tokens=4096
+                **self._request(messages),
+                tools=[{
+                    'name': name,
+                    'description': f"Return the {name} as structured data",
+                    'input_schema': schema
+                }],
+                tool_choice={'type': 'tool', 'name': name}
             )
+            self._record_usage(response.usage)
+            for block in response.content:
+                if block.type == 'tool_use':
+                    return json.dumps(block.input)
+            return ""
+        except Exception as e:
+            print(f"Error in Anthropic structured chat: {e}")
+            return ""
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        produced = False
+        try:
+            with self.client.messages.stream(**self._request(messages)) as stream:
+                try:
+                    for text in stream.text_stream:
+                        if text:
+                            produced = True
+                            yield text
+                finally:
+                    # Prompt usage is known from the first event, also when the stream is closed early
+                    self._record_stream_usage(stream)
+        except Exception as e:
+            print(f"Error in Anthropic stream: {e}")
+            if produced:
+                raise
+
+    def _async_client(self) -> anthropic.AsyncAnthropic:
+        return self._loop_client(lambda: anthropic.AsyncAnthropic(
+            api_key=self.api_key,
+            http_client=anthropic.DefaultAsyncHttpxClient(limits=async_http_limits())
+        ))
+
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        try:
+            response = await self._async_client().messages.create(**self._request(messages))
+            self._record_usage(response.usage)
             return response.content[0].text
         except Exception as e:
-            print(f"Error in Anthropic chat: {e}")
+            print(f"Error in Anthropic async chat: {e}")
+            return ""
+
+    async def astream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        produced = False
+        try:
+            async with self._async_client().messages.stream(**self._request(messages)) as stream:
+                try:
+                    async for text in stream.text_stream:
+                        if text:
+                            produced = True
+                            yield text
+                finally:
+                    self._record_stream_usage(stream)
+        except Exception as e:
+            print(f"Error in Anthropic async stream: {e}")
+            if produced:
+                raise
+
+    async def achat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any],
+                               name: str = 'output', **kwargs) -> str:
+        try:
+            response = await self._async_client().messages.create(
+                **self._request(messages),
+                tools=[{
+                    'name': name,
+                    'description': f"Return the {name} as structured data",
+                    'input_schema': schema
+                }],
+                tool_choice={'type': 'tool', 'name': name}
+            )
+            self._record_usage(response.usage)
+            for block in response.content:
+                if block.type == 'tool_use':
+                    return json.dumps(block.input)
+            return ""
+        except Exception as e:
+            print(f"Error in Anthropic async structured chat: {e}")
             return ""
 
     def is_available(self) -> bool:
@@ -1,9 +1,30 @@
+import asyncio
+import json
+import os
+import weakref
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator
+
+
+def async_http_limits():
+    """Connection pool limits shared by the async HTTP clients of all providers."""
+    import httpx
+    return httpx.Limits(
+        max_connections=int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', '20')),
+        max_keepalive_connections=int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', '10')),
+        keepalive_expiry=float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY', '60'))
+    )
+
 
 class BaseModel(ABC):
     """Base class for all language models"""
-    
+
+    # Provider name used for per-provider limits, e.g. 'ollama' or 'anthropic'
+    provider = 'base'
+
+    # Whether chat_structured() uses a native constrained-output mechanism
+    supports_structured_output = False
+
     @abstractmethod
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """
@@ -18,6 +39,85 @@ class BaseModel(ABC):
         """
         pass
 
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """
+        Send a chat request to the model and yield the response as it is generated
+
+        Providers without native streaming yield the full chat() response as a
+        single chunk. Closing the generator stops the generation. An error before
+        the first chunk gives an empty stream, like an empty chat() response; an
+        error after it is raised, so a truncated response is not taken for a
+        complete one.
+
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            **kwargs: Additional model-specific parameters
+
+        Yields:
+            str: Chunks of the model's response text
+        """
+        response = self.chat(messages, **kwargs)
+        if response:
+            yield response
+
+    def chat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = 'output',
+                        **kwargs) -> str:
+        """
+        Send a chat request and ask for a JSON object matching schema
+
+        Providers with native support constrain the output to the schema; the
+        default implementation appends the schema to the conversation and relies
+        on the model to follow it. Callers must still validate the result.
+
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            schema: JSON schema of the expected object
+            name: Short name of the output, used by tool-based providers
+            **kwargs: Additional model-specific parameters
+
+        Returns:
+            str: The JSON text returned by the model ("" on error)
+        """
+        instruction = {
+            'role': 'user',
+            'content': f"Respond only with a JSON object matching this JSON schema: {json.dumps(schema)}"
+        }
+        return self.chat(list(messages) + [instruction], **kwargs)
+
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """
+        Async version of chat()
+
+        The default implementation runs chat() in a worker thread; providers with
+        async clients override it so no thread is held during the generation.
+        """
+        return await asyncio.to_thread(self.chat, messages, **kwargs)
+
+    async def astream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """Async version of stream(); defaults to a single chunk from achat()."""
+        response = await self.achat(messages, **kwargs)
+        if response:
+            yield response
+
+    async def achat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any],
+                               name: str = 'output', **kwargs) -> str:
+        """Async version of chat_structured()."""
+        return await asyncio.to_thread(self.chat_structured, messages, schema, name, **kwargs)
+
+    def _loop_client(self, factory):
+        """
+        Return the async client for the running event loop, creating it with factory on first use
+
+        Async HTTP clients are bound to the loop they were created on, so one client
+        (and connection pool) is kept per loop and reused by every call on that loop.
+        """
+        loop = asyncio.get_running_loop()
+        clients = self.__dict__.setdefault('_loop_clients', weakref.WeakKeyDictionary())
+        client = clients.get(loop)
+        if client is None:
+            client = clients[loop] = factory()
+        return client
+
     @abstractmethod
     def is_available(self) -> bool:
         """Check if the model is available and properly configured"""
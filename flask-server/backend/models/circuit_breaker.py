@@ -0,0 +1,276 @@
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from .base_model import BaseModel
+from ..admission import Rejected
+from ..metrics import REGISTRY, Counter, Gauge
+
+CIRCUIT_STATES = ('closed', 'half_open', 'open')
+
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    'llm_circuit_state', 'Circuit breaker state per provider (0 closed, 1 half-open, 2 open)', ('provider',)))
+CIRCUIT_TRANSITIONS = REGISTRY.register(Counter(
+    'llm_circuit_transitions_total', 'Circuit breaker state changes per provider', ('provider', 'state')))
+CIRCUIT_SHORT_CIRCUITED = REGISTRY.register(Counter(
+    'llm_circuit_short_circuited_total', 'Model calls failed fast or failed over because the circuit was open',
+    ('provider',)))
+CIRCUIT_FAILOVERS = REGISTRY.register(Counter(
+    'llm_circuit_failovers_total', 'Model calls served by the fallback provider', ('provider', 'fallback')))
+
+
+class CircuitOpen(Rejected):
+    """Raised instead of calling a provider whose circuit is open."""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(provider, 'circuit_open', retry_after)
+        self.args = (f"{provider} is unavailable (circuit open), retry in {self.retry_after}s",)
+
+
+class CircuitBreaker:
+    """
+    Track consecutive failures of a provider and stop calling it while it is down
+
+    Closed: calls go through; `failure_threshold` consecutive failures open the
+    circuit. Open: calls are refused for `reset_timeout` seconds. Half-open: up
+    to `half_open_calls` probe calls go through at once; a successful probe
+    closes the circuit, a failed one opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_calls: int = 1):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = max(1, half_open_calls)
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.stats = {'successes': 0, 'failures': 0, 'short_circuited': 0, 'opened': 0}
+        CIRCUIT_STATE.set(0, provider=name)
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        print(f"Circuit breaker {self.name}: {self.state} -> {state}"
+              + (f" ({self.last_error})" if state == 'open' and self.last_error else ""))
+        self.state = state
+        CIRCUIT_STATE.set(CIRCUIT_STATES.index(state), provider=self.name)
+        CIRCUIT_TRANSITIONS.inc(provider=self.name, state=state)
+        if state == 'open':
+            self.opened_at = time.monotonic()
+            self.stats['opened'] += 1
+        if state != 'half_open':
+            self._probes = 0
+
+    def allow(self) -> bool:
+        """Return whether a call may go through; half-open probes must be settled with record_*()."""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._transition('half_open')
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self.stats['short_circuited'] += 1
+            CIRCUIT_SHORT_CIRCUITED.inc(provider=self.name)
+            return False
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit half-opens (0 if it is not open)."""
+        with self._lock:
+            if self.state != 'open':
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.stats['successes'] += 1
+            self.failures = 0
+            self._transition('closed')
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self.stats['failures'] += 1
+            self.failures += 1
+            self.last_error = error
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self._transition('open')
+
+    def record_abandoned(self) -> None:
+        """Settle a call that ended without an outcome (e.g. cancelled before its first chunk)."""
+        with self._lock:
+            if self.state == 'half_open' and self._probes:
+                self._probes -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        retry_after = self.retry_after()
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(state=self.state, consecutive_failures=self.failures, last_error=self.last_error,
+                         failure_threshold=self.failure_threshold, reset_timeout=self.reset_timeout)
+        stats['retry_after'] = round(retry_after, 1)
+        return stats
+
+
+class CircuitBreakerModel(BaseModel):
+    """
+    Wrap a model with a circuit breaker and an optional fallback model
+
+    An empty response or an exception counts as a failure, since providers
+    report errors as "". While the circuit is open, calls go to the fallback if
+    there is one and otherwise raise CircuitOpen immediately, so retry loops
+    and request threads do not pile up on a dead provider. A call that fails
+    while the circuit is closed is also retried once on the fallback.
+    provider and model stay those of the primary model, for limits and cache keys.
+    """
+
+    def __init__(self, inner: BaseModel, breaker: CircuitBreaker, fallback: Optional[BaseModel] = None):
+        self.inner = inner
+        self.breaker = breaker
+        self.fallback = fallback
+        self.provider = inner.provider
+        self.supports_structured_output = inner.supports_structured_output
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def _unavailable(self) -> CircuitOpen:
+        return CircuitOpen(self.provider, self.breaker.retry_after())
+
+    def _failover(self) -> BaseModel:
+        """The fallback model, counting the failover; raise CircuitOpen if there is none."""
+        if self.fallback is None:
+            raise self._unavailable()
+        CIRCUIT_FAILOVERS.inc(provider=self.provider, fallback=self.fallback.provider)
+        return self.fallback
+
+    def _call(self, method: str, *args, **kwargs) -> str:
+        if not self.breaker.allow():
+            return getattr(self._failover(), method)(*args, **kwargs)
+        try:
+            response = getattr(self.inner, method)(*args, **kwargs)
+        except Exception as e:
+            self.breaker.record_failure(str(e))
+            if self.fallback is None:
+                raise
+            return getattr(self._failover(), method)(*args, **kwargs)
+        if response:
+            self.breaker.record_success()
+            return response
+        self.breaker.record_failure('empty response')
+        return getattr(self._failover(), method)(*args, **kwargs) if self.fallback is not None else response
+
+    async def _acall(self, method: str, *args, **kwargs) -> str:
+        if not self.breaker.allow():
+            return await getattr(self._failover(), method)(*args, **kwargs)
+        try:
+            response = await getattr(self.inner, method)(*args, **kwargs)
+        except Exception as e:
+            self.breaker.record_failure(str(e))
+            if self.fallback is None:
+                raise
+            return await getattr(self._failover(), method)(*args, **kwargs)
+        except BaseException:
+            # Cancelled: no outcome
+            self.breaker.record_abandoned()
+            raise
+        if response:
+            self.breaker.record_success()
+            return response
+        self.breaker.record_failure('empty response')
+        return await getattr(self._failover(), method)(*args, **kwargs) if self.fallback is not None else response
+
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        return self._call('chat', messages, **kwargs)
+
+    def chat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = 'output',
+                        **kwargs) -> str:
+        return self._call('chat_structured', messages, schema, name, **kwargs)
+
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        return await self._acall('achat', messages, **kwargs)
+
+    async def achat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any],
+                               name: str = 'output', **kwargs) -> str:
+        return await self._acall('achat_structured', messages, schema, name, **kwargs)
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        if not self.breaker.allow():
+            yield from self._failover().stream(messages, **kwargs)
+            return
+
+        produced = False
+        failed = False
+        try:
+            for chunk in self.inner.stream(messages, **kwargs):
+                if not produced:
+                    produced = True
+                    self.breaker.record_success()
+                yield chunk
+        except Exception as e:
+            if produced:
+                raise
+            failed = True
+            self.breaker.record_failure(str(e))
+            if self.fallback is None:
+                raise
+        except BaseException:
+            # Closed or cancelled before the first chunk: no outcome
+            if not produced:
+                self.breaker.record_abandoned()
+            raise
+        if produced:
+            return
+        if not failed:
+            self.breaker.record_failure('empty response')
+        if self.fallback is not None:
+            yield from self._failover().stream(messages, **kwargs)
+
+    async def astream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        if not self.breaker.allow():
+            async for chunk in self._failover().astream(messages, **kwargs):
+                yield chunk
+            return
+
+        produced = False
+        failed = False
+        try:
+            async for chunk in self.inner.astream(messages, **kwargs):
+                if not produced:
+                    produced = True
+                    self.breaker.record_success()
+                yield chunk
+        except Exception as e:
+            if produced:
+                raise
+            failed = True
+            self.breaker.record_failure(str(e))
+            if self.fallback is None:
+                raise
+        except BaseException:
+            # Closed or cancelled before the first chunk: no outcome
+            if not produced:
+                self.breaker.record_abandoned()
+            raise
+        if produced:
+            return
+        if not failed:
+            self.breaker.record_failure('empty response')
+        if self.fallback is not None:
+            async for chunk in self._failover().astream(messages, **kwargs):
+                yield chunk
+
+    def is_available(self) -> bool:
+        if self.breaker.state == 'open':
+            return self.fallback is not None and self.fallback.is_available()
+        return self.inner.is_available() or (self.fallback is not None and self.fallback.is_available())
+
+    def circuit_stats(self) -> Dict[str, Any]:
+        stats = {self.provider: self.breaker.get_stats()}
+        if isinstance(self.fallback, CircuitBreakerModel):
+            stats.update(self.fallback.circuit_stats())
+        return stats
@@ -0,0 +1,83 @@
+import threading
+import time
+from typing import Callable, Optional
+
+
+class HealthMonitor:
+    """
+    Periodically run a health check in a background thread and cache the result
+
+    The cached state expires after `ttl` seconds, after which is_healthy() reports
+    None (unknown) until the next check completes. Callers on the hot path only read
+    the cached state and never wait for a check.
+    """
+
+    def __init__(self, check: Callable[[], bool], interval: float = 30.0, ttl: float = 60.0,
+                 name: str = 'health-monitor'):
+        self.check = check
+        self.interval = interval
+        self.ttl = ttl
+        self.name = name
+        self.healthy: Optional[bool] = None
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the background checks (no-op if already running)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def refresh(self) -> bool:
+        """Run the health check now and cache its result."""
+        try:
+            healthy = bool(self.check())
+            error = None if healthy else "health check returned False"
+        except Exception as e:
+            healthy = False
+            error = str(e)
+
+        if healthy != self.healthy:
+            state = "healthy" if healthy else f"unhealthy ({error})"
+            print(f"{self.name}: {state}")
+        self._record(healthy, error)
+        return healthy
+
+    def mark_healthy(self) -> None:
+        """Record a successful call made outside of the health check."""
+        self._record(True, None)
+
+    def mark_unhealthy(self, error: str) -> None:
+        """Record a failed call made outside of the health check."""
+        if self.healthy is not False:
+            print(f"{self.name}: unhealthy ({error})")
+        self._record(False, error)
+
+    def is_healthy(self) -> Optional[bool]:
+        """Return the cached state, or None if it was never checked or has expired."""
+        with self._lock:
+            if self.last_checked is None or time.monotonic() - self.last_checked > self.ttl:
+                return None
+            return self.healthy
+
+    def _record(self, healthy: bool, error: Optional[str]) -> None:
+        with self._lock:
+            self.healthy = healthy
+            self.last_error = error
+            self.last_checked = time.monotonic()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
@@ -0,0 +1,118 @@
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List
+from .base_model import BaseModel
+from ..metrics import (LLM_CALLS, LLM_LATENCY, LLM_TTFT, LLM_PROMPT_TOKENS, LLM_COMPLETION_TOKENS,
+                       LLM_TOKENS_PER_SECOND, current_stage, estimate_tokens)
+
+
+class InstrumentedModel(BaseModel):
+    """
+    Wrap a model and record latency, time to first token, token counts and throughput for every call
+
+    Metrics are labelled with provider, model name and the pipeline stage set via
+    metrics.stage(). Other attributes are delegated to the wrapped model.
+    """
+
+    def __init__(self, inner: BaseModel):
+        self.inner = inner
+        self.provider = inner.provider
+        self.supports_structured_output = inner.supports_structured_output
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def _labels(self) -> Dict[str, str]:
+        return {'provider': self.provider, 'model': getattr(self.inner, 'model', ''),
+                'stage': current_stage.get()}
+
+    def _record(self, method: str, messages, response: str, elapsed: float, labels: Dict[str, str],
+                failed: bool = False) -> None:
+        outcome = 'error' if failed else 'ok' if response else 'empty'
+        LLM_CALLS.inc(method=method, outcome=outcome, **labels)
+        LLM_LATENCY.observe(elapsed, method=method, **labels)
+        LLM_PROMPT_TOKENS.inc(estimate_tokens(messages), **labels)
+        if response:
+            tokens = estimate_tokens(response)
+            LLM_COMPLETION_TOKENS.inc(tokens, **labels)
+            LLM_TOKENS_PER_SECOND.observe(tokens / max(elapsed, 1e-3), **labels)
+
+    def _timed(self, method: str, call, messages):
+        labels = self._labels()
+        start = time.perf_counter()
+        response = ''
+        failed = False
+        try:
+            response = call()
+            return response
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(method, messages, response, time.perf_counter() - start, labels, failed)
+
+    async def _atimed(self, method: str, call, messages):
+        labels = self._labels()
+        start = time.perf_counter()
+        response = ''
+        failed = False
+        try:
+            response = await call()
+            return response
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(method, messages, response, time.perf_counter() - start, labels, failed)
+
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        return self._timed('chat', lambda: self.inner.chat(messages, **kwargs), messages)
+
+    def chat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = 'output',
+                        **kwargs) -> str:
+        return self._timed('chat_structured',
+                           lambda: self.inner.chat_structured(messages, schema, name, **kwargs), messages)
+
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        return await self._atimed('achat', lambda: self.inner.achat(messages, **kwargs), messages)
+
+    async def achat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any],
+                               name: str = 'output', **kwargs) -> str:
+        return await self._atimed('achat_structured',
+                                  lambda: self.inner.achat_structured(messages, schema, name, **kwargs), messages)
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        labels = self._labels()
+        start = time.perf_counter()
+        chunks = []
+        failed = False
+        try:
+            for chunk in self.inner.stream(messages, **kwargs):
+                if not chunks:
+                    LLM_TTFT.observe(time.perf_counter() - start, **labels)
+                chunks.append(chunk)
+                yield chunk
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record('stream', messages, ''.join(chunks), time.perf_counter() - start, labels, failed)
+
+    async def astream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        labels = self._labels()
+        start = time.perf_counter()
+        chunks = []
+        failed = False
+        try:
+            async for chunk in self.inner.astream(messages, **kwargs):
+                if not chunks:
+                    LLM_TTFT.observe(time.perf_counter() - start, **labels)
+                chunks.append(chunk)
+                yield chunk
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record('astream', messages, ''.join(chunks), time.perf_counter() - start, labels, failed)
+
+    def is_available(self) -> bool:
+        return self.inner.is_available()
@@ -2,7 +2,11 @@ import os
 from typing import Optional
 from .base_model import BaseModel
 from .ollama_model import OllamaModel
+from .ollama_pool_model import OllamaPoolModel
 from .anthropic_model import AnthropicModel
+from .instrumented_model import InstrumentedModel
+from .circuit_breaker import CircuitBreaker, CircuitBreakerModel
+from .replay_model import ReplayModel
 
 class ModelFactory:
     @staticmethod
@@ -11,7 +15,7 @@ class ModelFactory:
         Create and return a model instance based on the provider
         
         Args:
-            provider: Model provider name (ollama, anthropic)
+            provider: Model provider name (ollama, ollama_pool, anthropic, replay)
                      If None, uses DEFAULT_MODEL_PROVIDER from env
         
         Returns:
@@ -27,10 +31,49 @@ class ModelFactory:
             print(f"Using model provider: {provider}")
             print(f"Environment variables loaded: {dict(os.environ)}")
 
+        model = ModelFactory._instrumented(ModelFactory._create(provider))
+
+        # Fail fast while the provider is down, optionally failing over to LLM_FALLBACK_PROVIDER
+        if os.getenv('LLM_CIRCUIT_BREAKER', '1') == '1':
+            fallback_provider = os.getenv('LLM_FALLBACK_PROVIDER', '').lower().strip()
+            fallback = None
+            if fallback_provider and fallback_provider != provider:
+                print(f"Using fallback model provider: {fallback_provider}")
+                fallback = ModelFactory._with_breaker(
+                    ModelFactory._instrumented(ModelFactory._create(fallback_provider)))
+            model = ModelFactory._with_breaker(model, fallback)
+        return model
+
+    @staticmethod
+    def _instrumented(model: BaseModel) -> BaseModel:
+        # Record per-call latency and token metrics unless disabled
+        if os.getenv('LLM_METRICS', '1') == '1':
+            return InstrumentedModel(model)
+        return model
+
+    @staticmethod
+    def _with_breaker(model: BaseModel, fallback: Optional[BaseModel] = None) -> BaseModel:
+        breaker = CircuitBreaker(
+            model.provider,
+            failure_threshold=int(os.getenv('LLM_CIRCUIT_FAILURE_THRESHOLD', '5')),
+            reset_timeout=float(os.getenv('LLM_CIRCUIT_RESET_TIMEOUT', '30')),
+            half_open_calls=int(os.getenv('LLM_CIRCUIT_HALF_OPEN_CALLS', '1'))
+        )
+        return CircuitBreakerModel(model, breaker, fallback)
+
+    @staticmethod
+    def _create(provider: str) -> BaseModel:
         provider = provider.lower()
         if provider == 'ollama':
             return OllamaModel()
+        elif provider == 'ollama_pool':
+            return OllamaPoolModel()
         elif provider == 'anthropic':
             return AnthropicModel()
+        elif provider == 'replay':
+            # REPLAY_MODE=record passes calls through to REPLAY_UPSTREAM and records them
+            if os.getenv('REPLAY_MODE', 'replay') == 'record':
+                return ReplayModel(upstream=ModelFactory._create(os.getenv('REPLAY_UPSTREAM', 'ollama')))
+            return ReplayModel()
         else:
             raise ValueError(f"Unknown model provider: {provider}")
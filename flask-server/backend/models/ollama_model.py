@@ -1,37 +1,72 @@
+import json
 import os
-from typing import List, Dict
+from typing import Any, List, Dict, Iterator, AsyncIterator, Optional
 import ollama
-from .base_model import BaseModel
+from .base_model import BaseModel, async_http_limits
+from .health_monitor import HealthMonitor
+from ..metrics import record_prompt_usage
 
 class OllamaModel(BaseModel):
-    def __init__(self):
-        self.model = os.getenv('OLLAMA_MODEL', 'dolphin-llama3')
-        print(f"Initialized Ollama with model: {self.model}")
-        # Create Ollama client
-        self.client = ollama
+    provider = 'ollama'
+    supports_structured_output = True
+
+    def __init__(self, host: Optional[str] = None, model: Optional[str] = None):
+        self.model = model or os.getenv('OLLAMA_MODEL', 'dolphin-llama3')
+        self.host = host
+        print(f"Initialized Ollama with model: {self.model}" + (f" on {host}" if host else ""))
+        # Create Ollama client; without an explicit host the module-level client uses OLLAMA_HOST
+        self.client = ollama.Client(host=host) if host else ollama
+
+        # Model availability is checked in the background instead of before every chat
+        self.health = HealthMonitor(
+            self._model_listed,
+            interval=float(os.getenv('OLLAMA_HEALTH_INTERVAL', '30')),
+            ttl=float(os.getenv('OLLAMA_HEALTH_TTL', '60')),
+            name=f"ollama-health[{self.model}@{host or os.getenv('OLLAMA_HOST', 'default')}]"
+        )
+        self.health.start()
+
+    def _model_listed(self) -> bool:
+        """Check that Ollama is reachable and the configured model is pulled."""
+        models = self.client.list()
+        for model in models['models']:
+            name = getattr(model, 'model', None) or model.get('name', '')
+            if self.model in name:
+                return True
+        print(f"Model {self.model} not found in available models")
+        return False
+
+    def _record_usage(self, response) -> None:
+        # prompt_eval_count only counts prompt tokens not served from the KV cache
+        evaluated = response.get('prompt_eval_count') if hasattr(response, 'get') else None
+        if evaluated is not None:
+            record_prompt_usage(self.provider, self.model, evaluated=evaluated)
 
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         try:
-            print(f"Using Ollama model: {self.model}")
+            if self.health.is_healthy() is False:
+                # Known to be down: fail fast, the monitor will notice when it is back
+                return ""
+
             try:
-                # First check if model is available
-                models = self.client.list()
-                print(f"Available models: {models}")
-                
-                if not any(self.model in model['name'] for model in models['models']):
-                    print(f"Model {self.model} not found in available models")
-                    return ""
-                    
                 response = self.client.chat(
                     model=self.model,
                     messages=messages,
                     stream=False
                 )
+                self.health.mark_healthy()
+                self._record_usage(response)
                 return response['message']['content']
             except ConnectionError as e:
+                self.health.mark_unhealthy(str(e))
                 print(f"Connection error with Ollama: {e}")
                 print("Please ensure Ollama is running and accessible")
                 return ""
+            except ollama.ResponseError as e:
+                if e.status_code == 404:
+                    self.health.mark_unhealthy(str(e))
+                print(f"Error in Ollama chat: {e}")
+                return ""
             except Exception as e:
                 print(f"Error in Ollama chat: {e}")
                 return ""
@@ -39,10 +74,138 @@ class OllamaModel(BaseModel):
             print(f"Unexpected error in Ollama chat: {e}")
             return ""
 
-    def is_available(self) -> bool:
+    def chat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = 'output',
+                        **kwargs) -> str:
+        if self.health.is_healthy() is False:
+            return ""
+
+        try:
+            # Ollama constrains generation to the JSON schema passed as format
+            instruction = {'role': 'user', 'content': f"Respond with JSON matching: {json.dumps(schema)}"}
+            response = self.client.chat(
+                model=self.model,
+                messages=list(messages) + [instruction],
+                format=schema,
+                stream=False
+            )
+            self.health.mark_healthy()
+            self._record_usage(response)
+            return response['message']['content']
+        except ConnectionError as e:
+            self.health.mark_unhealthy(str(e))
+            print(f"Connection error with Ollama: {e}")
+            return ""
+        except Exception as e:
+            print(f"Error in Ollama structured chat: {e}")
+            return ""
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        if self.health.is_healthy() is False:
+            return
+
+        produced = False
+        try:
+            chunks = self.client.chat(
+                model=self.model,
+                messages=messages,
+                stream=True
+            )
+            for chunk in chunks:
+                content = chunk['message']['content']
+                if content:
+                    produced = True
+                    yield content
+                if chunk.get('done'):
+                    self._record_usage(chunk)
+            self.health.mark_healthy()
+        except ConnectionError as e:
+            self.health.mark_unhealthy(str(e))
+            print(f"Connection error with Ollama: {e}")
+            print("Please ensure Ollama is running and accessible")
+            if produced:
+                raise
+        except Exception as e:
+            print(f"Error in Ollama stream: {e}")
+            if produced:
+                raise
+
+    def _async_client(self) -> ollama.AsyncClient:
+        return self._loop_client(lambda: ollama.AsyncClient(host=self.host or os.getenv('OLLAMA_HOST'),
+                                                            limits=async_http_limits()))
+
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        if self.health.is_healthy() is False:
+            return ""
+
+        try:
+            response = await self._async_client().chat(
+                model=self.model,
+                messages=messages,
+                stream=False
+            )
+            self.health.mark_healthy()
+            self._record_usage(response)
+            return response['message']['content']
+        except ConnectionError as e:
+            self.health.mark_unhealthy(str(e))
+            print(f"Connection error with Ollama: {e}")
+            return ""
+        except Exception as e:
+            print(f"Error in Ollama async chat: {e}")
+            return ""
+
+    async def astream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        if self.health.is_healthy() is False:
+            return
+
+        produced = False
         try:
-            # List models to check if Ollama is running
-            self.client.list()
-            return True
-        except:
-            return False
+            chunks = await self._async_client().chat(
+                model=self.model,
+                messages=messages,
+                stream=True
+            )
+            async for chunk in chunks:
+                content = chunk['message']['content']
+                if content:
+                    produced = True
+                    yield content
+                if chunk.get('done'):
+                    self._record_usage(chunk)
+            self.health.mark_healthy()
+        except ConnectionError as e:
+            self.health.mark_unhealthy(str(e))
+            print(f"Connection error with Ollama: {e}")
+            if produced:
+                raise
+        except Exception as e:
+            print(f"Error in Ollama async stream: {e}")
+            if produced:
+                raise
+
+    async def achat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any],
+                               name: str = 'output', **kwargs) -> str:
+        if self.health.is_healthy() is False:
+            return ""
+
+        try:
+            instruction = {'role': 'user', 'content': f"Respond with JSON matching: {json.dumps(schema)}"}
+            response = await self._async_client().chat(
+                model=self.model,
+                messages=list(messages) + [instruction],
+                format=schema,
+                stream=False
+            )
+            self.health.mark_healthy()
+            self._record_usage(response)
+            return response['message']['content']
+        except Exception as e:
+            print(f"Error in Ollama async structured chat: {e}")
+            return ""
+
+    def is_available(self) -> bool:
+        # Use the cached state; only check synchronously if it is unknown or expired
+        healthy = self.health.is_healthy()
+        if healthy is None:
+            healthy = self.health.refresh()
+        return healthy
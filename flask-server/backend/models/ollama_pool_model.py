@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from .base_model import BaseModel
+from .ollama_model import OllamaModel
+
+
+class _PoolMember:
+    def __init__(self, model: OllamaModel):
+        self.model = model
+        self.host = model.host
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        # Exponentially weighted tokens/sec the host delivers across all its concurrent
+        # requests (its capacity); None until the first response
+        self.tokens_per_second: Optional[float] = None
+
+    @property
+    def healthy(self) -> bool:
+        # Unknown (not yet probed) counts as healthy so a fresh pool can serve immediately
+        return self.model.health.is_healthy() is not False
+
+    def score(self, default_speed: float) -> float:
+        """Lower is better: outstanding requests divided by capacity (default_speed until measured)."""
+        return (self.outstanding + 1) / (self.tokens_per_second or default_speed)
+
+
+class OllamaPoolModel(BaseModel):
+    """
+    Load-balanced pool of Ollama hosts serving the same model
+
+    Each call goes to the healthy host with the fewest outstanding requests,
+    weighted by the tokens/sec that host delivers in total. A response at r
+    tokens/sec while n requests shared the host counts as n * r. Hosts not
+    measured yet are weighted by the mean of the measured ones, so a first
+    response does not draw all the traffic to its host. Hosts whose health check or
+    calls fail are ejected, and the background health monitor of each host probes
+    it and re-admits it once it responds again.
+
+    Hosts are read from OLLAMA_HOSTS (comma-separated URLs).
+    """
+
+    provider = 'ollama_pool'
+    supports_structured_output = True
+
+    # Weight of the newest observation in the tokens/sec moving average
+    SPEED_SMOOTHING = 0.3
+
+    def __init__(self, hosts: Optional[List[str]] = None, model: Optional[str] = None):
+        if hosts is None:
+            hosts = [h.strip() for h in os.getenv('OLLAMA_HOSTS', '').split(',') if h.strip()]
+        if not hosts:
+            raise ValueError("OLLAMA_HOSTS environment variable is not set")
+
+        self.model = model or os.getenv('OLLAMA_MODEL', 'dolphin-llama3')
+        self.members = [_PoolMember(OllamaModel(host=host, model=self.model)) for host in hosts]
+        self._lock = threading.Lock()
+        print(f"Initialized Ollama pool with {len(self.members)} hosts: {', '.join(hosts)}")
+
+    def _pick(self, exclude=()) -> Optional[_PoolMember]:
+        with self._lock:
+            candidates = [m for m in self.members if m.healthy and m not in exclude]
+            if not candidates:
+                return None
+            measured = [m.tokens_per_second for m in self.members if m.tokens_per_second]
+            default_speed = sum(measured) / len(measured) if measured else 1.0
+            member = min(candidates, key=lambda m: m.score(default_speed))
+            member.outstanding += 1
+            member.requests += 1
+            return member
+
+    def _release(self, member: _PoolMember, text: str, started: float, sharing: int) -> None:
+        """Settle a call that started with `sharing` requests in flight on the host (itself included)."""
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            # Requests that overlapped this one: those in flight when it started, or now, if more
+            sharing = max(sharing, member.outstanding)
+            member.outstanding -= 1
+            if not text:
+                member.failures += 1
+                return
+            # Roughly four characters per token; the host served `sharing` such streams at once
+            speed = sharing * (len(text) / 4) / max(elapsed, 1e-3)
+            if member.tokens_per_second is None:
+                member.tokens_per_second = speed
+            else:
+                member.tokens_per_second += self.SPEED_SMOOTHING * (speed - member.tokens_per_second)
+
+    @contextmanager
+    def _routed(self, exclude=()):
+        member = self._pick(exclude)
+        if member is None:
+            yield None, None
+            return
+        result = {'text': ''}
+        with self._lock:
+            sharing = member.outstanding
+        started = time.perf_counter()
+        try:
+            yield member, result
+        finally:
+            self._release(member, result['text'], started, sharing)
+
+    def _call(self, method: str, *args, **kwargs) -> str:
+        """Call method on the best host, failing over to the next one if the host went down."""
+        tried = []
+        while True:
+            with self._routed(tried) as (member, result):
+                if member is None:
+                    print("No healthy Ollama hosts available")
+                    return ""
+                tried.append(member)
+                result['text'] = getattr(member.model, method)(*args, **kwargs)
+                if result['text'] or member.healthy:
+                    return result['text']
+            print(f"Ollama host {member.host} failed, trying another host")
+
+    async def _acall(self, method: str, *args, **kwargs) -> str:
+        tried = []
+        while True:
+            with self._routed(tried) as (member, result):
+                if member is None:
+                    print("No healthy Ollama hosts available")
+                    return ""
+                tried.append(member)
+                result['text'] = await getattr(member.model, method)(*args, **kwargs)
+                if result['text'] or member.healthy:
+                    return result['text']
+            print(f"Ollama host {member.host} failed, trying another host")
+
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        return self._call('chat', messages, **kwargs)
+
+    def chat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = 'output',
+                        **kwargs) -> str:
+        return self._call('chat_structured', messages, schema, name, **kwargs)
+
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        return await self._acall('achat', messages, **kwargs)
+
+    async def achat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any],
+                               name: str = 'output', **kwargs) -> str:
+        return await self._acall('achat_structured', messages, schema, name, **kwargs)
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        with self._routed() as (member, result):
+            if member is None:
+                print("No healthy Ollama hosts available")
+                return
+            chunks = []
+            try:
+                for chunk in member.model.stream(messages, **kwargs):
+                    chunks.append(chunk)
+                    yield chunk
+            finally:
+                result['text'] = ''.join(chunks)
+
+    async def astream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        with self._routed() as (member, result):
+            if member is None:
+                print("No healthy Ollama hosts available")
+                return
+            chunks = []
+            try:
+                async for chunk in member.model.astream(messages, **kwargs):
+                    chunks.append(chunk)
+                    yield chunk
+            finally:
+                result['text'] = ''.join(chunks)
+
+    def is_available(self) -> bool:
+        return any(member.model.is_available() for member in self.members)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{
+                'host': m.host,
+                'healthy': m.healthy,
+                'outstanding': m.outstanding,
+                'requests': m.requests,
+                'failures': m.failures,
+                'tokens_per_second': m.tokens_per_second,
+            } for m in self.members]
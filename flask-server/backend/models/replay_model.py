@@ -0,0 +1,272 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from .base_model import BaseModel
+
+
+def _open(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def exchange_key(kind: str, messages: List[Dict[str, str]], schema: Optional[Dict[str, Any]] = None) -> str:
+    """Stable key of a chat exchange: the request kind, the messages and the output schema."""
+    payload = json.dumps({'kind': kind, 'messages': messages, 'schema': schema},
+                         sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _system_key(messages: List[Dict[str, str]]) -> str:
+    system = ''.join(m.get('content', '') for m in messages if m.get('role') == 'system')
+    return hashlib.sha256(system.encode('utf-8')).hexdigest()
+
+
+class ReplayModel(BaseModel):
+    """
+    Record real chat exchanges to an on-disk corpus and replay them without a model
+
+    In record mode every call goes to the upstream model and the response, its
+    latency and its time to first token are appended to the corpus (JSON lines,
+    gzip-compressed when the path ends in .gz). In replay mode responses come from
+    the corpus: an exchange recorded several times is replayed in recorded order,
+    and a request that was never recorded gets a recorded response for the same
+    system prompt, picked deterministically from the request. With
+    REPLAY_LATENCY=recorded, replayed calls wait for the recorded time to first
+    token and stream the rest at the recorded rate, scaled by REPLAY_SPEED.
+    """
+
+    provider = 'replay'
+    supports_structured_output = True
+
+    # Characters per replayed stream chunk, roughly one token
+    CHUNK_SIZE = 4
+
+    def __init__(self, upstream: Optional[BaseModel] = None, path: Optional[str] = None,
+                 simulate_latency: Optional[bool] = None, speed: Optional[float] = None):
+        self.upstream = upstream
+        self.recording = upstream is not None
+        self.path = path or os.getenv('REPLAY_CORPUS', os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'replay_corpus.jsonl.gz'))
+        if simulate_latency is None:
+            simulate_latency = os.getenv('REPLAY_LATENCY', 'none') == 'recorded'
+        self.simulate_latency = simulate_latency
+        self.speed = speed if speed is not None else float(os.getenv('REPLAY_SPEED', '1'))
+        self.model = getattr(upstream, 'model', None) or 'replay'
+        if self.recording:
+            # Recorded exchanges keep the upstream provider's limits
+            self.provider = upstream.provider
+            self.supports_structured_output = upstream.supports_structured_output
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_system: Dict[tuple, List[Dict[str, Any]]] = {}
+        self._cursors: Dict[str, int] = {}
+        self.stats = {'hits': 0, 'fallbacks': 0, 'misses': 0, 'recorded': 0}
+        self._load()
+        mode = f"recording from {upstream.provider}" if self.recording else "replaying"
+        print(f"Initialized replay model ({mode}) with {self.size()} exchanges from {self.path}")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with _open(self.path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        self._index(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A truncated last line from an interrupted recording
+                        continue
+
+    def _index(self, entry: Dict[str, Any]) -> None:
+        self._entries.setdefault(entry['key'], []).append(entry)
+        if not entry.get('partial'):
+            self._by_system.setdefault((entry['kind'], entry['system']), []).append(entry)
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._entries.values())
+
+    def _record(self, kind: str, messages, schema, response: str, started: float,
+                first_chunk: Optional[float] = None, partial: bool = False) -> None:
+        if not response:
+            # Failed upstream calls are not worth replaying
+            return
+        now = time.perf_counter()
+        entry = {
+            'key': exchange_key(kind, messages, schema),
+            'kind': kind,
+            'system': _system_key(messages),
+            'response': response,
+            'latency': round(now - started, 4),
+            'ttft': round((first_chunk or now) - started, 4),
+        }
+        if partial:
+            entry['partial'] = True
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with _open(self.path, 'a') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._index(entry)
+            self.stats['recorded'] += 1
+
+    def _lookup(self, kind: str, messages, schema=None, allow_partial: bool = False) -> Optional[Dict[str, Any]]:
+        key = exchange_key(kind, messages, schema)
+        with self._lock:
+            entries = [e for e in self._entries.get(key, ()) if allow_partial or not e.get('partial')]
+            if entries:
+                # Repeated requests (e.g. retries) get the recorded responses in order
+                cursor = self._cursors.get(key, 0)
+                self._cursors[key] = cursor + 1
+                self.stats['hits'] += 1
+                return entries[cursor % len(entries)]
+
+            candidates = self._by_system.get((kind, _system_key(messages)))
+            if candidates:
+                self.stats['fallbacks'] += 1
+                return candidates[int(key, 16) % len(candidates)]
+
+            self.stats['misses'] += 1
+            return None
+
+    def _chunks(self, entry: Dict[str, Any]):
+        """Split a recorded response into chunks with the delay before each one."""
+        text = entry['response']
+        chunks = [text[i:i + self.CHUNK_SIZE] for i in range(0, len(text), self.CHUNK_SIZE)]
+        if not self.simulate_latency or self.speed <= 0:
+            return [(0.0, chunk) for chunk in chunks]
+        ttft = entry.get('ttft', 0) / self.speed
+        rest = max(entry.get('latency', 0) / self.speed - ttft, 0)
+        step = rest / max(len(chunks) - 1, 1)
+        return [(ttft if i == 0 else step, chunk) for i, chunk in enumerate(chunks)]
+
+    def _delay(self, entry: Dict[str, Any]) -> float:
+        if not self.simulate_latency or self.speed <= 0:
+            return 0.0
+        return entry.get('latency', 0) / self.speed
+
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        if self.recording:
+            started = time.perf_counter()
+            response = self.upstream.chat(messages, **kwargs)
+            self._record('chat', messages, None, response, started)
+            return response
+
+        entry = self._lookup('chat', messages)
+        if entry is None:
+            return ""
+        time.sleep(self._delay(entry))
+        return entry['response']
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        if self.recording:
+            started = time.perf_counter()
+            first_chunk = None
+            chunks = []
+            completed = False
+            try:
+                for chunk in self.upstream.stream(messages, **kwargs):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter()
+                    chunks.append(chunk)
+                    yield chunk
+                completed = True
+            finally:
+                # A stream closed early (e.g. by the parser) is only replayed to streaming calls
+                self._record('chat', messages, None, ''.join(chunks), started, first_chunk, partial=not completed)
+            return
+
+        entry = self._lookup('chat', messages, allow_partial=True)
+        if entry is None:
+            return
+        for delay, chunk in self._chunks(entry):
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+    def chat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str = 'output',
+                        **kwargs) -> str:
+        if self.recording:
+            started = time.perf_counter()
+            response = self.upstream.chat_structured(messages, schema, name, **kwargs)
+            self._record('structured', messages, schema, response, started)
+            return response
+
+        entry = self._lookup('structured', messages, schema)
+        if entry is None:
+            return ""
+        time.sleep(self._delay(entry))
+        return entry['response']
+
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        if self.recording:
+            started = time.perf_counter()
+            response = await self.upstream.achat(messages, **kwargs)
+            self._record('chat', messages, None, response, started)
+            return response
+
+        entry = self._lookup('chat', messages)
+        if entry is None:
+            return ""
+        await asyncio.sleep(self._delay(entry))
+        return entry['response']
+
+    async def astream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        if self.recording:
+            started = time.perf_counter()
+            first_chunk = None
+            chunks = []
+            completed = False
+            try:
+                async for chunk in self.upstream.astream(messages, **kwargs):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter()
+                    chunks.append(chunk)
+                    yield chunk
+                completed = True
+            finally:
+                self._record('chat', messages, None, ''.join(chunks), started, first_chunk, partial=not completed)
+            return
+
+        entry = self._lookup('chat', messages, allow_partial=True)
+        if entry is None:
+            return
+        for delay, chunk in self._chunks(entry):
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+    async def achat_structured(self, messages: List[Dict[str, str]], schema: Dict[str, Any],
+                               name: str = 'output', **kwargs) -> str:
+        if self.recording:
+            started = time.perf_counter()
+            response = await self.upstream.achat_structured(messages, schema, name, **kwargs)
+            self._record('structured', messages, schema, response, started)
+            return response
+
+        entry = self._lookup('structured', messages, schema)
+        if entry is None:
+            return ""
+        await asyncio.sleep(self._delay(entry))
+        return entry['response']
+
+    def is_available(self) -> bool:
+        if self.recording:
+            return self.upstream.is_available()
+        return self.size() > 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['exchanges'] = self.size()
+        stats['mode'] = 'record' if self.recording else 'replay'
+        return stats
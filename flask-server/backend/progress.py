@@ -0,0 +1,83 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+_current = contextvars.ContextVar('progress', default=None)
+
+
+class Progress:
+    """
+    Progress of one generation request
+
+    Counts the model calls made for the request (steps, including retries and
+    repairs) and the recipes written so far. Updated from every thread and task
+    working on the request; on_change, if given, is called after every update.
+    """
+
+    def __init__(self, on_change: Optional[Callable[[], Any]] = None):
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self.stage = 'queued'
+        self.steps = 0
+        self.recipes_total: Optional[int] = None
+        self.recipes_done = 0
+
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            self.on_change()
+
+    def step(self) -> None:
+        """Record one model call."""
+        with self._lock:
+            self.steps += 1
+        self._changed()
+
+    def update(self, stage: Optional[str] = None, recipes_total: Optional[int] = None,
+               recipes_done: Optional[int] = None) -> None:
+        with self._lock:
+            if stage is not None:
+                self.stage = stage
+            if recipes_total is not None:
+                self.recipes_total = recipes_total
+            if recipes_done is not None:
+                self.recipes_done = recipes_done
+        self._changed()
+
+    @property
+    def fraction(self) -> float:
+        """Rough completion: the recipe list counts as one unit of work, like each recipe."""
+        if self.stage == 'done':
+            return 1.0
+        if self.recipes_total is None:
+            return 0.0
+        return (1 + self.recipes_done) / (1 + self.recipes_total)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {'stage': self.stage, 'steps': self.steps, 'recipes_total': self.recipes_total,
+                        'recipes_done': self.recipes_done}
+        snapshot['fraction'] = round(self.fraction, 3)
+        return snapshot
+
+
+def current() -> Optional[Progress]:
+    """Progress of the request being served by the calling thread or task, if any."""
+    return _current.get()
+
+
+def step() -> None:
+    """Record a model call on the current request's progress, if any."""
+    progress = _current.get()
+    if progress is not None:
+        progress.step()
+
+
+@contextmanager
+def scope(progress: Optional[Progress]):
+    """Make progress the current request's progress inside the block."""
+    reset = _current.set(progress)
+    try:
+        yield progress
+    finally:
+        _current.reset(reset)
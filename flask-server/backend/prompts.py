@@ -0,0 +1,109 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from .metrics import estimate_tokens
+
+_EXAMPLE = re.compile(r'^Example \d+:[ \t]*$', re.M)
+
+
+def split_examples(text: str) -> Tuple[str, List[str], str]:
+    """
+    Split a system prompt into (instructions, examples, closing)
+
+    Examples start at lines 'Example N:'; the closing is the final 'Remember: ...'
+    paragraph after the last example, if any.
+    """
+    starts = [m.start() for m in _EXAMPLE.finditer(text)]
+    if not starts:
+        return text, [], ''
+    instructions = text[:starts[0]]
+    examples = [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+    closing = ''
+    index = examples[-1].find('\nRemember:')
+    if index != -1:
+        closing = examples[-1][index + 1:]
+        examples[-1] = examples[-1][:index + 1]
+    return instructions, examples, closing
+
+
+class PromptRegistry:
+    """
+    System prompts of the pipeline stages, loaded once and reloaded only when a file changes
+
+    Every stage has a 'full' variant (the original prompt file) and a 'compact' one
+    (condensed instructions from '<file>_compact'), each followed by the first
+    `few_shot` worked examples of the original prompt. The system prompt of a stage
+    is the same string for every request, so the static prefix is byte-identical
+    and provider-side prefix caching applies; everything request-specific goes in
+    the user message.
+    """
+
+    FILES = {'write_recipe': 'system_prompt', 'create_recipe_list': 'system_prompt2'}
+
+    def __init__(self, directory: str, variant: str = 'full', few_shot: Optional[int] = None):
+        if variant not in ('full', 'compact'):
+            raise ValueError(f"Unknown prompt variant: {variant}")
+        self.directory = directory
+        self.variant = variant
+        # None keeps all examples of the full prompt and one example in the compact prompt
+        self.few_shot = few_shot if few_shot is not None else (None if variant == 'full' else 1)
+        self._lock = threading.Lock()
+        self._prompts: Dict[str, str] = {}
+        self._mtimes: Dict[str, Tuple] = {}
+
+    def paths(self) -> List[str]:
+        """Files the prompts are built from, e.g. to watch them for changes."""
+        paths = []
+        for name in self.FILES.values():
+            paths.append(os.path.join(self.directory, name))
+            if self.variant == 'compact':
+                paths.append(os.path.join(self.directory, f"{name}_compact"))
+        return paths
+
+    @property
+    def signature(self) -> str:
+        """Identifies the prompt layout (variant and examples) for cache keys, which fingerprint the files."""
+        return f"{self.variant}:{self.few_shot}"
+
+    def _build(self, stage: str) -> str:
+        name = self.FILES[stage]
+        with open(os.path.join(self.directory, name), 'r') as f:
+            full = f.read()
+        if self.variant == 'full' and self.few_shot is None:
+            return full
+
+        instructions, examples, closing = split_examples(full)
+        examples = examples[:self.few_shot] if self.few_shot is not None else examples
+        if self.variant == 'compact':
+            with open(os.path.join(self.directory, f"{name}_compact"), 'r') as f:
+                return f.read() + ''.join(examples)
+        return instructions + ''.join(examples) + closing
+
+    def _stamp(self, stage: str) -> Tuple:
+        name = self.FILES[stage]
+        stamp = []
+        for path in (os.path.join(self.directory, name), os.path.join(self.directory, f"{name}_compact")):
+            try:
+                stamp.append(os.path.getmtime(path))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def system(self, stage: str) -> str:
+        """Return the system prompt of a stage ('write_recipe' or 'create_recipe_list')."""
+        stamp = self._stamp(stage)
+        with self._lock:
+            if self._mtimes.get(stage) != stamp or stage not in self._prompts:
+                self._prompts[stage] = self._build(stage)
+                self._mtimes[stage] = stamp
+            return self._prompts[stage]
+
+    def describe(self) -> Dict[str, Dict]:
+        """Size of every stage's system prompt, in characters and estimated tokens."""
+        described = {}
+        for stage in self.FILES:
+            prompt = self.system(stage)
+            described[stage] = {'variant': self.variant, 'few_shot': self.few_shot,
+                                'chars': len(prompt), 'tokens': estimate_tokens(prompt)}
+        return described
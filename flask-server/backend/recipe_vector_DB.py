@@ -1,43 +1,40 @@
-import weaviate
 import yaml
-from weaviate.classes import config as wvcc
-from weaviate.classes.query import MetadataQuery
-import pandas as pd
+from contextlib import contextmanager
 from typing import Dict, List, Any
 import atexit
-import os
 import time
+from .singleflight import SingleFlight
+from .admission import Rejected
+from .ingest import RECIPE_KEY, object_id, recipe_ingestion
+from .metrics import DB_QUERY_LATENCY
+from .snapshot import Snapshot, boot_collection
+from .vector_store import create_store
+
+# Properties embedded by the in-process vector store: searches are mostly by ingredients,
+# and long instructions would drown them out
+VECTOR_PROPERTIES = ('title', 'ingredients')
 
 
 class RecipeDB:
-    def __init__(self, collection_name="Recipe", schema_path="schema2.yaml", backup_path="backups"):
+    def __init__(self, collection_name="Recipe", schema_path="schema2.yaml", backup_path=None):
+        started = time.perf_counter()
         try:
-            self.client = weaviate.connect_to_local()
+            self.store = create_store(collection_name, vector_properties=VECTOR_PROPERTIES)
             self.collection_name = collection_name
             self.schema_path = schema_path
+            # Snapshot directory, SNAPSHOT_DIR by default
             self.backup_path = backup_path
+            self.snapshot = Snapshot(self.store, backup_path)
+            # Concurrent identical searches share one near_text query
+            self.search_flights = SingleFlight('recipe_search')
+            # Throughput report of the last import, if this process ran one
+            self.ingest_report = None
             atexit.register(self.close)
 
-            # Try to get existing collection
-            try:
-                self.collection = self.client.collections.get(self.collection_name)
-                # Check if collection has data
-                try:
-                    count = self.collection.query.fetch_objects(limit=1)
-                    if hasattr(count, 'objects') and len(count.objects) > 0:
-                        print(f"Connected to existing collection: {self.collection_name}")
-                        return
-                except Exception as e:
-                    print(f"Collection exists but may be empty: {e}")
-                
-                print("Recreating collection...")
-                self.client.collections.delete(self.collection_name)
-            except weaviate.exceptions.UnexpectedStatusCodeError:
-                print("No existing collection found. Creating new one...")
-
-            # Create new collection and initialize
-            self._create_collection_from_schema()
-            self._initialize_from_huggingface()
+            # Existing collection, then the local snapshot, then an import (see snapshot.boot_collection)
+            self.boot_report = boot_collection(
+                self.store, recipe_ingestion(self.store), self._create_collection_from_schema,
+                self._initialize_from_huggingface, self.sync, self.snapshot, started=started)
 
         except Exception as e:
             print(f"Error during initialization: {e}")
@@ -49,70 +46,38 @@ class RecipeDB:
             with open(self.schema_path, 'r') as file:
                 schema = yaml.safe_load(file)
 
-            properties = [
-                wvcc.Property(
-                    name=prop['name'],
-                    data_type=wvcc.DataType.TEXT
-                ) for prop in schema['properties']
-            ]
-
-            self.collection = self.client.collections.create(
-                name=self.collection_name,
-                vectorizer_config=wvcc.Configure.Vectorizer.text2vec_transformers(),
-                properties=properties
-            )
+            self.store.create([prop['name'] for prop in schema['properties']])
             print(f"Created new collection: {self.collection_name}")
 
         except Exception as e:
             print(f"Error creating collection: {e}")
             raise
 
-    def _initialize_from_huggingface(self):
-        """Initialize the database from HuggingFace dataset."""
+    def _initialize_from_huggingface(self, restart: bool = True):
+        """Initialize the database from HuggingFace dataset, streamed in chunks (see ingest.Ingestion)."""
         try:
             print("Loading data from HuggingFace...")
-            df = pd.read_csv(
-                "hf://datasets/Hieu-Pham/kaggle_food_recipes/Food Ingredients and Recipe Dataset with Image Name Mapping.csv")
-
-            total = len(df)
-            batch_size = 100
-            batches = (total + batch_size - 1) // batch_size
-
-            # Check existing progress
-            try:
-                existing_count = self.collection.query.fetch_objects(limit=1, offset=0).total_results
-                start_batch = existing_count // batch_size
-                print(f"\nResuming from batch {start_batch} ({existing_count} recipes already imported)")
-            except:
-                start_batch = 0
-                print(f"\nStarting new import of {total} recipes in {batches} batches:")
-
-            for batch_num in range(start_batch, batches):
-                start_idx = batch_num * batch_size
-                end_idx = min(start_idx + batch_size, total)
-
-                with self.collection.batch.dynamic() as batch:
-                    for _, recipe in df.iloc[start_idx:end_idx].iterrows():
-                        cleaned_recipe = {
-                            'title': str(recipe.get('Title', '')),
-                            'ingredients': str(recipe.get('Ingredients', '')),
-                            'instructions': str(recipe.get('Instructions', ''))
-                        }
-                        if all(cleaned_recipe.values()):
-                            batch.add_object(properties=cleaned_recipe)
-
-                print(f"\rProgress: {((batch_num + 1) / batches * 100):.1f}% ({end_idx}/{total} recipes)", end='',
-                      flush=True)
-
-            print("\nImport completed!")
+            # restart=False resumes an interrupted import from its checkpoint
+            self.ingest_report = recipe_ingestion(self.store).run(restart=restart)
 
         except Exception as e:
             print(f"Error loading data: {e}")
             raise
 
+    def sync(self) -> Dict[str, Any]:
+        """Apply the changes of the source dataset to the collection (see ingest.Ingestion.sync)."""
+        try:
+            ingestion = recipe_ingestion(self.store)
+            self.ingest_report = ingestion.sync()
+            self.snapshot.refresh(ingestion.source, self.ingest_report)
+            return self.ingest_report
+        except Exception as e:
+            print(f"Error syncing collection: {e}")
+            raise
+
     def _backup_exists(self) -> bool:
-        """Check if a backup exists in the specified path."""
-        return os.path.exists(self.backup_path) and len(os.listdir(self.backup_path)) > 0
+        """Check if a snapshot exists in the snapshot directory."""
+        return self.snapshot.exists()
 
     def _create_and_backup_db(self):
         """Create new database and save backup."""
@@ -131,93 +96,56 @@ class RecipeDB:
             raise
 
     def _create_backup(self):
-        """Create a backup of the database."""
+        """Create a snapshot of the database (see snapshot.Snapshot)."""
         try:
-            # Ensure backup directory exists
-            os.makedirs(self.backup_path, exist_ok=True)
-
-            # Create backup
-            backup_id = f"backup_{int(time.time())}"
-            self.client.backup.create(
-                backup_id=backup_id,
-                backend="filesystem",
-                include_collections=[self.collection_name],
-                wait_for_completion=True,
-                backend_settings={
-                    "local_path": self.backup_path
-                }
-            )
-
-            # Save backup ID for future reference
-            with open(os.path.join(self.backup_path, "latest_backup.txt"), "w") as f:
-                f.write(backup_id)
+            self.snapshot.save(recipe_ingestion(self.store).source)
 
         except Exception as e:
             print(f"Error creating backup: {e}")
             raise
 
     def _restore_from_backup(self):
-        """Restore database from backup."""
+        """Restore database from the snapshot, verified by count and checksum."""
         try:
-            # Get latest backup ID
-            with open(os.path.join(self.backup_path, "latest_backup.txt"), "r") as f:
-                backup_id = f.read().strip()
-
-            print(f"Restoring from backup: {backup_id}")
-
-            # Restore backup
-            self.client.backup.restore(
-                backup_id=backup_id,
-                backend="filesystem",
-                include_collections=[self.collection_name],
-                wait_for_completion=True,
-                backend_settings={
-                    "local_path": self.backup_path
-                }
-            )
-
-            # Get the restored collection
-            self.collection = self.client.collections.get(self.collection_name)
-
-            # Verify restoration
-            count = self.collection.aggregate.over_all(total_count=True).total_count
-            print(f"Restored {count} recipes successfully!")
+            manifest = self.snapshot.restore(self.snapshot.check(recipe_ingestion(self.store).source))
+            print(f"Restored {manifest['count']} recipes successfully!")
 
         except Exception as e:
             print(f"Error restoring backup: {e}")
             raise
 
     def _ensure_collection(self):
-        """Ensure the collection exists and is properly initialized."""
+        """Ensure the collection exists and holds the current source data, writing only what changed."""
         try:
-            # Try to delete existing collection if it exists
-            try:
-                self.client.collections.delete(self.collection_name)
-                print(f"Deleted existing collection: {self.collection_name}")
-            except Exception:
-                pass
+            if not self.store.exists():
+                print("Creating new collection...")
+                self._create_collection_from_schema()
 
-            # Create new collection
-            print("Creating new collection...")
-            self._create_collection_from_schema()
-
-            # Initialize with data
-            print("Initializing with data...")
-            self._initialize_from_huggingface()
+            if self.store.count() == 0:
+                print("Initializing with data...")
+                self._initialize_from_huggingface()
+                self.snapshot.refresh(recipe_ingestion(self.store).source)
+            else:
+                self.sync()
 
             # Verify collection exists
-            self.collection = self.client.collections.get(self.collection_name)
-            count = self.collection.aggregate.over_all(total_count=True).total_count
+            count = self.store.count()
             print(f"Collection initialized with {count} recipes")
 
         except Exception as e:
             print(f"Error ensuring collection: {e}")
             raise
 
+    @contextmanager
+    def _query(self, operation: str):
+        """Admit (see VectorStore.admit) and time one query of this collection."""
+        with self.store.admit(), DB_QUERY_LATENCY.time(collection=self.collection_name, operation=operation):
+            yield
+
     def close(self):
         try:
-            if hasattr(self, 'client'):
-                self.client.close()
+            if hasattr(self, 'store'):
+                self.store.close()
         except Exception as e:
             print(f"Error closing connection: {e}")
 
@@ -233,20 +161,23 @@ class RecipeDB:
                 start_idx = batch_num * batch_size
                 end_idx = min(start_idx + batch_size, total)
 
-                with self.collection.batch.dynamic() as batch:
-                    for recipe in recipes_list[start_idx:end_idx]:
-                        cleaned_recipe = {
-                            'title': str(recipe.get('Title', '')),
-                            'ingredients': str(recipe.get('Ingredients', '')),
-                            'instructions': str(recipe.get('Instructions', ''))
-                        }
-                        # Only add recipe if it has all required fields
-                        if all(cleaned_recipe.values()):
-                            batch.add_object(properties=cleaned_recipe)
+                cleaned_recipes = []
+                for recipe in recipes_list[start_idx:end_idx]:
+                    cleaned_recipe = {
+                        'title': str(recipe.get('Title', '')),
+                        'ingredients': str(recipe.get('Ingredients', '')),
+                        'instructions': str(recipe.get('Instructions', ''))
+                    }
+                    # Only add recipe if it has all required fields
+                    if all(cleaned_recipe.values()):
+                        cleaned_recipes.append(cleaned_recipe)
+                self.store.add(cleaned_recipes, [object_id(self.store.name, recipe, RECIPE_KEY)
+                                                 for recipe in cleaned_recipes])
 
                 print(f"\rProgress: {((batch_num + 1) / batches * 100):.1f}% ({end_idx}/{total} recipes)", end='',
                       flush=True)
 
+            self.store.flush()
             print("\nImport completed!")
             return True
 
@@ -256,29 +187,29 @@ class RecipeDB:
 
     def search_similar_recipes_by_ingredients(self, ingredients: str, limit: int = 3) -> List[Dict]:
         """Search for recipes by matching ingredients."""
+        key = (' '.join(ingredients.split()).casefold(), limit)
+        return self.search_flights.do(key, self._search_similar_recipes_by_ingredients, ingredients, limit)
+
+    def _search_similar_recipes_by_ingredients(self, ingredients: str, limit: int) -> List[Dict]:
         try:
             print(f"Searching for recipes with ingredients similar to: {ingredients}")
 
-            response = self.collection.query.near_text(
-                query=ingredients,
-                limit=limit,
-                return_metadata=MetadataQuery(distance=True)
-            )
+            with self._query('search_by_ingredients'):
+                hits = self.store.near_text(ingredients, limit)
 
             results = []
-            if hasattr(response, 'objects'):
-                for obj in response.objects:
-                    if not obj.properties.get("ingredients"):  # Skip if no ingredients
-                        continue
-
-                    recipe = {
-                        "title": obj.properties.get("title", "Recipe Title Not Available"),
-                        "ingredients": obj.properties["ingredients"],
-                        "instructions": obj.properties.get("instructions", "Instructions not available"),
-                        "similarity_score": 1 - getattr(obj.metadata, 'distance', 0)
-                    }
-                    results.append(recipe)
-                    print(f"Found recipe: {recipe['title']} (similarity: {recipe['similarity_score']:.2f})")
+            for hit in hits:
+                if not hit['properties'].get("ingredients"):  # Skip if no ingredients
+                    continue
+
+                recipe = {
+                    "title": hit['properties'].get("title", "Recipe Title Not Available"),
+                    "ingredients": hit['properties']["ingredients"],
+                    "instructions": hit['properties'].get("instructions", "Instructions not available"),
+                    "similarity_score": 1 - hit['distance']
+                }
+                results.append(recipe)
+                print(f"Found recipe: {recipe['title']} (similarity: {recipe['similarity_score']:.2f})")
 
             if not results:
                 print("No matching recipes found")
@@ -286,6 +217,8 @@ class RecipeDB:
             # Sort by similarity score
             return sorted(results, key=lambda x: x['similarity_score'], reverse=True)
 
+        except Rejected:
+            raise
         except Exception as e:
             print(f"Error in recipe search: {e}")
             import traceback
@@ -296,27 +229,25 @@ class RecipeDB:
         """Search recipes by title."""
         try:
             # For title-focused search
-            response = self.collection.query.near_text(
-                query=title,
-                limit=limit,
-                return_metadata=MetadataQuery(distance=True)
-            )
+            with self._query('search_by_title'):
+                hits = self.store.near_text(title, limit)
 
             results = []
-            if hasattr(response, 'objects'):
-                for obj in response.objects:
-                    if not obj.properties.get("title"):
-                        continue
-
-                    recipe = {
-                        "title": obj.properties["title"],
-                        "ingredients": obj.properties.get("ingredients", "No ingredients available"),
-                        "instructions": obj.properties.get("instructions", "No instructions available"),
-                        "similarity_score": 1 - getattr(obj.metadata, 'distance', 0)
-                    }
-                    results.append(recipe)
+            for hit in hits:
+                if not hit['properties'].get("title"):
+                    continue
+
+                recipe = {
+                    "title": hit['properties']["title"],
+                    "ingredients": hit['properties'].get("ingredients", "No ingredients available"),
+                    "instructions": hit['properties'].get("instructions", "No instructions available"),
+                    "similarity_score": 1 - hit['distance']
+                }
+                results.append(recipe)
 
             return sorted(results, key=lambda x: x['similarity_score'], reverse=True)
+        except Rejected:
+            raise
         except Exception as e:
             print(f"Error in title search: {e}")
             import traceback
@@ -326,27 +257,25 @@ class RecipeDB:
     def search_by_instructions(self, instruction_text: str, limit: int = 3) -> List[Dict]:
         """Search recipes by cooking instructions."""
         try:
-            response = self.collection.query.near_text(
-                query=instruction_text,
-                limit=limit,
-                return_metadata=MetadataQuery(distance=True)
-            )
+            with self._query('search_by_instructions'):
+                hits = self.store.near_text(instruction_text, limit)
 
             results = []
-            if hasattr(response, 'objects'):
-                for obj in response.objects:
-                    if not obj.properties.get("instructions"):
-                        continue
-
-                    recipe = {
-                        "title": obj.properties.get("title", "Untitled Recipe"),
-                        "ingredients": obj.properties.get("ingredients", "No ingredients available"),
-                        "instructions": obj.properties["instructions"],
-                        "similarity_score": 1 - getattr(obj.metadata, 'distance', 0)
-                    }
-                    results.append(recipe)
+            for hit in hits:
+                if not hit['properties'].get("instructions"):
+                    continue
+
+                recipe = {
+                    "title": hit['properties'].get("title", "Untitled Recipe"),
+                    "ingredients": hit['properties'].get("ingredients", "No ingredients available"),
+                    "instructions": hit['properties']["instructions"],
+                    "similarity_score": 1 - hit['distance']
+                }
+                results.append(recipe)
 
             return sorted(results, key=lambda x: x['similarity_score'], reverse=True)
+        except Rejected:
+            raise
         except Exception as e:
             print(f"Error in instruction search: {e}")
             import traceback
@@ -361,34 +290,32 @@ class RecipeDB:
             if not search_fields:
                 search_fields = ["ingredients"]
 
-            response = self.collection.query.near_text(
-                query=query,
-                limit=limit,
-                return_metadata=MetadataQuery(distance=True)
-            )
+            with self._query('advanced_search'):
+                hits = self.store.near_text(query, limit)
 
             results = []
-            if hasattr(response, 'objects'):
-                for obj in response.objects:
-                    recipe = {
-                        "title": obj.properties.get("title", "Untitled Recipe"),
-                        "matched_fields": {}
-                    }
+            for hit in hits:
+                recipe = {
+                    "title": hit['properties'].get("title", "Untitled Recipe"),
+                    "matched_fields": {}
+                }
 
-                    # Add only the requested fields
-                    for field in search_fields:
-                        recipe[field] = obj.properties.get(field, f"No {field} available")
-                        if obj.properties.get(field):
-                            recipe["matched_fields"][field] = True
+                # Add only the requested fields
+                for field in search_fields:
+                    recipe[field] = hit['properties'].get(field, f"No {field} available")
+                    if hit['properties'].get(field):
+                        recipe["matched_fields"][field] = True
 
-                    recipe["similarity_score"] = 1 - getattr(obj.metadata, 'distance', 0)
+                recipe["similarity_score"] = 1 - hit['distance']
 
-                    # Only add if we found content in any of the requested fields
-                    if any(obj.properties.get(field) for field in search_fields):
-                        results.append(recipe)
+                # Only add if we found content in any of the requested fields
+                if any(hit['properties'].get(field) for field in search_fields):
+                    results.append(recipe)
 
             return sorted(results, key=lambda x: x['similarity_score'], reverse=True)
 
+        except Rejected:
+            raise
         except Exception as e:
             print(f"Error in advanced search: {e}")
             import traceback
@@ -0,0 +1,100 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# JSON schemas for structured model output. Tool inputs must be objects, so the
+# recipe list is wrapped in {"recipes": [...]}.
+RECIPE_SUMMARY_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'recipe': {'type': 'string', 'description': 'The name of the meal\'s recipe'},
+        'description': {'type': 'string', 'description': 'A detailed description of the meal'},
+    },
+    'required': ['recipe', 'description'],
+}
+
+RECIPE_LIST_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'recipes': {'type': 'array', 'items': RECIPE_SUMMARY_SCHEMA, 'minItems': 1},
+    },
+    'required': ['recipes'],
+}
+
+RECIPE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'ingredients': {'type': 'array', 'items': {'type': 'string'}, 'minItems': 1},
+        'instructions': {'type': 'array', 'items': {'type': 'string'}, 'minItems': 1},
+    },
+    'required': ['ingredients', 'instructions'],
+}
+
+_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'integer': int,
+    'number': (int, float),
+    'boolean': bool,
+}
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = '$') -> List[str]:
+    """
+    Validate a value against the subset of JSON schema used in this module.
+
+    Returns:
+        List of human-readable errors; empty if the value is valid
+    """
+    expected = schema.get('type')
+    if expected and not isinstance(value, _TYPES[expected]):
+        return [f"{path}: expected {expected}, got {type(value).__name__}"]
+
+    errors = []
+    if expected == 'object':
+        for key in schema.get('required', []):
+            if key not in value:
+                errors.append(f"{path}: missing required key '{key}'")
+        for key, sub_schema in schema.get('properties', {}).items():
+            if key in value:
+                errors.extend(validate(value[key], sub_schema, f"{path}.{key}"))
+    elif expected == 'array':
+        if len(value) < schema.get('minItems', 0):
+            errors.append(f"{path}: expected at least {schema['minItems']} items")
+        if 'items' in schema:
+            for i, item in enumerate(value):
+                errors.extend(validate(item, schema['items'], f"{path}[{i}]"))
+    return errors
+
+
+def parse_json(text: Optional[str], schema: Dict[str, Any]) -> Tuple[Optional[Any], List[str]]:
+    """
+    Parse model output as JSON and validate it.
+
+    Text around the outermost JSON object (e.g. code fences) is ignored.
+
+    Returns:
+        (value, errors): value is None when errors is not empty
+    """
+    if not text:
+        return None, ["empty response"]
+
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end < start:
+        return None, ["response does not contain a JSON object"]
+
+    try:
+        value = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        return None, [f"invalid JSON: {e}"]
+
+    errors = validate(value, schema)
+    return (None, errors) if errors else (value, [])
+
+
+def repair_prompt(errors: List[str]) -> str:
+    """Build the follow-up message asking the model to fix its previous output."""
+    listed = '\n'.join(f"- {error}" for error in errors[:10])
+    return ("Your previous response did not match the required JSON schema:\n"
+            f"{listed}\n"
+            "Return the corrected JSON object only, without any other text.")
@@ -0,0 +1,255 @@
+import atexit
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# Request fields that must match exactly for a cached generation to be reused
+EXACT_FIELDS = ('cuisine', 'meal_type', 'diet', 'name')
+
+
+def _stem(word: str) -> str:
+    """Crude plural stemming so 'tomatoes' and 'tomato' share features."""
+    if len(word) > 4 and word.endswith('oes'):
+        return word[:-2]
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+class HashingEmbedder:
+    """
+    Embed short ingredient texts with hashed word and character-trigram features
+
+    Needs no model download: words (plural-stemmed) and their character trigrams
+    are hashed into a fixed number of dimensions with a stable hash, and the
+    vector is L2-normalized so a dot product is the cosine similarity.
+    """
+
+    def __init__(self, dimensions: int = 1024, trigram_weight: float = 0.4):
+        self.dimensions = dimensions
+        self.trigram_weight = trigram_weight
+
+    def _features(self, text: str):
+        for word in re.findall(r'[a-z0-9]+', text.casefold()):
+            word = _stem(word)
+            yield 'w:' + word, 1.0
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                yield 't:' + padded[i:i + 3], self.trigram_weight
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature, weight in self._features(text):
+            digest = zlib.crc32(feature.encode('utf-8'))
+            # The top bit picks the sign so colliding features tend to cancel out
+            vector[digest % self.dimensions] += weight if digest & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def request_text(request: Dict[str, Any]) -> str:
+    """Text embedded for a canonical request: the dish name (if any) and the ingredients."""
+    return ' '.join(filter(None, [request.get('name', ''), ', '.join(request.get('ingredients', []))]))
+
+
+def compatible(cached: Dict[str, Any], request: Dict[str, Any]) -> bool:
+    """
+    Check that a generation for the cached request satisfies the constraints of request
+
+    Cuisine, meal type, diet and dish name must match; the cached recipe must have
+    excluded at least the requested allergens, and must have been written for the
+    requested budget and serving size (0 means unconstrained).
+    """
+    if any(cached.get(field, '') != request.get(field, '') for field in EXACT_FIELDS):
+        return False
+    if not set(request.get('allergies', [])) <= set(cached.get('allergies', [])):
+        return False
+    if request.get('cost') and not (0 < cached.get('cost', 0) <= request['cost']):
+        return False
+    if request.get('serving_size') and cached.get('serving_size') != request['serving_size']:
+        return False
+    return True
+
+
+class SemanticCache:
+    """
+    Serve recipes generated for similar requests
+
+    Requests are embedded and kept in an in-process index (one normalized float32
+    matrix per namespace), persisted to disk. get() returns the value stored for
+    the most similar compatible request if its cosine similarity reaches the
+    threshold. Entries are scoped (e.g. by provider, model and prompt fingerprint)
+    so changing any of these never serves stale generations.
+
+    Each matrix is preallocated and doubled when full, and the oldest tenth of a
+    full namespace is evicted at once, so set() is amortized O(1). Changes are
+    written to disk by a background thread every save_interval seconds (and at
+    exit), never while the lock is held.
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.85, max_entries: int = 5000,
+                 ttl: float = 86400, embed: Optional[Callable[[str], np.ndarray]] = None,
+                 save_interval: float = 5.0):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.save_interval = save_interval
+        self.embed = embed or HashingEmbedder()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # Rows past len(self._entries[namespace]) are unused capacity
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._dirty = False
+        self._closed = threading.Event()
+        self.stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'incompatible': 0, 'sets': 0}
+        self._load()
+        if self.path:
+            threading.Thread(target=self._save_loop, name='semantic-cache-saver', daemon=True).start()
+            atexit.register(self.flush)
+
+    def get(self, namespace: str, request: Dict[str, Any], scope: str = '') -> Optional[Any]:
+        vector = self.embed(request_text(request))
+        now = time.time()
+        with self._lock:
+            self.stats['lookups'] += 1
+            entries = self._entries.get(namespace)
+            if not entries:
+                self.stats['misses'] += 1
+                return None
+
+            similarities = self._vectors[namespace][:len(entries)] @ vector
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            rejected = False
+            for index in candidates[np.argsort(-similarities[candidates])]:
+                entry = entries[index]
+                if entry['scope'] != scope or entry['expires_at'] <= now:
+                    continue
+                if not compatible(entry['request'], request):
+                    rejected = True
+                    continue
+                self.stats['hits'] += 1
+                return entry['value']
+
+            self.stats['incompatible' if rejected else 'misses'] += 1
+            return None
+
+    def set(self, namespace: str, request: Dict[str, Any], value: Any, scope: str = '') -> None:
+        vector = self.embed(request_text(request))
+        entry = {'request': request, 'value': value, 'scope': scope, 'expires_at': time.time() + self.ttl}
+        with self._lock:
+            entries = self._entries.setdefault(namespace, [])
+            vectors = self._vectors.get(namespace)
+            size = len(entries)
+            capacity = max(self.max_entries, 1)
+            if size >= capacity:
+                # Drop the oldest tenth at once, into a new matrix: a save in progress may still read the old one
+                excess = size - capacity + max(1, capacity // 10)
+                del entries[:excess]
+                vectors = self._resized(vectors[excess:size], capacity)
+                size = len(entries)
+            elif vectors is None or size == len(vectors):
+                rows = vectors[:size] if vectors is not None else np.empty((0, len(vector)), dtype=np.float32)
+                vectors = self._resized(rows, min(max(16, 2 * size), capacity))
+            vectors[size] = vector
+            self._vectors[namespace] = vectors
+            entries.append(entry)
+            self.stats['sets'] += 1
+            self._dirty = True
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._vectors.clear()
+            self._entries.clear()
+            self._dirty = True
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = sum(len(entries) for entries in self._entries.values())
+        stats['threshold'] = self.threshold
+        stats['hit_rate'] = stats['hits'] / stats['lookups'] if stats['lookups'] else 0.0
+        return stats
+
+    def flush(self) -> None:
+        """Write pending changes to disk now."""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+                # Rows below each length are never written again, and eviction or
+                # growth allocates a new matrix, so the rows can be read unlocked
+                snapshot = {namespace: (self._vectors[namespace], list(entries))
+                            for namespace, entries in self._entries.items()}
+            if not self._save(snapshot):
+                with self._lock:
+                    self._dirty = True
+
+    def close(self) -> None:
+        """Stop the background saver and write pending changes."""
+        self._closed.set()
+        self.flush()
+
+    @staticmethod
+    def _resized(rows: np.ndarray, capacity: int) -> np.ndarray:
+        """A new matrix with room for capacity rows, starting with rows."""
+        resized = np.empty((capacity, rows.shape[1]), dtype=np.float32)
+        resized[:len(rows)] = rows
+        return resized
+
+    def _save_loop(self) -> None:
+        while not self._closed.wait(self.save_interval):
+            self.flush()
+
+    def _save(self, snapshot: Dict[str, Any]) -> bool:
+        """Write the index to disk (vectors as .npz, entries as JSON) atomically; returns whether it was written."""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            now = time.time()
+            data = {}
+            entries = {}
+            for namespace, (vectors, namespace_entries) in snapshot.items():
+                keep = [i for i, entry in enumerate(namespace_entries) if entry['expires_at'] > now]
+                data[namespace] = vectors[keep]
+                entries[namespace] = [namespace_entries[i] for i in keep]
+            tmp = self.path + '.tmp'
+            with open(tmp, 'wb') as f:
+                np.savez(f, entries=np.array(json.dumps(entries)),
+                         **{f"vectors_{namespace}": vectors for namespace, vectors in data.items()})
+            os.replace(tmp, self.path)
+            return True
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error saving semantic cache {self.path}: {e}")
+            return False
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                entries = json.loads(str(data['entries']))
+                for namespace, namespace_entries in entries.items():
+                    vectors = data[f"vectors_{namespace}"].astype(np.float32)
+                    if vectors.shape[1:] != (getattr(self.embed, 'dimensions', vectors.shape[1]),):
+                        print(f"Semantic cache {self.path} was built with another embedder, ignoring it")
+                        return
+                    self._entries[namespace] = namespace_entries
+                    self._vectors[namespace] = vectors
+            print(f"Loaded semantic cache with {sum(len(e) for e in self._entries.values())} entries")
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Error loading semantic cache {self.path}: {e}")
+            self._entries.clear()
+            self._vectors.clear()
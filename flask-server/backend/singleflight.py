@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it is in
+    flight wait for it and receive the same result (or exception). Nothing is
+    cached once the call completes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'shared': 0}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs), or wait for the in-flight call with the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats['shared'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats['calls'] += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def ado(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of do(): await factory(), or the in-flight task with the same key."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            calls = self._async_calls.setdefault(loop, {})
+            entry = calls.get(key)
+            if entry is not None:
+                entry[1] += 1
+                self.stats['shared'] += 1
+            else:
+                entry = calls[key] = [loop.create_task(factory()), 0]
+                self.stats['calls'] += 1
+
+                def _done(_task, calls=calls):
+                    with self._lock:
+                        calls.pop(key, None)
+                    if not _task.cancelled():
+                        # Mark the error as retrieved even if every waiter was cancelled
+                        _task.exception()
+
+                entry[0].add_done_callback(_done)
+
+        # shield() so a cancelled waiter does not cancel the call shared with others
+        return await asyncio.shield(entry[0])
+
+    def in_flight(self) -> Dict[str, int]:
+        """Return {key: waiters} for every call currently in flight."""
+        with self._lock:
+            waiters = {str(key): call.waiters for key, call in self._calls.items()}
+            for calls in self._async_calls.values():
+                for key, (_, count) in calls.items():
+                    waiters[str(key)] = count
+        return waiters
+
+    def get_stats(self) -> Dict[str, Any]:
+        in_flight = self.in_flight()
+        with self._lock:
+            stats = dict(self.stats)
+        stats['in_flight'] = len(in_flight)
+        stats['waiters'] = in_flight
+        return stats
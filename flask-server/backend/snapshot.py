@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .ingest import content_hash
+from .metrics import REGISTRY, Gauge
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots')
+
+COLLECTION_BOOT_SECONDS = REGISTRY.register(Gauge(
+    'collection_boot_seconds', 'Seconds until a collection was ready at startup, by the path that loaded it',
+    ('collection', 'path')))
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, does not fit the collection, or fails verification."""
+
+
+def checksum(store) -> str:
+    """Checksum of the ids and properties of every object of a store, independent of their order."""
+    entries = sorted(f"{object_id}:{content_hash(properties, sorted(properties))}"
+                     for object_id, properties in store.items())
+    digest = hashlib.sha256()
+    for entry in entries:
+        digest.update(entry.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class Snapshot:
+    """
+    Local snapshot of one collection, and a manifest to verify it
+
+    The data is saved by the store (VectorStore.export_snapshot): a Weaviate
+    filesystem backup, or one file of vectors and properties for the NumPy
+    engine. manifest.json records the object count and checksum() of the
+    collection when it was saved, and the source it was imported from. A
+    restored collection must match both, or the restore fails.
+    """
+
+    def __init__(self, store, directory: Optional[str] = None):
+        self.store = store
+        self.path = os.path.join(directory or os.getenv('SNAPSHOT_DIR', DEFAULT_SNAPSHOT_DIR), store.name.lower())
+        self.manifest_path = os.path.join(self.path, 'manifest.json')
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Cannot read snapshot manifest {self.manifest_path}: {e}")
+
+    def save(self, source: str) -> Dict[str, Any]:
+        """Snapshot the collection as imported from source; returns the manifest."""
+        started = time.perf_counter()
+        self.store.flush()
+        count = self.store.count()
+        digest = checksum(self.store)
+        manifest = {
+            'collection': self.store.name,
+            'engine': type(self.store).__name__,
+            'source': source,
+            'count': count,
+            'checksum': digest,
+            'created_at': time.time(),
+            **self.store.export_snapshot(self.path),
+        }
+        # Written last, so a manifest always describes a complete snapshot
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)
+        print(f"Saved snapshot of {self.store.name} ({count} objects) in {time.perf_counter() - started:.3f}s")
+        return manifest
+
+    def refresh(self, source: str, report: Optional[Dict[str, Any]] = None) -> None:
+        """Save the snapshot after an import, or a sync whose report changed anything (unless SNAPSHOT_ENABLED=0)."""
+        if os.getenv('SNAPSHOT_ENABLED', '1') != '1':
+            return
+        if report is not None and not (report['inserted'] or report['updated'] or report['deleted']):
+            return
+        try:
+            self.save(source)
+        except Exception as e:
+            print(f"Error saving snapshot of {self.store.name}: {e}")
+
+    def check(self, source: str) -> Dict[str, Any]:
+        """Check that the snapshot fits the store and source, without touching the collection; returns the manifest."""
+        manifest = self.manifest()
+        if manifest.get('engine') != type(self.store).__name__:
+            raise SnapshotError(f"Snapshot was saved by {manifest.get('engine')}")
+        if manifest.get('source') != source:
+            raise SnapshotError(f"Snapshot was imported from another source ({manifest.get('source')})")
+        return manifest
+
+    def restore(self, manifest: Dict[str, Any], verify: str = 'checksum') -> Dict[str, Any]:
+        """Restore the collection checked by check() and verify its count (and checksum unless verify='count')."""
+        self.store.restore_snapshot(self.path, manifest)
+        count = self.store.count()
+        if count != manifest['count']:
+            raise SnapshotError(f"Restored {count} objects, the snapshot has {manifest['count']}")
+        if verify != 'count' and checksum(self.store) != manifest['checksum']:
+            raise SnapshotError("Restored objects do not match the snapshot checksum")
+        return manifest
+
+
+def boot_collection(store, ingestion, create: Callable[[], None], load: Callable[[bool], Any],
+                    sync: Callable[[], Dict[str, Any]], snapshot: Optional[Snapshot] = None,
+                    started: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Make a collection ready by the fastest path available; returns how long it took and by which path
+
+    Paths, in order of preference:
+      existing        the collection already holds data
+      snapshot        the local snapshot, restored and verified (SNAPSHOT_VERIFY=checksum|count)
+      resumed_import  an interrupted import, continued from its checkpoint
+      import          the whole source, as a last resort
+
+    With INGEST_SYNC_ON_STARTUP=1, an existing or restored collection is then
+    synced with the source. After an import the snapshot is refreshed
+    (SNAPSHOT_ENABLED=0 disables snapshots). create() creates the empty
+    collection, load(restart) runs the import, and sync() runs a sync and
+    refreshes the snapshot itself if it changed anything (Snapshot.refresh),
+    as any other sync must. Time to ready is measured from `started` (a perf_counter()
+    value, e.g. before the store was opened) or from the call.
+    """
+    started = started if started is not None else time.perf_counter()
+    snapshot = snapshot or Snapshot(store)
+    enabled = os.getenv('SNAPSHOT_ENABLED', '1') == '1'
+    sync_on_startup = os.getenv('INGEST_SYNC_ON_STARTUP', '0') == '1'
+    attempts = []
+
+    def ready(path: str, **details) -> Dict[str, Any]:
+        seconds = time.perf_counter() - started
+        COLLECTION_BOOT_SECONDS.set(seconds, collection=store.name, path=path)
+        print(f"Collection {store.name} ready in {seconds:.3f}s (path: {path})")
+        return {'collection': store.name, 'path': path, 'seconds': round(seconds, 3), 'attempts': attempts,
+                **details}
+
+    exists = store.exists()
+    interrupted = exists and ingestion.incomplete()
+    if exists and not interrupted:
+        try:
+            if store.count() > 0:
+                print(f"Connected to existing collection: {store.name}")
+                return ready('existing', sync=sync() if sync_on_startup else None)
+            print(f"Collection {store.name} exists but is empty")
+        except Exception as e:
+            print(f"Collection {store.name} exists but cannot be read, recreating it: {e}")
+            store.delete()
+            exists = False
+    elif interrupted:
+        print(f"Previous import of {store.name} was interrupted")
+
+    if enabled and snapshot.exists():
+        attempt_started = time.perf_counter()
+        restoring = False
+        try:
+            manifest = snapshot.check(ingestion.source)
+            print(f"Restoring {store.name} from snapshot {snapshot.path}")
+            restoring = True
+            snapshot.restore(manifest, verify=os.getenv('SNAPSHOT_VERIFY', 'checksum'))
+        except Exception as e:
+            print(f"Cannot restore {store.name} from snapshot: {e}")
+            attempts.append({'path': 'snapshot', 'error': str(e),
+                             'seconds': round(time.perf_counter() - attempt_started, 3)})
+            if restoring:
+                # The restore may have replaced the collection: import it from scratch
+                if store.exists():
+                    store.delete()
+                exists = interrupted = False
+        else:
+            # The restored collection is complete: an interrupted import must not resume over it
+            ingestion.checkpoint.save({'source': ingestion.source, 'rows_done': None,
+                                       'objects_written': manifest['count'], 'complete': True})
+            return ready('snapshot', snapshot_created_at=manifest['created_at'],
+                         sync=sync() if sync_on_startup else None)
+
+    if interrupted:
+        load(False)
+        snapshot.refresh(ingestion.source)
+        return ready('resumed_import')
+
+    if not exists:
+        create()
+    load(True)
+    snapshot.refresh(ingestion.source)
+    return ready('import')
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class BackendNotReady(Exception):
+    """Raised when a backend is requested before it finished initializing."""
+
+
+class BackendRegistry:
+    """
+    Initialize heavy backends (databases, models) in order, in the foreground or a background thread
+
+    Every initialization step is timed so startup can be reported phase by phase.
+    Until a backend is initialized, get() raises BackendNotReady so the web server
+    can bind immediately and answer health checks while the backends warm up.
+    """
+
+    def __init__(self):
+        self.created_at = time.perf_counter()
+        self._factories: Dict[str, Callable[[], Any]] = OrderedDict()
+        self._instances: Dict[str, Any] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.phases: List[Tuple[str, float]] = []
+        self.ready = threading.Event()
+        self._thread = None
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        self._factories[name] = factory
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(name, time.perf_counter() - start)
+
+    def record_phase(self, name: str, seconds: float) -> None:
+        """Report a startup phase timed elsewhere."""
+        with self._lock:
+            self.phases.append((name, seconds))
+
+    def initialize(self) -> None:
+        """Initialize all registered backends in registration order."""
+        for name, factory in self._factories.items():
+            try:
+                with self.phase(name):
+                    instance = factory()
+                with self._lock:
+                    self._instances[name] = instance
+            except Exception as e:
+                print(f"Error initializing {name}: {e}")
+                with self._lock:
+                    self._errors[name] = str(e)
+        self.ready.set()
+        print(self.report())
+
+    def start(self) -> None:
+        """Initialize all registered backends in a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.initialize, name='backend-init', daemon=True)
+            self._thread.start()
+
+    def get(self, name: str) -> Any:
+        with self._lock:
+            if name in self._instances:
+                return self._instances[name]
+            if name in self._errors:
+                raise BackendNotReady(f"{name} failed to initialize: {self._errors[name]}")
+        raise BackendNotReady(f"{name} is still initializing")
+
+    def is_ready(self) -> bool:
+        return self.ready.is_set() and not self._errors
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            backends = {}
+            for name in self._factories:
+                if name in self._instances:
+                    backends[name] = 'ready'
+                elif name in self._errors:
+                    backends[name] = f"failed: {self._errors[name]}"
+                else:
+                    backends[name] = 'initializing'
+            phases = [{'phase': name, 'seconds': round(seconds, 3)} for name, seconds in self.phases]
+        return {
+            'ready': self.is_ready(),
+            'backends': backends,
+            'phases': phases,
+            'uptime_seconds': round(time.perf_counter() - self.created_at, 3),
+        }
+
+    def report(self) -> str:
+        """Return a human-readable startup timing report."""
+        with self._lock:
+            phases = list(self.phases)
+        lines = ["Startup timing report:"]
+        for name, seconds in phases:
+            lines.append(f"  {name:<32} {seconds:8.3f}s")
+        lines.append(f"  {'time to ready':<32} {time.perf_counter() - self.created_at:8.3f}s")
+        return '\n'.join(lines)
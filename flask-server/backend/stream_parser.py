@@ -0,0 +1,204 @@
+import ast
+from typing import Any, Callable, List, Optional
+
+OPEN_TAG = '<final_output>'
+CLOSE_TAG = '</final_output>'
+
+
+def literal(text: str) -> Any:
+    """Evaluate a Python literal, collapsing whitespace first. Returns None if it is not a valid literal."""
+    try:
+        return ast.literal_eval(' '.join(text.split()))
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return None
+
+
+class _ValueScanner:
+    """
+    Track brackets and string literals of a Python literal as text arrives.
+
+    Records where the first top-level list/dict starts and ends, the text of every
+    complete dict directly inside a top-level list, and whether the close tag has
+    been seen outside of a string. Each character is scanned exactly once.
+    """
+
+    def __init__(self, close_tag: Optional[str] = None):
+        self.close_tag = close_tag
+        self.text = ''
+        self.depth = 0
+        self.quote = None
+        self.escape = False
+        self.value_start = None
+        self.value_end = None
+        self.item_start = None
+        self.closed = False
+
+    def feed(self, chunk: str) -> List[str]:
+        """Consume a chunk and return the text of the list items completed by it."""
+        items = []
+        offset = len(self.text)
+        self.text += chunk
+        text = self.text
+
+        for i in range(offset, len(text)):
+            ch = text[i]
+
+            if self.quote:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == self.quote:
+                    self.quote = None
+                continue
+
+            if ch == '>' and self.close_tag and text.endswith(self.close_tag, 0, i + 1):
+                self.closed = True
+                break
+
+            if self.value_end is not None:
+                continue
+
+            if ch in '\'"' and self.depth > 0:
+                self.quote = ch
+            elif ch in '[{':
+                if self.depth == 0:
+                    self.value_start = i
+                elif self.depth == 1 and ch == '{' and text[self.value_start] == '[':
+                    self.item_start = i
+                self.depth += 1
+            elif ch in ']}' and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 1 and ch == '}' and self.item_start is not None:
+                    items.append(text[self.item_start:i + 1])
+                    self.item_start = None
+                elif self.depth == 0:
+                    self.value_end = i + 1
+
+        return items
+
+
+class FinalOutputParser:
+    """
+    Single-pass incremental parser for the <final_output> block of a model response
+
+    Feed it chunks as they are generated. It finds the <final_output> tag, validates
+    every recipe of a list as soon as its closing brace arrives and reports completion
+    the moment </final_output> is seen, so the caller can stop the generation.
+
+    Args:
+        kind: 'list' for a list of dicts (recipe list) or 'dict' for a single dict (recipe)
+        validate: Optional predicate for every list item ('list') or the whole dict ('dict')
+        on_item: Optional callback called with every validated list item as it arrives
+    """
+
+    def __init__(self, kind: str = 'list', validate: Optional[Callable[[Any], bool]] = None,
+                 on_item: Optional[Callable[[Any], None]] = None):
+        if kind not in ('list', 'dict'):
+            raise ValueError(f"Unknown output kind: {kind}")
+        self.kind = kind
+        self.validate = validate
+        self.on_item = on_item
+        self.items = []
+        self.error = None
+        self.closed = False
+        self._chunks = []
+        self._pending = ''
+        self._scanner = None
+
+    @property
+    def done(self) -> bool:
+        """True once the final output is complete or known to be invalid."""
+        return self.closed or self.error is not None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Consume a chunk of model output
+
+        Returns:
+            bool: True if generation can stop (final output complete or invalid)
+        """
+        if self.done or not chunk:
+            return self.done
+        self._chunks.append(chunk)
+
+        if self._scanner is None:
+            self._pending += chunk
+            index = self._pending.find(OPEN_TAG)
+            if index == -1:
+                # Keep just enough to detect a tag split across chunks
+                self._pending = self._pending[-(len(OPEN_TAG) - 1):]
+                return False
+            chunk = self._pending[index + len(OPEN_TAG):]
+            self._pending = ''
+            self._scanner = _ValueScanner(CLOSE_TAG)
+
+        for item_text in self._scanner.feed(chunk):
+            self._accept_item(item_text)
+            if self.error is not None:
+                break
+
+        if self._scanner.closed:
+            self.closed = True
+        return self.done
+
+    def result(self) -> Any:
+        """Return the parsed list/dict, or None (with self.error set) if the output is invalid."""
+        if self.error is not None:
+            return None
+
+        value = None
+        scanner = self._scanner
+        if scanner is not None and scanner.value_end is not None:
+            value = literal(scanner.text[scanner.value_start:scanner.value_end])
+        if value is None:
+            value = self._fallback()
+        if value is None:
+            self.error = self.error or "no parsable final output"
+            return None
+
+        if self.kind == 'list':
+            if not isinstance(value, list) or not value:
+                self.error = f"expected a non-empty list but got {type(value).__name__}"
+                return None
+            if self.validate is not None and not all(self.validate(item) for item in value):
+                self.error = "invalid recipe format"
+                return None
+        else:
+            if not isinstance(value, dict):
+                self.error = f"expected a dict but got {type(value).__name__}"
+                return None
+            if self.validate is not None and not self.validate(value):
+                self.error = "invalid recipe format"
+                return None
+        return value
+
+    def _accept_item(self, item_text: str) -> None:
+        if self.kind != 'list':
+            return
+        item = literal(item_text)
+        if item is None or (self.validate is not None and not self.validate(item)):
+            self.error = f"invalid recipe entry: {item_text[:100]}"
+            return
+        self.items.append(item)
+        if self.on_item is not None:
+            self.on_item(item)
+
+    def _fallback(self) -> Any:
+        """Look for a bare list/dict when the model did not use the <final_output> tag."""
+        text = ''.join(self._chunks)
+        start = text.find('[' if self.kind == 'list' else '{')
+        if start == -1:
+            return None
+        scanner = _ValueScanner()
+        scanner.feed(text[start:])
+        if scanner.value_end is None:
+            return None
+        return literal(scanner.text[scanner.value_start:scanner.value_end])
+
+
+def parse_final_output(text: str, kind: str = 'list', validate: Optional[Callable[[Any], bool]] = None) -> Any:
+    """Parse a complete model response."""
+    parser = FinalOutputParser(kind, validate=validate)
+    parser.feed(text)
+    return parser.result()
@@ -0,0 +1,587 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Where the NumPy engine keeps its collections (one directory per collection)
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vectors')
+
+
+class VectorStore(ABC):
+    """
+    Collection of objects with text properties, searchable by vector similarity
+
+    near_text() returns hits as {'properties': ..., 'distance': ...} with the
+    cosine distance (1 - cosine similarity), best first. Filters are
+    {property: value} equality constraints, all of which must hold. Every
+    object has a UUID; adding an object under an existing UUID replaces it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @abstractmethod
+    def exists(self) -> bool:
+        """Whether the collection has been created."""
+        pass
+
+    @abstractmethod
+    def create(self, properties: Sequence[str]) -> None:
+        """Create the (empty) collection with these text properties."""
+        pass
+
+    @abstractmethod
+    def delete(self) -> None:
+        """Delete the collection and its objects, if it exists."""
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        pass
+
+    @abstractmethod
+    def add(self, objects: Iterable[Dict[str, str]], ids: Optional[Sequence[str]] = None) -> int:
+        """Add objects (property dicts) under ids, random UUIDs by default; returns the number written."""
+        pass
+
+    @abstractmethod
+    def delete_ids(self, ids: Iterable[str]) -> int:
+        """Delete the objects with these ids; returns the number deleted."""
+        pass
+
+    @abstractmethod
+    def near_text(self, query: str, limit: int, filters: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def fetch(self, limit: int, filters: Optional[Dict[str, str]] = None, offset: int = 0) -> List[Dict[str, str]]:
+        """Properties of the first objects matching the filters, in insertion order."""
+        pass
+
+    @abstractmethod
+    def group_counts(self, prop: str) -> Dict[str, int]:
+        """Number of objects per value of a property."""
+        pass
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, Dict[str, str]]]:
+        """(id, properties) of every object."""
+        pass
+
+    def iter_objects(self) -> Iterator[Dict[str, str]]:
+        """Properties of every object."""
+        for _, properties in self.items():
+            yield properties
+
+    def flush(self) -> None:
+        """Persist objects added so far; engines that write through need not do anything."""
+        pass
+
+    def admit(self):
+        """Context manager admitting one query; in-process engines need no admission control."""
+        return nullcontext()
+
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        """Save a copy of the collection under path; returns what restore_snapshot() needs to find it."""
+        raise NotImplementedError(f"{type(self).__name__} does not support snapshots")
+
+    def restore_snapshot(self, path: str, manifest: Dict[str, Any]) -> None:
+        """Replace the collection with a snapshot saved by export_snapshot()."""
+        raise NotImplementedError(f"{type(self).__name__} does not support snapshots")
+
+    def close(self) -> None:
+        pass
+
+
+class WeaviateStore(VectorStore):
+    """
+    Collection of a local Weaviate instance, vectorized by its text2vec-transformers module
+
+    Queries are admitted through admission.vector_db_limiter() since every query
+    is a network round trip plus a remote vectorizer call.
+    """
+
+    def __init__(self, name: str, client=None):
+        import weaviate
+        super().__init__(name)
+        self.client = client or weaviate.connect_to_local()
+        self._collection = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = self.client.collections.get(self.name)
+        return self._collection
+
+    def exists(self) -> bool:
+        return self.client.collections.exists(self.name)
+
+    def create(self, properties: Sequence[str]) -> None:
+        from weaviate.classes import config as wvcc
+        self._collection = self.client.collections.create(
+            name=self.name,
+            vectorizer_config=wvcc.Configure.Vectorizer.text2vec_transformers(),
+            properties=[wvcc.Property(name=prop, data_type=wvcc.DataType.TEXT) for prop in properties]
+        )
+
+    def delete(self) -> None:
+        self.client.collections.delete(self.name)
+        self._collection = None
+
+    def count(self) -> int:
+        return self.collection.aggregate.over_all(total_count=True).total_count
+
+    def add(self, objects: Iterable[Dict[str, str]], ids: Optional[Sequence[str]] = None) -> int:
+        # One batch request per call, so callers can write batches from several threads.
+        # Batch imports replace objects whose UUID already exists.
+        objects = list(objects)
+        if not objects:
+            return 0
+        if ids is not None:
+            from weaviate.classes.data import DataObject
+            objects = [DataObject(properties=properties, uuid=object_id)
+                       for properties, object_id in zip(objects, ids)]
+        response = self.collection.data.insert_many(objects)
+        if response.has_errors:
+            error = next(iter(response.errors.values()))
+            raise RuntimeError(f"{len(response.errors)} of {len(objects)} objects were not inserted "
+                               f"into {self.name}: {getattr(error, 'message', error)}")
+        return len(objects)
+
+    @staticmethod
+    def _filter(filters: Optional[Dict[str, str]]):
+        if not filters:
+            return None
+        from weaviate.classes.query import Filter
+        return Filter.all_of([Filter.by_property(prop).equal(value) for prop, value in filters.items()])
+
+    def near_text(self, query: str, limit: int, filters: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        from weaviate.classes.query import MetadataQuery
+        response = self.collection.query.near_text(
+            query=query,
+            limit=limit,
+            filters=self._filter(filters),
+            return_metadata=MetadataQuery(distance=True)
+        )
+        return [{'properties': obj.properties, 'distance': getattr(obj.metadata, 'distance', 0) or 0}
+                for obj in getattr(response, 'objects', [])]
+
+    def fetch(self, limit: int, filters: Optional[Dict[str, str]] = None, offset: int = 0) -> List[Dict[str, str]]:
+        response = self.collection.query.fetch_objects(limit=limit, offset=offset or None,
+                                                       filters=self._filter(filters))
+        return [obj.properties for obj in getattr(response, 'objects', [])]
+
+    def group_counts(self, prop: str) -> Dict[str, int]:
+        from weaviate.classes.aggregate import GroupByAggregate
+        response = self.collection.aggregate.over_all(group_by=GroupByAggregate(prop=prop), total_count=True)
+        return {group.grouped_by.value: group.total_count for group in response.groups}
+
+    def delete_ids(self, ids: Iterable[str]) -> int:
+        from weaviate.classes.query import Filter
+        ids = list(ids)
+        deleted = 0
+        # A delete is capped by the query result limit (QUERY_MAXIMUM_RESULTS, 10000 by default)
+        for start in range(0, len(ids), 5000):
+            response = self.collection.data.delete_many(
+                where=Filter.by_id().contains_any(ids[start:start + 5000]))
+            deleted += response.successful
+        return deleted
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, str]]]:
+        # Cursor-based, so it is not capped by the query result limit like offsets are
+        for obj in self.collection.iterator():
+            yield str(obj.uuid), obj.properties
+
+    def admit(self):
+        from .admission import vector_db_limiter
+        return vector_db_limiter().slot()
+
+    @staticmethod
+    def _check_backup(response, action: str) -> None:
+        status = getattr(response.status, 'value', response.status)
+        if status != 'SUCCESS':
+            raise RuntimeError(f"Backup {action} ended with status {status}: {getattr(response, 'error', '')}")
+
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        # A filesystem backup, written by the Weaviate server under its BACKUP_FILESYSTEM_PATH
+        from weaviate.classes.backup import BackupStorage
+        backup_id = f"{self.name.lower()}-{int(time.time())}"
+        self._check_backup(self.client.backup.create(
+            backup_id=backup_id,
+            backend=BackupStorage.FILESYSTEM,
+            include_collections=[self.name],
+            wait_for_completion=True
+        ), 'create')
+        return {'backup_id': backup_id}
+
+    def restore_snapshot(self, path: str, manifest: Dict[str, Any]) -> None:
+        from weaviate.classes.backup import BackupStorage
+        # Weaviate only restores collections that do not exist
+        if self.exists():
+            self.delete()
+        self._check_backup(self.client.backup.restore(
+            backup_id=manifest['backup_id'],
+            backend=BackupStorage.FILESYSTEM,
+            include_collections=[self.name],
+            wait_for_completion=True
+        ), 'restore')
+        self._collection = None
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class SentenceTransformerEmbedder:
+    """Embed texts with a sentence-transformers model (optional dependency), normalized."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+
+    def __call__(self, text: str) -> np.ndarray:
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+
+class NumpyStore(VectorStore):
+    """
+    In-process collection: normalized float32 embeddings in a memory-mapped array
+
+    Objects are embedded once, when added, from their `vector_properties`; a
+    query embeds its text and ranks every object by a single matrix-vector
+    product, taking the top k with argpartition. Filters are evaluated as
+    vectorized masks over per-property columns.
+
+    The collection directory holds vectors.npy, objects.json, ids.json and
+    meta.json, each replaced atomically. Changes are held in memory until
+    flush()/close(), or until `flush_every` objects were written since the last
+    flush, if set. A collection built with another embedder is treated as
+    missing, so it gets rebuilt.
+    """
+
+    def __init__(self, name: str, path: str, embed: Optional[Callable[[str], np.ndarray]] = None,
+                 vector_properties: Optional[Sequence[str]] = None, flush_every: Optional[int] = None):
+        from .semantic_cache import HashingEmbedder
+        super().__init__(name)
+        self.path = path
+        self.embed = embed or HashingEmbedder()
+        self.embedder = getattr(self.embed, 'name', type(self.embed).__name__)
+        self.dimensions = getattr(self.embed, 'dimensions', None)
+        self.vector_properties = list(vector_properties) if vector_properties else None
+        self.flush_every = flush_every
+        self.properties: Optional[List[str]] = None
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((0, self.dimensions or 0), dtype=np.float32)
+        self._objects: List[Dict[str, str]] = []
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._pending: List[np.ndarray] = []
+        self._columns: Dict[str, np.ndarray] = {}
+        self._dirty = False
+        self._unflushed = 0
+        self._load()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self) -> None:
+        if not os.path.exists(self._file('meta.json')):
+            return
+        try:
+            with open(self._file('meta.json')) as f:
+                meta = json.load(f)
+            if meta.get('embedder') != self.embedder or meta.get('dimensions') != self.dimensions:
+                print(f"Vector store {self.path} was built with another embedder, ignoring it")
+                return
+            vectors = np.load(self._file('vectors.npy'), mmap_mode='r')
+            with open(self._file('objects.json')) as f:
+                objects = json.load(f)
+            with open(self._file('ids.json')) as f:
+                ids = json.load(f)
+            if not len(objects) == len(ids) == len(vectors):
+                print(f"Vector store {self.path} is inconsistent ({len(objects)} objects, {len(ids)} ids, "
+                      f"{len(vectors)} vectors), ignoring it")
+                return
+            self.properties = meta['properties']
+            self.vector_properties = meta.get('vector_properties') or self.vector_properties
+            self._vectors = vectors
+            self._objects = objects
+            self._ids = ids
+            self._positions = {object_id: position for position, object_id in enumerate(ids)}
+            print(f"Loaded vector store {self.name} with {len(objects)} objects")
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Error loading vector store {self.path}: {e}")
+
+    def _write(self, name: str, write: Callable[[Any], None], mode: str = 'w') -> None:
+        tmp = self._file(name + '.tmp')
+        with open(tmp, mode) as f:
+            write(f)
+        os.replace(tmp, self._file(name))
+
+    def flush(self) -> None:
+        """Write the changes since the last flush to disk and map the vectors from there."""
+        with self._lock:
+            if self.properties is None or not self._dirty:
+                return
+            vectors = self._matrix()
+            os.makedirs(self.path, exist_ok=True)
+            # Vectors, objects and ids first: meta.json marks a complete collection
+            self._write('vectors.npy', lambda f: np.save(f, vectors), 'wb')
+            self._write('objects.json', lambda f: json.dump(self._objects, f))
+            self._write('ids.json', lambda f: json.dump(self._ids, f))
+            self._write('meta.json', lambda f: json.dump({
+                'properties': self.properties, 'vector_properties': self.vector_properties,
+                'embedder': self.embedder, 'dimensions': self.dimensions, 'count': len(self._objects)}, f))
+            self._vectors = np.load(self._file('vectors.npy'), mmap_mode='r')
+            self._dirty = False
+            self._unflushed = 0
+
+    def _matrix(self) -> np.ndarray:
+        """All vectors as one matrix, merging pending ones. Holds the lock."""
+        if self._pending:
+            self._vectors = np.vstack([self._vectors, *self._pending])
+            self._pending = []
+        return self._vectors
+
+    def _reset(self, properties: Optional[List[str]]) -> None:
+        """Empty the collection in memory. Holds the lock."""
+        self.properties = properties
+        self._vectors = np.zeros((0, self.dimensions or 0), dtype=np.float32)
+        self._objects = []
+        self._ids = []
+        self._positions = {}
+        self._pending = []
+        self._columns = {}
+
+    def _text(self, properties: Dict[str, str]) -> str:
+        return ' '.join(str(properties.get(prop, '')) for prop in self.vector_properties or self.properties)
+
+    def exists(self) -> bool:
+        return self.properties is not None
+
+    def create(self, properties: Sequence[str]) -> None:
+        with self._lock:
+            self._reset(list(properties))
+            self._dirty = True
+
+    def delete(self) -> None:
+        with self._lock:
+            for name in ('meta.json', 'objects.json', 'ids.json', 'vectors.npy'):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            self._reset(None)
+            self._dirty = False
+
+    def count(self) -> int:
+        return len(self._objects)
+
+    def add(self, objects: Iterable[Dict[str, str]], ids: Optional[Sequence[str]] = None) -> int:
+        objects = [{prop: str(properties.get(prop, '')) for prop in self.properties} for properties in objects]
+        if not objects:
+            return 0
+        ids = [str(object_id) for object_id in ids] if ids is not None else [str(uuid.uuid4()) for _ in objects]
+        # The last of several objects with the same id wins
+        latest = {object_id: position for position, object_id in enumerate(ids)}
+        if len(latest) < len(ids):
+            objects = [objects[position] for position in latest.values()]
+            ids = list(latest)
+        vectors = np.stack([self.embed(self._text(properties)) for properties in objects]).astype(np.float32)
+        with self._lock:
+            new = []
+            replaced = []
+            for index, object_id in enumerate(ids):
+                position = self._positions.get(object_id)
+                if position is None:
+                    new.append(index)
+                else:
+                    replaced.append((position, index))
+            if replaced:
+                # Copy on write: a query running unlocked keeps reading the matrix
+                # and list it took, so replaced rows go into new ones
+                matrix = np.array(self._matrix())
+                updated = list(self._objects)
+                for position, index in replaced:
+                    matrix[position] = vectors[index]
+                    updated[position] = objects[index]
+                self._vectors = matrix
+                self._objects = updated
+            # Appending is safe: queries only read the positions they saw
+            for index in new:
+                self._positions[ids[index]] = len(self._ids)
+                self._ids.append(ids[index])
+                self._objects.append(objects[index])
+            if new:
+                self._pending.append(vectors[new])
+            self._columns = {}
+            self._dirty = True
+            self._unflushed += len(objects)
+            unflushed = self._unflushed
+        if self.flush_every and unflushed >= self.flush_every:
+            self.flush()
+        return len(objects)
+
+    def delete_ids(self, ids: Iterable[str]) -> int:
+        with self._lock:
+            doomed = {self._positions[object_id] for object_id in ids if object_id in self._positions}
+            if not doomed:
+                return 0
+            keep = np.ones(len(self._ids), dtype=bool)
+            keep[list(doomed)] = False
+            self._vectors = self._matrix()[keep]
+            self._objects = [properties for properties, kept in zip(self._objects, keep) if kept]
+            self._ids = [object_id for object_id, kept in zip(self._ids, keep) if kept]
+            self._positions = {object_id: position for position, object_id in enumerate(self._ids)}
+            self._columns = {}
+            self._dirty = True
+        return len(doomed)
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, str]]]:
+        with self._lock:
+            ids = list(self._ids)
+            objects = list(self._objects)
+        return iter(zip(ids, objects))
+
+    def _column(self, prop: str) -> np.ndarray:
+        """Values of a property for every object, built on first use. Holds the lock."""
+        if prop not in self._columns:
+            self._columns[prop] = np.array([properties.get(prop, '') for properties in self._objects], dtype=object)
+        return self._columns[prop]
+
+    def _mask(self, filters: Optional[Dict[str, str]]) -> Optional[np.ndarray]:
+        """Boolean mask of the objects matching the filters, None for no filters. Holds the lock."""
+        if not filters:
+            return None
+        mask = np.ones(len(self._objects), dtype=bool)
+        for prop, value in filters.items():
+            mask &= self._column(prop) == value
+        return mask
+
+    def near_text(self, query: str, limit: int, filters: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        vector = self.embed(query).astype(np.float32)
+        with self._lock:
+            vectors = self._matrix()
+            objects = self._objects
+            mask = self._mask(filters)
+        if not len(vectors) or limit <= 0:
+            return []
+
+        similarities = vectors @ vector
+        if mask is not None:
+            candidates = np.flatnonzero(mask)
+            similarities = similarities[candidates]
+        else:
+            candidates = None
+        if limit < len(similarities):
+            top = np.argpartition(-similarities, limit - 1)[:limit]
+        else:
+            top = np.arange(len(similarities))
+        top = top[np.argsort(-similarities[top], kind='stable')]
+        indices = top if candidates is None else candidates[top]
+        return [{'properties': objects[index], 'distance': float(1 - similarities[rank])}
+                for index, rank in zip(indices, top)]
+
+    def fetch(self, limit: int, filters: Optional[Dict[str, str]] = None, offset: int = 0) -> List[Dict[str, str]]:
+        with self._lock:
+            objects = self._objects
+            mask = self._mask(filters)
+        if mask is None:
+            return objects[offset:offset + limit]
+        return [objects[index] for index in np.flatnonzero(mask)[offset:offset + limit]]
+
+    def group_counts(self, prop: str) -> Dict[str, int]:
+        with self._lock:
+            values, counts = np.unique(self._column(prop).astype(str), return_counts=True)
+        return {str(value): int(count) for value, count in zip(values, counts)}
+
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        # One file holding the vectors, ids, properties and metadata, plus its SHA-256
+        with self._lock:
+            vectors = self._matrix()
+            data = json.dumps({'ids': self._ids, 'objects': self._objects, 'properties': self.properties,
+                               'vector_properties': self.vector_properties})
+        os.makedirs(path, exist_ok=True)
+        file = os.path.join(path, 'snapshot.npz')
+        with open(file + '.tmp', 'wb') as f:
+            np.savez(f, vectors=vectors, data=np.frombuffer(data.encode('utf-8'), dtype=np.uint8))
+        os.replace(file + '.tmp', file)
+        return {'file': 'snapshot.npz', 'sha256': _file_sha256(file), 'embedder': self.embedder,
+                'dimensions': self.dimensions}
+
+    def restore_snapshot(self, path: str, manifest: Dict[str, Any]) -> None:
+        if manifest.get('embedder') != self.embedder or manifest.get('dimensions') != self.dimensions:
+            raise RuntimeError(f"Snapshot was built with embedder {manifest.get('embedder')} "
+                               f"({manifest.get('dimensions')} dimensions)")
+        file = os.path.join(path, manifest['file'])
+        if _file_sha256(file) != manifest['sha256']:
+            raise RuntimeError(f"Snapshot file {file} does not match its checksum")
+        with np.load(file) as snapshot:
+            vectors = snapshot['vectors'].astype(np.float32, copy=False)
+            data = json.loads(snapshot['data'].tobytes().decode('utf-8'))
+        if not len(data['ids']) == len(data['objects']) == len(vectors):
+            raise RuntimeError(f"Snapshot file {file} is inconsistent")
+        with self._lock:
+            self._reset(data['properties'])
+            self.vector_properties = data.get('vector_properties') or self.vector_properties
+            self._vectors = vectors
+            self._objects = data['objects']
+            self._ids = data['ids']
+            self._positions = {object_id: position for position, object_id in enumerate(self._ids)}
+            self._dirty = True
+        self.flush()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"Error saving vector store {self.path}: {e}")
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def _shared_embedder():
+    """Embedder of the NumPy engine, loaded once: VECTOR_STORE_EMBED_MODEL, or hashed features."""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            model_name = os.getenv('VECTOR_STORE_EMBED_MODEL')
+            if model_name:
+                _embedder = SentenceTransformerEmbedder(model_name)
+            else:
+                from .semantic_cache import HashingEmbedder
+                _embedder = HashingEmbedder(dimensions=int(os.getenv('VECTOR_STORE_DIMENSIONS', '512')))
+        return _embedder
+
+
+def create_store(name: str, vector_properties: Optional[Sequence[str]] = None) -> VectorStore:
+    """
+    Open a collection with the engine selected by VECTOR_STORE
+
+    'weaviate' (default) uses the local Weaviate instance; 'numpy' keeps the
+    collection in-process under VECTOR_STORE_PATH. vector_properties are the
+    properties the NumPy engine embeds (default: all of them).
+    """
+    engine = os.getenv('VECTOR_STORE', 'weaviate').lower().strip()
+    if engine == 'weaviate':
+        return WeaviateStore(name)
+    if engine == 'numpy':
+        path = os.path.join(os.getenv('VECTOR_STORE_PATH', DEFAULT_STORE_PATH), name.lower())
+        return NumpyStore(name, path, embed=_shared_embedder(), vector_properties=vector_properties)
+    raise ValueError(f"Unknown vector store: {engine}")
@@ -0,0 +1 @@
+# Load test and benchmark tools; see load_test.py
@@ -0,0 +1,279 @@
+"""
+End-to-end load test for the Flask endpoints
+
+Drives /suggest_ingredients, /find_recipes and /generate_recipe with a
+configurable request mix and concurrency, and reports throughput and latency
+percentiles per endpoint. By default the app is served in-process with local
+stand-ins for Weaviate and the model provider, so no network or GPU is needed;
+--url targets a running server instead. Results are written as JSON so runs can
+be compared across commits (--compare).
+
+Run from the flask-server directory:
+    python -m benchmarks.load_test --concurrency 16 --requests 500 --mix suggest=6,find=3,generate=1
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from .stand_ins import INGREDIENTS
+
+ENDPOINTS = ('suggest', 'find', 'generate')
+CUISINES = ['', 'Italian', 'Mexican', 'Asian', 'Mediterranean']
+MEAL_TYPES = ['', 'breakfast', 'lunch', 'dinner']
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse 'suggest=6,find=3,generate=1' into normalized endpoint weights."""
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name} (expected one of {', '.join(ENDPOINTS)})")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Request mix must have a positive weight")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def make_request(endpoint: str, rng: random.Random) -> Tuple[str, str, Optional[dict]]:
+    """Return (method, path, json body) of a random request to endpoint."""
+    if endpoint == 'suggest':
+        ingredient = rng.choice(INGREDIENTS)
+        return 'GET', f"/suggest_ingredients?query={ingredient[:rng.randint(2, len(ingredient))]}", None
+    ingredients = rng.sample(INGREDIENTS, rng.randint(2, 3))
+    if endpoint == 'find':
+        return 'POST', '/find_recipes', {'query': ', '.join(ingredients)}
+    return 'POST', '/generate_recipe', {'ingredients': ingredients, 'cuisine': rng.choice(CUISINES),
+                                        'meal_type': rng.choice(MEAL_TYPES)}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile of values (q in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples: List[Tuple[float, bool]], elapsed: float) -> Dict[str, float]:
+    latencies = [latency for latency, _ in samples]
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / elapsed, 3) if elapsed else 0.0,
+        'mean_ms': round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        'p50_ms': round(1000 * percentile(latencies, 50), 2),
+        'p95_ms': round(1000 * percentile(latencies, 95), 2),
+        'p99_ms': round(1000 * percentile(latencies, 99), 2),
+        'max_ms': round(1000 * max(latencies), 2) if latencies else 0.0,
+    }
+
+
+def start_local_server(args) -> Tuple[str, object]:
+    """Serve flask_app in-process with stand-in backends; return (base url, server)."""
+    os.environ['STARTUP_MODE'] = 'manual'
+    os.environ.setdefault('LLM_CACHE_ENABLED', '1' if args.cache else '0')
+    # The replay provider needs no network; without a corpus it is replaced by the synthetic model below
+    os.environ['DEFAULT_MODEL_PROVIDER'] = 'replay'
+    os.environ['REPLAY_MODE'] = 'replay'
+    if args.replay_corpus:
+        os.environ['REPLAY_CORPUS'] = args.replay_corpus
+        os.environ.setdefault('REPLAY_LATENCY', 'recorded')
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import flask_app
+    from .stand_ins import StubIngredientDB, StubRecipeDB, SyntheticModel
+
+    def load_llm():
+        import backend.LLM
+        if not args.replay_corpus:
+            from backend.models.instrumented_model import InstrumentedModel
+            synthetic = SyntheticModel(ttft=args.model_ttft, tokens_per_second=args.model_tps)
+            backend.LLM.model = (InstrumentedModel(synthetic) if os.getenv('LLM_METRICS', '1') == '1'
+                                 else synthetic)
+        return backend.LLM
+
+    backends = flask_app.backends
+    backends.register('ingredient_db', lambda: StubIngredientDB(latency=args.db_latency))
+    backends.register('recipe_db', lambda: StubRecipeDB(latency=args.db_latency))
+    backends.register('llm', load_llm)
+    backends.initialize()
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, flask_app.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name='benchmark-server', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def run(args) -> Dict:
+    mix = parse_mix(args.mix)
+    server = None
+    base_url = args.url.rstrip('/') if args.url else None
+    if base_url is None:
+        base_url, server = start_local_server(args)
+
+    rng = random.Random(args.seed)
+    names, weights = zip(*mix.items())
+    plan = [rng.choices(names, weights)[0] for _ in range(args.warmup + args.requests)]
+    requests_plan = [(endpoint, make_request(endpoint, rng)) for endpoint in plan]
+
+    local = threading.local()
+    lock = threading.Lock()
+    samples: Dict[str, List[Tuple[float, bool]]] = defaultdict(list)
+    next_index = [0]
+    deadline = [None]
+    # First start and last end of the measured requests, so warm-up is excluded from throughput
+    window = [None, None]
+
+    def session() -> requests.Session:
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    def worker():
+        while True:
+            with lock:
+                index = next_index[0]
+                if index >= len(requests_plan) or (deadline[0] and time.perf_counter() > deadline[0]):
+                    return
+                next_index[0] += 1
+            endpoint, (method, path, body) = requests_plan[index]
+            start = time.perf_counter()
+            try:
+                response = session().request(method, base_url + path, json=body, timeout=args.timeout)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            end = time.perf_counter()
+            if index >= args.warmup:
+                with lock:
+                    samples[endpoint].append((end - start, ok))
+                    window[0] = start if window[0] is None else min(window[0], start)
+                    window[1] = end if window[1] is None else max(window[1], end)
+
+    print(f"Running {args.requests} requests ({args.warmup} warm-up) against {base_url} "
+          f"with concurrency {args.concurrency}")
+    started = time.perf_counter()
+    if args.duration:
+        deadline[0] = started + args.duration
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.concurrency):
+            executor.submit(worker)
+    elapsed = (window[1] - window[0]) if window[0] is not None else time.perf_counter() - started
+
+    if server is not None:
+        server.shutdown()
+
+    all_samples = [sample for endpoint_samples in samples.values() for sample in endpoint_samples]
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'config': {
+            'target': args.url or 'in-process stand-ins',
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'duration': args.duration,
+            'mix': mix,
+            'seed': args.seed,
+            'db_latency': args.db_latency,
+            'model_ttft': args.model_ttft,
+            'model_tps': args.model_tps,
+            'replay_corpus': args.replay_corpus,
+            'cache': args.cache,
+            'llm_async': os.getenv('LLM_ASYNC', '0') == '1',
+        },
+        'elapsed_seconds': round(elapsed, 3),
+        'overall': summarize(all_samples, elapsed),
+        'endpoints': {endpoint: summarize(samples[endpoint], elapsed) for endpoint in ENDPOINTS
+                      if samples[endpoint]},
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result: Dict, baseline: Optional[Dict] = None) -> None:
+    columns = ('requests', 'errors', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+    print(f"\n{'endpoint':<10}" + ''.join(f"{c:>16}" for c in columns))
+    rows = list(result['endpoints'].items()) + [('overall', result['overall'])]
+    for name, stats in rows:
+        line = f"{name:<10}"
+        for column in columns:
+            value = stats[column]
+            cell = f"{value:g}"
+            if baseline is not None:
+                base = (baseline['overall'] if name == 'overall'
+                        else baseline.get('endpoints', {}).get(name, {})).get(column)
+                if base:
+                    cell += f" ({100 * (value - base) / base:+.0f}%)"
+            line += f"{cell:>16}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the recipe endpoints.")
+    parser.add_argument('--url', help="Base URL of a running server (default: serve the app in-process)")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients")
+    parser.add_argument('--requests', type=int, default=200, help="Measured requests")
+    parser.add_argument('--warmup', type=int, default=10, help="Unmeasured requests sent first")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    parser.add_argument('--mix', default='suggest=6,find=3,generate=1', help="Endpoint weights")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the request generator")
+    parser.add_argument('--timeout', type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument('--db-latency', type=float, default=0.005, help="Stand-in Weaviate query latency")
+    parser.add_argument('--model-ttft', type=float, default=0.2, help="Stand-in model time to first token")
+    parser.add_argument('--model-tps', type=float, default=50, help="Stand-in model tokens per second")
+    parser.add_argument('--replay-corpus', help="Replay a recorded corpus instead of the synthetic model")
+    parser.add_argument('--cache', action='store_true', help="Keep the LLM response cache enabled")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument('--compare', help="Previous result file to compare against")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{result['commit'] or 'unknown'}.json")
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import hashlib
+import random
+import time
+from typing import Dict, Iterator, List
+from backend.autocomplete import AutocompleteIndex, suggest_ingredients
+from backend.models.base_model import BaseModel
+
+INGREDIENTS = [
+    'apple', 'asparagus', 'avocado', 'bacon', 'basil', 'beef', 'bell pepper', 'black beans', 'broccoli',
+    'butter', 'carrot', 'cauliflower', 'cheddar', 'chicken', 'chickpeas', 'cilantro', 'coconut milk', 'cod',
+    'corn', 'cream', 'cucumber', 'eggplant', 'eggs', 'feta', 'garlic', 'ginger', 'honey', 'kale', 'lamb',
+    'leek', 'lemon', 'lentils', 'lime', 'mushroom', 'mozzarella', 'onion', 'parmesan', 'pasta', 'peas',
+    'pork', 'potato', 'quinoa', 'rice', 'salmon', 'shrimp', 'spinach', 'sweet potato', 'tofu', 'tomato',
+    'tuna', 'turkey', 'yogurt', 'zucchini',
+]
+
+
+def _rng(text: str) -> random.Random:
+    """Random generator seeded from text so stand-in results are deterministic per query."""
+    return random.Random(int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:16], 16))
+
+
+class StubIngredientDB:
+    """Stand-in for IngredientDBEfficient that answers searches from a fixed vocabulary."""
+
+    def __init__(self, latency: float = 0.005):
+        self.latency = latency
+        self.collection_name = 'Ingredients'
+        # Suggestions take the real path: the autocomplete index, then this stand-in's vector search
+        self.autocomplete = AutocompleteIndex(INGREDIENTS)
+        self.autocomplete_min_hits = 3
+
+    def suggest_ingredients(self, query: str, limit: int = 5) -> List[str]:
+        return suggest_ingredients(self.autocomplete, self.search_similar_ingredients, query, limit,
+                                   self.autocomplete_min_hits, self.collection_name)
+
+    def search_similar_ingredients(self, query_text: str, limit: int = 5) -> List[Dict]:
+        time.sleep(self.latency)
+        query = query_text.strip().lower()
+        matches = [i for i in INGREDIENTS if i.startswith(query)] or _rng(query).sample(INGREDIENTS, limit)
+        return [{'properties': {'ingredient': ingredient, 'class': 'food'}, 'distance': 0.1 * rank}
+                for rank, ingredient in enumerate(matches[:limit])]
+
+    def close(self):
+        pass
+
+
+class StubRecipeDB:
+    """Stand-in for RecipeDB that returns generated recipes for a query."""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.collection_name = 'Recipe'
+
+    def search_similar_recipes_by_ingredients(self, ingredients: str, limit: int = 3) -> List[Dict]:
+        time.sleep(self.latency)
+        rng = _rng(ingredients)
+        results = []
+        for rank in range(limit):
+            chosen = rng.sample(INGREDIENTS, 5)
+            results.append({
+                'title': f"{chosen[0].title()} and {chosen[1].title()} Bake",
+                'ingredients': str(chosen),
+                'instructions': "Prepare the ingredients. Combine everything. Bake for 30 minutes.",
+                'similarity_score': 0.9 - 0.1 * rank,
+            })
+        return results
+
+    def close(self):
+        pass
+
+
+class SyntheticModel(BaseModel):
+    """
+    Stand-in model that produces well-formed recipe lists and recipes
+
+    Responses follow the <analysis>/<final_output> layout the system prompts ask
+    for, so the real parsers run on them. Streaming waits `ttft` seconds, then
+    yields roughly one token per chunk at `tokens_per_second`.
+    """
+
+    provider = 'synthetic'
+    model = 'synthetic'
+
+    def __init__(self, ttft: float = 0.2, tokens_per_second: float = 50.0):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+
+    def _respond(self, messages: List[Dict[str, str]]) -> str:
+        prompt = messages[-1]['content']
+        rng = _rng(prompt)
+        analysis = "<analysis>\nPlanning a balanced meal around the requested ingredients.\n</analysis>\n"
+        if prompt.startswith('Recipe Name:'):
+            ingredients = rng.sample(INGREDIENTS, 6)
+            recipe = {
+                'ingredients': [f"{rng.randint(1, 4)} cups {i}" for i in ingredients],
+                'instructions': [f"Prepare the {i}" for i in ingredients] + ['Combine and serve'],
+            }
+            final = repr(recipe)
+        else:
+            recipes = []
+            for _ in range(3):
+                a, b = rng.sample(INGREDIENTS, 2)
+                recipes.append({'recipe': f"{a.title()} with {b.title()}",
+                                'description': f"A simple dish of {a} and {b} with fresh herbs."})
+            final = repr(recipes)
+        return f"{analysis}<final_output>\n{final}\n</final_output>"
+
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        response = self._respond(messages)
+        time.sleep(self.ttft + (len(response) / 4) / self.tokens_per_second)
+        return response
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        response = self._respond(messages)
+        time.sleep(self.ttft)
+        delay = 1 / self.tokens_per_second
+        for i in range(0, len(response), 4):
+            yield response[i:i + 4]
+            time.sleep(delay)
+
+    def is_available(self) -> bool:
+        return True
@@ -1,22 +1,113 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 import jinja2
+import json
+import math
 import os
+import queue
+import threading
+import uuid
+from contextlib import aclosing, contextmanager
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from backend.ingredient_db_efficient import IngredientDBEfficient
-from backend.recipe_vector_DB import RecipeDB
+from backend.startup import BackendRegistry, BackendNotReady
+from backend import admission, cancellation, metrics
+from backend.jobs import Job, JobQueue, QueueFull, PRIORITIES
 
 template_dir = os.path.join(os.path.dirname(__file__), 'templates')
 jinja_env = jinja2.Environment(loader=jinja2.FileSystemLoader(template_dir), autoescape=True)
 
 app = Flask(__name__)
 
-# Initialize databases
-ingredient_db = IngredientDBEfficient()
-recipe_db = RecipeDB()
+# Run generations on the shared async event loop instead of a thread pool per request
+LLM_ASYNC = os.getenv('LLM_ASYNC', '0') == '1'
+
+# Initialize databases and the LLM. Heavy modules are imported inside the factories so the
+# server can bind immediately; STARTUP_MODE=eager initializes everything before serving, and
+# STARTUP_MODE=manual leaves initialization to the caller (e.g. the benchmarks, which register stand-ins).
+backends = BackendRegistry()
+
+
+def _create_ingredient_db():
+    with backends.phase('ingredient_db.import'):
+        from backend.ingredient_db_efficient import IngredientDBEfficient
+    ingredient_db = IngredientDBEfficient()
+    # Time to ready of the collection, by the path that loaded it (existing, snapshot, ...)
+    backends.record_phase(f"ingredient_db.{ingredient_db.boot_report['path']}", ingredient_db.boot_report['seconds'])
+    with backends.phase('ingredient_db.autocomplete'):
+        ingredient_db.load_autocomplete()
+    return ingredient_db
+
+
+def _create_recipe_db():
+    with backends.phase('recipe_db.import'):
+        from backend.recipe_vector_DB import RecipeDB
+    recipe_db = RecipeDB()
+    backends.record_phase(f"recipe_db.{recipe_db.boot_report['path']}", recipe_db.boot_report['seconds'])
+    return recipe_db
+
+
+def _load_llm():
+    import backend.LLM
+    return backend.LLM
+
+
+backends.register('ingredient_db', _create_ingredient_db)
+backends.register('recipe_db', _create_recipe_db)
+backends.register('llm', _load_llm)
+
+STARTUP_MODE = os.getenv('STARTUP_MODE', 'background')
+if STARTUP_MODE == 'eager':
+    backends.initialize()
+elif STARTUP_MODE != 'manual':
+    backends.start()
+
+
+@app.errorhandler(BackendNotReady)
+def backend_not_ready(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+
+
+@app.errorhandler(admission.Rejected)
+def backend_overloaded(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+
+# Per-client token buckets by class of route, e.g. RATE_LIMIT_GENERATE_PER_MINUTE=10
+RATE_LIMITED_ENDPOINTS = {
+    'generate_recipe': 'generate',
+    'generate_recipe_stream': 'generate',
+    'create_job': 'generate',
+    'find_recipes': 'search',
+    'suggest_ingredients': 'search',
+}
+rate_limiters = {route: admission.rate_limiter(route) for route in set(RATE_LIMITED_ENDPOINTS.values())}
+
+
+@app.before_request
+def rate_limit():
+    route = RATE_LIMITED_ENDPOINTS.get(request.endpoint)
+    limiter = rate_limiters.get(route)
+    if limiter is None:
+        return None
+    wait = limiter.take(request.remote_addr or 'unknown')
+    if wait:
+        admission.RATE_LIMITED.inc(route=route)
+        return jsonify({"error": "Too many requests"}), 429, {"Retry-After": str(math.ceil(wait))}
+    return None
+
+
+@app.route("/healthz")
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz")
+def readyz():
+    status = backends.status()
+    return jsonify(status), 200 if status['ready'] else 503
 
 
 @app.route("/")
@@ -30,21 +121,14 @@ def suggest_ingredients():
     if not query.strip():
         return jsonify([])
 
+    ingredient_db = backends.get('ingredient_db')
     try:
-        # Use the initialized database instance
-        similar_ingredients = ingredient_db.search_similar_ingredients(query, limit=5)
+        # Complete from the in-memory autocomplete index, falling back to vector search
+        result_ingredients = [ingredient.lower() for ingredient in ingredient_db.suggest_ingredients(query, limit=5)]
         # Add the search query as first suggestion if no exact match exists
         suggestions = []
         query_capitalized = ' '.join(word.capitalize() for word in query.strip().split())
-        
-        # Extract ingredient names from results
-        result_ingredients = []
-        for item in similar_ingredients:
-            if isinstance(item, dict) and 'properties' in item:
-                ingredient = item['properties'].get('ingredient')
-                if ingredient:
-                    result_ingredients.append(ingredient.lower())
-        
+
         # Add search query first if it's not in results
         if query.lower() not in result_ingredients:
             suggestions.append(query_capitalized)
@@ -52,6 +136,8 @@ def suggest_ingredients():
         # Add other suggestions
         suggestions.extend(result_ingredients)
         return jsonify(suggestions)
+    except admission.Rejected:
+        raise
     except Exception as e:
         print(f"Error suggesting ingredients: {e}")
         return jsonify([])
@@ -59,6 +145,7 @@ def suggest_ingredients():
 
 @app.route('/find_recipes', methods=['POST'])
 def find_recipes():
+    recipe_db = backends.get('recipe_db')
     try:
         if not request.is_json:
             return jsonify({'error': 'Request must be JSON'}), 400
@@ -107,13 +194,30 @@ def find_recipes():
 
         return jsonify({'recipes': formatted_recipes})
 
+    except admission.Rejected:
+        raise
     except Exception as e:
         print(f"Error in find_recipes: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+def _request_id(data=None):
+    """Id a client can cancel a generation by: 'request_id' in the body, the X-Request-ID header, or a new one."""
+    request_id = (data or {}).get('request_id') or request.headers.get('X-Request-ID')
+    return str(request_id)[:128] if request_id else uuid.uuid4().hex
+
+
+@app.route("/cancel/<request_id>", methods=["POST"])
+def cancel_request(request_id):
+    """Cancel an in-flight generation: pending model calls, retries and recipes are skipped."""
+    if not cancellation.registry.cancel(request_id):
+        return jsonify({"error": "No such request in flight", "request_id": request_id}), 404
+    return jsonify({"cancelled": True, "request_id": request_id})
+
+
 @app.route("/generate_recipe", methods=["POST"])
 def generate_recipe():
+    backends.get('llm')
     try:
         data = request.get_json()
         if not data:
@@ -128,51 +232,386 @@ def generate_recipe():
             return jsonify({"error": "No ingredients provided"}), 400
 
         # Import LLM functions
-        from backend.LLM import create_recipe_list, write_recipe
-        
-        # Generate recipe list
-        print(f"Generating recipes for ingredients: {ingredients}")
-        recipes_list = create_recipe_list(
-            ingredients=ingredients,
-            cuisine=cuisine,
-            meal_type=meal_type
-        )
-
-        if not recipes_list:
-            return jsonify({"error": "No recipes could be generated"}), 404
+        from backend.LLM import generate_recipes, agenerate_recipes
+        from backend.async_runtime import run_async
 
-        # Format each recipe
-        formatted_recipes = []
-        for recipe_info in recipes_list:
-            try:
-                recipe = write_recipe(
-                    name=recipe_info['recipe'],
-                    description=recipe_info['description'],
+        # Generate the recipe list and write its recipes concurrently, keeping the list order.
+        # With LLM_PIPELINE (default), recipes are started while the list is still streaming.
+        # POST /cancel/<request_id> stops the generation. With LLM_ASYNC the generation runs on the
+        # shared event loop, but this worker still waits for it: use /generate_recipe/stream or /jobs
+        print(f"Generating recipes for ingredients: {ingredients}")
+        with cancellation.registry.track(_request_id(data)) as token:
+            if LLM_ASYNC:
+                recipes_list, formatted_recipes = run_async(cancellation.bind(token, agenerate_recipes(
+                    ingredients=ingredients,
+                    cuisine=cuisine,
+                    meal_type=meal_type
+                )))
+            else:
+                recipes_list, formatted_recipes = generate_recipes(
                     ingredients=ingredients,
                     cuisine=cuisine,
                     meal_type=meal_type
                 )
-                
-                if recipe:
-                    formatted_recipes.append({
-                        "name": recipe_info['recipe'],
-                        "description": recipe_info['description'],
-                        "ingredients": recipe['ingredients'],
-                        "instructions": recipe['instructions']
-                    })
-            except Exception as e:
-                print(f"Error formatting recipe: {e}")
-                continue
+
+        if not recipes_list:
+            return jsonify({"error": "No recipes could be generated"}), 404
 
         if not formatted_recipes:
             return jsonify({"error": "Failed to format recipes"}), 500
 
         return jsonify({"recipes": formatted_recipes})
 
+    except cancellation.Cancelled as e:
+        print(e)
+        # 499: client closed request
+        return jsonify({"error": "Request cancelled"}), 499
+    except admission.Rejected:
+        raise
     except Exception as e:
         print(f"Error generating recipe: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/cache/stats")
+def cache_stats():
+    llm = backends.get('llm')
+    stats = {"enabled": False} if llm.response_cache is None else {"enabled": True, **llm.response_cache.get_stats()}
+    stats["semantic"] = ({"enabled": False} if llm.semantic_cache is None
+                         else {"enabled": True, **llm.semantic_cache.get_stats()})
+    return jsonify(stats)
+
+
+@app.route("/llm/stats")
+def llm_stats():
+    llm = backends.get('llm')
+    return jsonify({
+        "retries": llm.get_retry_stats(),
+        "prompts": llm.prompts.describe(),
+        "circuit": llm.model.circuit_stats() if hasattr(llm.model, 'circuit_stats') else None
+    })
+
+
+@app.route("/admission/stats")
+def admission_stats():
+    return jsonify({
+        "backends": admission.get_stats(),
+        "rate_limits": {route: None if limiter is None else {"per_minute": limiter.rate * 60, "burst": limiter.burst}
+                        for route, limiter in rate_limiters.items()}
+    })
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/single_flight/stats")
+def single_flight_stats():
+    return jsonify({
+        "llm": backends.get('llm').recipe_flights.get_stats(),
+        "recipe_search": backends.get('recipe_db').search_flights.get_stats()
+    })
+
+
+# Collections that can be synced with their source dataset, and the backend holding each
+SYNC_BACKENDS = {'recipes': 'recipe_db', 'ingredients': 'ingredient_db'}
+sync_locks = {name: threading.Lock() for name in SYNC_BACKENDS}
+
+
+@app.route("/collections/<name>/sync", methods=["POST"])
+def sync_collection(name):
+    if name not in SYNC_BACKENDS:
+        return jsonify({"error": f"Unknown collection: {name}"}), 404
+    db = backends.get(SYNC_BACKENDS[name])
+    if not sync_locks[name].acquire(blocking=False):
+        return jsonify({"error": f"A sync of {name} is already running"}), 409
+    try:
+        return jsonify(db.sync())
+    except Exception as e:
+        print(f"Error syncing {name}: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        sync_locks[name].release()
+
+
+def _sse(event, data):
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Seconds between SSE comments sent while no event is ready, so a client that went away is noticed
+SSE_KEEPALIVE = float(os.getenv('SSE_KEEPALIVE_SECONDS', '2'))
+
+
+@app.route("/generate_recipe/stream", methods=["POST"])
+def generate_recipe_stream():
+    """
+    Streaming variant of /generate_recipe using Server-Sent Events.
+
+    Events:
+        recipe_list: [{"name", "description"}, ...] as soon as the list is generated
+        token:       {"index", "text"} for every streamed chunk (index is null while the list is generated)
+        recipe:      {"index", "recipe"} whenever a recipe is written (recipe is null on failure)
+        error:       {"error"}
+        done:        {"count"}
+
+    The generation is cancelled when the client disconnects or calls
+    POST /cancel/<request_id> (request id from the body or the X-Request-ID header).
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    ingredients = [ing.strip() for ing in data.get('ingredients', []) if ing.strip()]
+    cuisine = data.get("cuisine", "")
+    meal_type = data.get("meal_type", "")
+    stream_tokens = data.get("stream_tokens", True)
+
+    if not ingredients:
+        return jsonify({"error": "No ingredients provided"}), 400
+
+    backends.get('llm')
+    from backend.LLM import iter_generated_recipes, aiter_generated_recipes
+    from backend.async_runtime import runtime
+
+    request_id = _request_id(data)
+    token = cancellation.registry.register(request_id)
+    events = queue.Queue()
+    generation = dict(ingredients=ingredients, cuisine=cuisine, meal_type=meal_type,
+                      on_token=(lambda i, chunk: events.put(('token', {'index': i, 'text': chunk})))
+                      if stream_tokens else None)
+    written = []
+
+    def publish(event):
+        """Queue the SSE event of a pipeline event; False if the stream ends with it."""
+        if event[0] == 'recipe_list':
+            recipes_list = event[1]
+            if not recipes_list:
+                events.put(('error', {'error': 'No recipes could be generated'}))
+                return False
+            events.put(('recipe_list', [{'name': r['recipe'], 'description': r['description']}
+                                        for r in recipes_list]))
+            return True
+
+        _, index, recipe = event
+        if recipe:
+            written.append(index)
+        events.put(('recipe', {'index': index, 'recipe': recipe}))
+        return True
+
+    @contextmanager
+    def streaming():
+        """Report how the generation in the block ended, then end the stream."""
+        try:
+            print(f"Streaming recipes for ingredients: {ingredients}")
+            yield
+        except cancellation.Cancelled as e:
+            print(e)
+            events.put(('error', {'error': 'Request cancelled'}))
+        except Exception as e:
+            print(f"Error streaming recipe: {e}")
+            events.put(('error', {'error': str(e)}))
+        finally:
+            cancellation.registry.unregister(token)
+            events.put(None)
+
+    def run_pipeline():
+        with cancellation.scope(token), streaming():
+            for event in iter_generated_recipes(**generation):
+                if not publish(event):
+                    return
+            events.put(('done', {'count': len(written)}))
+
+    async def agenerate():
+        async with aclosing(aiter_generated_recipes(**generation)) as pipeline:
+            async for event in pipeline:
+                if not publish(event):
+                    return
+        events.put(('done', {'count': len(written)}))
+
+    async def arun_pipeline():
+        with streaming():
+            await cancellation.bind(token, agenerate())
+
+    if LLM_ASYNC:
+        # Generated by tasks on the shared event loop; only this response's worker waits for the events
+        runtime.submit(arun_pipeline())
+    else:
+        threading.Thread(target=run_pipeline, name='generate_recipe_stream', daemon=True).start()
+
+    def event_stream():
+        finished = False
+        try:
+            while True:
+                try:
+                    item = events.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    finished = True
+                    break
+                yield _sse(*item)
+        finally:
+            # Closed before the pipeline finished: the client went away
+            if not finished:
+                token.cancel('client_disconnect')
+
+    return Response(event_stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Request-ID': request_id})
+
+
+def _job_provider_limit(provider):
+    """Jobs run at once per provider: <PROVIDER>_MAX_JOBS, by default its max in-flight model calls."""
+    value = os.getenv(f'{provider.upper()}_MAX_JOBS')
+    try:
+        if value:
+            return max(1, int(value))
+    except ValueError:
+        print(f"Invalid {provider.upper()}_MAX_JOBS value: {value}")
+    return backends.get('llm').max_in_flight(provider)
+
+
+# Background generation jobs (POST /jobs), so long pipelines do not hold an HTTP worker
+job_queue = JobQueue(
+    workers=int(os.getenv('JOBS_WORKERS', '4')),
+    max_queued=int(os.getenv('JOBS_MAX_QUEUED', '100')),
+    provider_limit=_job_provider_limit,
+    retention=float(os.getenv('JOBS_RETENTION_SECONDS', '3600'))
+)
+
+
+def _run_generation_job(job):
+    """Create the recipe list of a job and write its recipes, reporting progress on the job."""
+    from backend.LLM import iter_generated_recipes, aiter_generated_recipes
+    from backend.async_runtime import run_async
+
+    job.progress.update(stage='create_recipe_list')
+    results = []
+
+    def record(event):
+        if event[0] == 'recipe_list':
+            if not event[1]:
+                raise RuntimeError("No recipes could be generated")
+            results.extend([None] * len(event[1]))
+            job.progress.update(stage='write_recipes', recipes_total=len(results))
+            return
+
+        _, index, recipe = event
+        results[index] = recipe
+        job.progress.update(recipes_done=job.progress.recipes_done + 1)
+
+    async def agenerate():
+        async with aclosing(aiter_generated_recipes(**job.request)) as pipeline:
+            async for event in pipeline:
+                record(event)
+
+    if LLM_ASYNC:
+        # The job's recipes are written on the shared event loop instead of a thread pool per job
+        run_async(cancellation.bind(job.token, agenerate()))
+    else:
+        for event in iter_generated_recipes(**job.request):
+            record(event)
+
+    recipes = [recipe for recipe in results if recipe]
+    if not recipes:
+        raise RuntimeError("Failed to format recipes")
+    return {"recipes": recipes}
+
+
+def _job_response(job):
+    response = job.to_dict()
+    position = job_queue.position(job.id)
+    if position is not None:
+        response['position'] = position
+    return response
+
+
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    """
+    Queue a recipe generation and return at once (202) with the job id.
+
+    Payload as /generate_recipe, plus an optional "priority" (interactive, default
+    or batch). Answers 429 with Retry-After when the queue is full.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    ingredients = [ing.strip() for ing in data.get('ingredients', []) if ing.strip()]
+    if not ingredients:
+        return jsonify({"error": "No ingredients provided"}), 400
+    priority = data.get('priority', 'default')
+    if priority not in PRIORITIES:
+        return jsonify({"error": f"Unknown priority: {priority}", "priorities": list(PRIORITIES)}), 400
+
+    llm = backends.get('llm')
+    job = Job(_run_generation_job, provider=llm.model.provider, priority=priority,
+              request=dict(ingredients=ingredients, cuisine=data.get("cuisine", ""),
+                           meal_type=data.get("meal_type", "")))
+    try:
+        job_queue.submit(job)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
+    return jsonify(_job_response(job)), 202, {"Location": f"/jobs/{job.id}"}
+
+
+@app.route("/jobs/stats")
+def job_stats():
+    return jsonify(job_queue.get_stats())
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "No such job"}), 404
+    return jsonify(_job_response(job))
+
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "No such job"}), 404
+    return jsonify(_job_response(job))
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """
+    Stream the progress of a job as Server-Sent Events.
+
+    Events:
+        progress: the job (without result) whenever its status or progress changes
+        done:     the job, with its result or error, once it has finished
+
+    Closing the stream does not cancel the job; DELETE /jobs/<id> does.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "No such job"}), 404
+
+    def event_stream():
+        version = None
+        while True:
+            current = job.version
+            if job.done:
+                yield _sse('done', _job_response(job))
+                return
+            if current != version:
+                version = current
+                update = _job_response(job)
+                update.pop('result', None)
+                yield _sse('progress', update)
+            elif job.wait(version, SSE_KEEPALIVE) == version:
+                yield ": keepalive\n\n"
+
+    return Response(event_stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 if __name__ == "__main__":
     app.run(debug=True)
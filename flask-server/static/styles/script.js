@@ -365,20 +365,21 @@ async function generateRecipe() {
     spinner.style.display = 'flex';
 
     try {
-        const endpoint = recipeMode === 'find' ? '/find_recipes' : '/generate_recipe';
+        const endpoint = recipeMode === 'find' ? '/find_recipes' : '/generate_recipe/stream';
         const requestData = recipeMode === 'find'
             ? { query: `${selectedIngredients.join(', ')}, ${cuisine}, ${mealType}` }
-            : { ingredients: selectedIngredients, cuisine: cuisine, meal_type: mealType };
+            : { ingredients: selectedIngredients, cuisine: cuisine, meal_type: mealType, stream_tokens: false };
 
         generateBtn.disabled = true;
         cancelBtn.style.display = 'inline-block';
 
         const controller = new AbortController();
         currentRequest = controller;
+        currentRequestId = newRequestId();
 
         const response = await fetch(endpoint, {
             method: "POST",
-            headers: { "Content-Type": "application/json" },
+            headers: { "Content-Type": "application/json", "X-Request-ID": currentRequestId },
             body: JSON.stringify({
                 ...requestData,
                 model_provider: modelProvider
@@ -387,6 +388,12 @@ async function generateRecipe() {
         });
 
         if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+
+        if (recipeMode !== 'find') {
+            await renderRecipeStream(response, recipeDisplay, spinner);
+            return;
+        }
+
         const result = await response.json();
 
         spinner.style.display = 'none';
@@ -436,38 +443,101 @@ async function generateRecipe() {
             // Hide cancel button and re-enable generate button when done
             document.getElementById('cancel-btn').style.display = 'none';
             document.getElementById('generate-btn').disabled = false;
-        } else {
+        }
+    } catch (error) {
+        spinner.style.display = 'none';
+        recipeDisplay.innerHTML = `<p>Error ${recipeMode === 'find' ? 'finding' : 'generating'} recipe: ${error.message}</p>`;
+    }
+}
+
+// Read Server-Sent Events from a fetch response and call onEvent(event, data) for each
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            onEvent(event, data ? JSON.parse(data) : null);
+        }
+    }
+}
+
+function generatedRecipeHtml(recipe) {
+    return `
+        <p><strong>Description:</strong> ${recipe.description}</p>
+        <h4>Ingredients:</h4>
+        <ul>
+            ${recipe.ingredients.map(ingredient => `<li>${ingredient}</li>`).join('')}
+        </ul>
+        <h4>Instructions:</h4>
+        <ol>
+            ${recipe.instructions.map(instruction => `<li>${instruction}</li>`).join('')}
+        </ol>
+    `;
+}
+
+// Render generated recipes as they arrive from /generate_recipe/stream
+async function renderRecipeStream(response, recipeDisplay, spinner) {
+    let received = false;
+
+    await readEventStream(response, (event, data) => {
+        if (event === 'recipe_list') {
+            received = true;
+            spinner.style.display = 'none';
             let recipesHtml = '<h3>Generated Recipes</h3>';
-            if (Array.isArray(result.recipes) && result.recipes.length > 0) {
-                result.recipes.forEach((recipe, index) => {
-                    recipesHtml += `
-                        <div class="recipe-container">
-                            <div class="recipe-header" onclick="toggleRecipeDetails('recipe-${index}')">
-                                ${recipe.name}
-                            </div>
-                            <div class="recipe-content" id="recipe-${index}" style="display: none;">
-                                <p><strong>Description:</strong> ${recipe.description}</p>
-                                <h4>Ingredients:</h4>
-                                <ul>
-                                    ${recipe.ingredients.map(ingredient => `<li>${ingredient}</li>`).join('')}
-                                </ul>
-                                <h4>Instructions:</h4>
-                                <ol>
-                                    ${recipe.instructions.map(instruction => `<li>${instruction}</li>`).join('')}
-                                </ol>
-                            </div>
+            data.forEach((recipe, index) => {
+                recipesHtml += `
+                    <div class="recipe-container" id="recipe-container-${index}">
+                        <div class="recipe-header" onclick="toggleRecipeDetails('recipe-${index}')">
+                            ${recipe.name}
                         </div>
-                    `;
-                });
+                        <div class="recipe-content" id="recipe-${index}" style="display: none;">
+                            <p><strong>Description:</strong> ${recipe.description}</p>
+                            <p><em>Writing recipe...</em></p>
+                        </div>
+                    </div>
+                `;
+            });
+            recipeDisplay.innerHTML = recipesHtml;
+        } else if (event === 'recipe') {
+            const content = document.getElementById(`recipe-${data.index}`);
+            if (!content) return;
+            if (data.recipe) {
+                content.innerHTML = generatedRecipeHtml(data.recipe);
             } else {
-                recipesHtml += '<p>No recipes generated</p>';
+                document.getElementById(`recipe-container-${data.index}`).remove();
+            }
+        } else if (event === 'error') {
+            spinner.style.display = 'none';
+            recipeDisplay.innerHTML = `<p>Error generating recipe: ${data.error}</p>`;
+        } else if (event === 'done') {
+            if (data.count === 0) {
+                recipeDisplay.innerHTML = '<h3>Generated Recipes</h3><p>No recipes generated</p>';
             }
-            recipeDisplay.innerHTML = recipesHtml;
         }
-    } catch (error) {
-        spinner.style.display = 'none';
-        recipeDisplay.innerHTML = `<p>Error ${recipeMode === 'find' ? 'finding' : 'generating'} recipe: ${error.message}</p>`;
+    });
+
+    spinner.style.display = 'none';
+    if (!received && !recipeDisplay.innerHTML) {
+        recipeDisplay.innerHTML = '<h3>Generated Recipes</h3><p>No recipes generated</p>';
     }
+    document.getElementById('cancel-btn').style.display = 'none';
+    document.getElementById('generate-btn').disabled = false;
 }
 
 // Add this function if it's not already in your code
@@ -480,6 +550,13 @@ function toggleRecipeDetails(recipeId) {
 }
 
 let currentRequest = null;
+let currentRequestId = null;
+
+// Id the server knows the generation by, so cancelling can stop it there too
+function newRequestId() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
 
 function toggleCustomCuisineInput() {
     const customCuisineInput = document.getElementById('custom-cuisine');
@@ -498,6 +575,12 @@ function cancelGeneration() {
         currentRequest.abort();
         currentRequest = null;
     }
+    if (currentRequestId) {
+        // Stop the model calls on the server, not just the download
+        fetch(`/cancel/${encodeURIComponent(currentRequestId)}`, { method: "POST", keepalive: true })
+            .catch(() => {});
+        currentRequestId = null;
+    }
     document.getElementById('loading-spinner').style.display = 'none';
     document.getElementById('generate-btn').disabled = false;
     document.getElementById('cancel-btn').style.display = 'none';
@@ -0,0 +1,17 @@
+import os
+import sys
+
+# Tests import the app's modules as `backend.*`, like flask_app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def flask_app(monkeypatch):
+    """The web app with an empty backend registry: tests register the stand-ins they need."""
+    monkeypatch.setenv('STARTUP_MODE', 'manual')
+    import flask_app
+    from backend.startup import BackendRegistry
+    monkeypatch.setattr(flask_app, 'backends', BackendRegistry())
+    return flask_app
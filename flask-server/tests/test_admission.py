@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend import admission
+from backend.admission import AdaptiveLimiter, Rejected, TokenBucketLimiter
+
+
+def call(limiter, latency):
+    limiter.acquire()
+    limiter.release(latency)
+
+
+def test_limit_backs_off_on_slow_calls_and_grows_back():
+    limiter = AdaptiveLimiter('test', max_limit=4, latency_target=0.5, backoff=0.5)
+    call(limiter, 2.0)
+    assert limiter.limit == 2.0
+    # At most one decrease per target interval
+    call(limiter, 2.0)
+    assert limiter.limit == 2.0
+
+    # One call more per window of fast calls
+    call(limiter, 0.1)
+    call(limiter, 0.1)
+    assert limiter.limit == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+    for _ in range(10):
+        call(limiter, 0.1)
+    assert limiter.limit == 4
+    stats = limiter.get_stats()
+    assert (stats['decreases'], stats['increases']) == (1, 6)
+
+
+def test_limit_is_fixed_without_latency_target():
+    limiter = AdaptiveLimiter('test', max_limit=4)
+    call(limiter, 10.0)
+    assert limiter.limit == 4
+
+
+def test_rejects_when_expected_wait_exceeds_budget():
+    limiter = AdaptiveLimiter('test', max_limit=1, queue_budget=0.5)
+    call(limiter, 2.0)
+    limiter.acquire()
+    with pytest.raises(Rejected) as rejected:
+        limiter.acquire()
+    assert rejected.value.reason == 'queue_budget'
+    assert rejected.value.retry_after == 2
+    assert limiter.get_stats()['rejected'] == 1
+    assert limiter.queued == 0
+
+
+def test_waits_without_budget_and_is_woken_on_release(monkeypatch):
+    # Waiters must be woken by release(), not find out by polling
+    monkeypatch.setattr(admission, 'POLL_INTERVAL', 30)
+    limiter = AdaptiveLimiter('test', max_limit=1)
+    call(limiter, 60.0)
+    limiter.acquire()
+    admitted = threading.Event()
+
+    def wait():
+        limiter.acquire()
+        admitted.set()
+
+    waiter = threading.Thread(target=wait, daemon=True)
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while limiter.queued == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert limiter.queued == 1 and not admitted.is_set()
+
+    limiter.release(60.0)
+    assert admitted.wait(2)
+    assert (limiter.in_flight, limiter.queued) == (1, 0)
+
+
+def test_async_waiter_is_woken_on_release(monkeypatch):
+    monkeypatch.setattr(admission, 'POLL_INTERVAL', 30)
+    limiter = AdaptiveLimiter('test', max_limit=1)
+
+    async def main():
+        limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0.05)
+        assert limiter.queued == 1
+        limiter.release(1.0)
+        await asyncio.wait_for(waiter, 2)
+
+    asyncio.run(main())
+    assert (limiter.in_flight, limiter.queued) == (1, 0)
+
+
+def test_waiter_gives_up_after_budget(monkeypatch):
+    monkeypatch.setattr(admission, 'POLL_INTERVAL', 0.01)
+    limiter = AdaptiveLimiter('test', max_limit=1, queue_budget=0.1)
+    limiter.acquire()
+    with pytest.raises(Rejected) as rejected:
+        limiter.acquire()
+    assert rejected.value.reason == 'wait_timeout'
+
+
+def test_token_bucket_refills(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(admission, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    bucket = TokenBucketLimiter(rate=2, burst=2)
+    assert bucket.take('a') == 0
+    assert bucket.take('a') == 0
+    assert bucket.take('a') == pytest.approx(0.5)
+    # Buckets are per client
+    assert bucket.take('b') == 0
+
+    now[0] += 0.5
+    assert bucket.take('a') == 0
+    assert bucket.take('a') == pytest.approx(0.5)
+    # Never more than a burst
+    now[0] += 60
+    assert [bucket.take('a') for _ in range(3)][2] == pytest.approx(0.5)
+
+
+def test_rejected_call_answers_503_with_retry_after(flask_app):
+    class OverloadedIngredientDB:
+        def suggest_ingredients(self, query, limit=5):
+            raise Rejected('weaviate', 'queue_budget', 2.4)
+
+    flask_app.backends.register('ingredient_db', OverloadedIngredientDB)
+    flask_app.backends.initialize()
+    response = flask_app.app.test_client().get('/suggest_ingredients?query=garlic')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+    assert 'weaviate is overloaded' in response.get_json()['error']
@@ -0,0 +1,23 @@
+from backend.autocomplete import AutocompleteIndex, suggest_ingredients
+
+NAMES = ['garlic', 'garlic powder', 'ginger', 'black pepper', 'green beans']
+
+
+def search(query, limit):
+    return [{'properties': {'ingredient': name}} for name in ('Garlic', 'garden peas', 'gravy')][:limit]
+
+
+def test_index_answers_when_it_finds_enough():
+    searched = []
+    names = suggest_ingredients(AutocompleteIndex(NAMES), lambda q, n: searched.append(q) or [], 'g',
+                                limit=3, min_hits=3)
+    assert len(names) == 3 and not searched
+
+
+def test_vector_search_completes_few_index_hits_without_duplicates():
+    names = suggest_ingredients(AutocompleteIndex(NAMES), search, 'garl', limit=4, min_hits=3)
+    assert names == ['garlic', 'garlic powder', 'garden peas', 'gravy']
+
+
+def test_without_index_uses_vector_search():
+    assert suggest_ingredients(None, search, 'ga', limit=2) == ['Garlic', 'garden peas']
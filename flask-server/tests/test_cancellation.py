@@ -0,0 +1,155 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend import LLM, cancellation
+from backend.async_runtime import AsyncRuntime
+from backend.cancellation import CancelRegistry, CancelToken, Cancelled
+from backend.models.base_model import BaseModel
+
+
+class CountingModel(BaseModel):
+    """Streams numbered chunks, recording how many were produced and whether the stream was closed."""
+    provider = 'counting'
+    model = 'test'
+
+    def __init__(self, chunks=100):
+        self.chunks = chunks
+        self.produced = 0
+        self.closed = False
+
+    def chat(self, messages, **kwargs):
+        return ''.join(str(i) for i in range(self.chunks))
+
+    def stream(self, messages, **kwargs):
+        try:
+            for i in range(self.chunks):
+                self.produced += 1
+                yield str(i)
+        finally:
+            self.closed = True
+
+    async def astream(self, messages, **kwargs):
+        try:
+            for i in range(self.chunks):
+                self.produced += 1
+                yield str(i)
+                await asyncio.sleep(0)
+        finally:
+            self.closed = True
+
+    def is_available(self):
+        return True
+
+
+@pytest.fixture
+def counting(monkeypatch):
+    model = CountingModel()
+    monkeypatch.setattr(LLM, 'model', model)
+    return model
+
+
+def cancel_at(token, count):
+    received = []
+
+    def on_token(chunk):
+        received.append(chunk)
+        if len(received) == count:
+            token.cancel('test')
+
+    return received, on_token
+
+
+def test_cancel_mid_stream_stops_generation(counting):
+    token = CancelToken('r1')
+    received, on_token = cancel_at(token, 3)
+    with cancellation.scope(token), pytest.raises(Cancelled):
+        LLM.chat([], on_token=on_token)
+    assert received == ['0', '1', '2']
+    assert counting.produced == 4
+    assert counting.closed
+
+
+def test_cancel_mid_async_stream_stops_generation(counting):
+    token = CancelToken('r1')
+    received, on_token = cancel_at(token, 3)
+
+    async def main():
+        with cancellation.scope(token):
+            await LLM.achat([], on_token=on_token)
+
+    with pytest.raises(Cancelled):
+        asyncio.run(main())
+    assert received == ['0', '1', '2']
+    assert counting.produced == 4
+    assert counting.closed
+
+
+def test_submit_propagates_token_to_executor_threads():
+    token = CancelToken('r1')
+    with ThreadPoolExecutor(max_workers=1) as executor, cancellation.scope(token):
+        assert cancellation.submit(executor, cancellation.current).result() is token
+        # A plain submit runs outside the request's context
+        assert executor.submit(cancellation.current).result() is None
+        token.cancel()
+        with pytest.raises(Cancelled):
+            cancellation.submit(executor, cancellation.check).result()
+
+
+def test_bind_cancels_task_on_runtime_loop():
+    runtime = AsyncRuntime('test-runtime')
+    token = CancelToken('r1')
+    started = []
+
+    async def work():
+        started.append(cancellation.current())
+        await asyncio.sleep(30)
+
+    try:
+        future = runtime.submit(cancellation.bind(token, work()))
+        deadline = time.monotonic() + 5
+        while not started and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert started == [token]
+        token.cancel('client_disconnected')
+        with pytest.raises(Cancelled):
+            future.result(2)
+    finally:
+        runtime.stop()
+
+
+def test_token_runs_callbacks_once():
+    token = CancelToken('r1')
+    calls = []
+    token.on_cancel(lambda: calls.append('a'))
+    remove = token.on_cancel(lambda: calls.append('removed'))
+    remove()
+    assert token.cancel('first')
+    assert not token.cancel('second')
+    assert token.reason == 'first'
+    # Registered after the fact: called at once
+    token.on_cancel(lambda: calls.append('late'))
+    assert calls == ['a', 'late']
+
+
+def test_scope_restores_previous_token():
+    outer, inner = CancelToken('outer'), CancelToken('inner')
+    with cancellation.scope(outer):
+        with cancellation.scope(inner):
+            assert cancellation.current() is inner
+        assert cancellation.current() is outer
+    assert cancellation.current() is None
+
+
+def test_registry_cancels_requests_in_flight():
+    registry = CancelRegistry()
+    with registry.track('r1') as token:
+        assert cancellation.current() is token
+        assert registry.in_flight() == ['r1']
+        assert registry.cancel('r1')
+        with pytest.raises(Cancelled):
+            cancellation.check()
+    assert registry.in_flight() == []
+    assert not registry.cancel('r1')
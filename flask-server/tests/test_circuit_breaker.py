@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from backend.admission import Rejected
+from backend.models.base_model import BaseModel
+from backend.models.circuit_breaker import CircuitBreaker, CircuitBreakerModel, CircuitOpen
+
+
+class FakeModel(BaseModel):
+    supports_structured_output = False
+
+    def __init__(self, provider, responses=None):
+        self.provider = provider
+        self.responses = list(responses or [])
+        self.calls = 0
+
+    def chat(self, messages, **kwargs):
+        self.calls += 1
+        response = self.responses.pop(0) if self.responses else 'ok'
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def stream(self, messages, **kwargs):
+        response = self.chat(messages, **kwargs)
+        if response:
+            yield response
+
+    def is_available(self):
+        return True
+
+
+def test_opens_after_threshold_and_half_opens_after_timeout():
+    breaker = CircuitBreaker('p', failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure('e1')
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure('e2')
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    assert breaker.retry_after() > 0
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.get_stats()['opened'] == 1
+
+
+def test_failed_probe_reopens_and_abandoned_probe_frees_its_slot():
+    breaker = CircuitBreaker('p', failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure('down')
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_abandoned()
+    assert breaker.allow()
+    breaker.record_failure('still down')
+    assert breaker.state == 'open'
+    assert breaker.get_stats()['opened'] == 2
+
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker('p', failure_threshold=2)
+    breaker.record_failure('e')
+    breaker.record_success()
+    breaker.record_failure('e')
+    assert breaker.state == 'closed'
+
+
+def test_open_circuit_fails_fast_without_fallback():
+    inner = FakeModel('primary', ['', ''])
+    model = CircuitBreakerModel(inner, CircuitBreaker('primary', failure_threshold=2, reset_timeout=30))
+    assert model.chat([]) == ''
+    assert model.chat([]) == ''
+    with pytest.raises(CircuitOpen) as raised:
+        model.chat([])
+    assert isinstance(raised.value, Rejected)
+    assert 'circuit open' in str(raised.value)
+    assert inner.calls == 2
+
+
+def test_fails_over_while_open_and_on_errors():
+    inner = FakeModel('primary', [RuntimeError('boom')])
+    fallback = FakeModel('fallback', ['from fallback', 'from fallback'])
+    model = CircuitBreakerModel(inner, CircuitBreaker('primary', failure_threshold=1, reset_timeout=30), fallback)
+    # The failing call is retried on the fallback, then the open circuit sends calls straight there
+    assert model.chat([]) == 'from fallback'
+    assert model.breaker.state == 'open'
+    assert model.chat([]) == 'from fallback'
+    assert inner.calls == 1
+    assert model.provider == 'primary'
+
+
+def test_stream_records_outcomes():
+    inner = FakeModel('primary', ['', 'streamed'])
+    model = CircuitBreakerModel(inner, CircuitBreaker('primary', failure_threshold=1, reset_timeout=0.01))
+    assert list(model.stream([])) == []
+    assert model.breaker.state == 'open'
+    time.sleep(0.02)
+    assert list(model.stream([])) == ['streamed']
+    assert model.breaker.state == 'closed'
@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import pytest
+
+from backend import LLM
+from backend.models.base_model import BaseModel
+
+RECIPE = "<final_output>{'ingredients': ['salt'], 'instructions': ['cook']}</final_output>"
+RECIPE_LIST = "<final_output>[{'recipe': 'Soup', 'description': 'Warm'}]</final_output>"
+
+
+class ScriptedModel(BaseModel):
+    """Answers with the given responses in turn."""
+    provider = 'scripted'
+    model = 'test'
+
+    def __init__(self, responses, structured=False):
+        self.responses = list(responses)
+        self.supports_structured_output = structured
+        self.calls = 0
+
+    def chat(self, messages, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+    def chat_structured(self, messages, schema, name='output', **kwargs):
+        return self.chat(messages)
+
+    def is_available(self):
+        return True
+
+
+@pytest.fixture(autouse=True)
+def no_caches(monkeypatch):
+    monkeypatch.setattr(LLM, 'response_cache', None)
+    monkeypatch.setattr(LLM, 'semantic_cache', None)
+
+
+def test_recipe_is_retried_until_it_parses(monkeypatch):
+    results = []
+    for run in (lambda: LLM._write_recipe([], {}),
+                lambda: asyncio.run(LLM._awrite_recipe([], {}))):
+        scripted = ScriptedModel(['', 'not a recipe', RECIPE])
+        monkeypatch.setattr(LLM, 'model', scripted)
+        results.append(run())
+        assert scripted.calls == 3
+    assert results == [{'ingredients': ['salt'], 'instructions': ['cook']}] * 2
+
+
+def test_recipe_list_reports_entries_with_their_index(monkeypatch):
+    for run in (LLM._create_recipe_list, lambda *args: asyncio.run(LLM._acreate_recipe_list(*args))):
+        monkeypatch.setattr(LLM, 'model', ScriptedModel(['garbage', RECIPE_LIST]))
+        items = []
+        assert run([], {}, None, lambda item, index: items.append((index, item['recipe']))) == [
+            {'recipe': 'Soup', 'description': 'Warm'}]
+        assert items == [(0, 'Soup')]
+
+
+def test_structured_output_is_repaired_then_unwrapped(monkeypatch):
+    monkeypatch.setattr(LLM, 'STRUCTURED_OUTPUT', True)
+    value = {'recipes': [{'recipe': 'Soup', 'description': 'Warm'}]}
+    for run in (LLM._create_recipe_list, lambda *args: asyncio.run(LLM._acreate_recipe_list(*args))):
+        scripted = ScriptedModel(['{"recipes": []}', json.dumps(value)], structured=True)
+        monkeypatch.setattr(LLM, 'model', scripted)
+        assert run([], {}) == value['recipes']
+        assert scripted.calls == 2
+
+
+def test_failure_after_ten_attempts(monkeypatch):
+    for run, failed in ((lambda: LLM._write_recipe([], {}), False),
+                        (lambda: asyncio.run(LLM._acreate_recipe_list([], {})), [])):
+        monkeypatch.setattr(LLM, 'model', ScriptedModel(['nope'] * 10))
+        assert run() == failed
+
+
+def test_async_generation_reports_tokens_by_index(monkeypatch):
+    recipe_list = ("<final_output>[{'recipe': 'Soup', 'description': 'Warm'}, "
+                   "{'recipe': 'Salad', 'description': 'Fresh'}]</final_output>")
+    monkeypatch.setattr(LLM, 'model', ScriptedModel([recipe_list, RECIPE, RECIPE]))
+    tokens = []
+
+    async def main():
+        return [event async for event in LLM.aiter_generated_recipes(
+            ingredients=['kale'], on_token=lambda *token: tokens.append(token))]
+
+    events = asyncio.run(main())
+    assert events[0] == ('recipe_list', [{'recipe': 'Soup', 'description': 'Warm'},
+                                         {'recipe': 'Salad', 'description': 'Fresh'}])
+    assert sorted(index for _, index, _ in events[1:]) == [0, 1]
+    assert {index for index, _ in tokens} == {None, 0, 1}
@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend.models.health_monitor import HealthMonitor
+from backend.models.ollama_model import OllamaModel
+
+
+class StubOllama:
+    """Local HTTP server answering /api/tags and /api/chat like Ollama, counting requests per path."""
+
+    def __init__(self):
+        self.healthy = True
+        self.requests = {}
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                stub.requests[self.path] = stub.requests.get(self.path, 0) + 1
+                if self.path == '/api/tags' and stub.healthy:
+                    self._reply(200, {'models': [{'name': 'stub-model:latest', 'model': 'stub-model:latest'}]})
+                else:
+                    self._reply(500, {'error': 'unavailable'})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.requests[self.path] = stub.requests.get(self.path, 0) + 1
+                self._reply(200, {'model': 'stub-model', 'message': {'role': 'assistant', 'content': 'hello'},
+                                  'done': True})
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def count(self, path):
+        return self.requests.get(path, 0)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubOllama()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def model(stub, monkeypatch):
+    # One check at startup, then only the checks the test runs
+    monkeypatch.setenv('OLLAMA_HEALTH_INTERVAL', '3600')
+    model = OllamaModel(host=stub.url, model='stub-model')
+    deadline = time.monotonic() + 5
+    while model.health.last_checked is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield model
+    model.health.stop()
+
+
+def test_healthy_unhealthy_readmitted(stub, model):
+    assert model.health.is_healthy() is True
+    assert model.chat([{'role': 'user', 'content': 'hi'}]) == 'hello'
+
+    stub.healthy = False
+    assert model.health.refresh() is False
+    assert model.health.is_healthy() is False
+    # Known to be down: chat fails fast without calling the host
+    chats = stub.count('/api/chat')
+    assert model.chat([{'role': 'user', 'content': 'hi'}]) == ''
+    assert stub.count('/api/chat') == chats
+
+    stub.healthy = True
+    assert model.health.refresh() is True
+    assert model.chat([{'role': 'user', 'content': 'hi'}]) == 'hello'
+
+
+def test_chat_does_not_list_models(stub, model):
+    tags = stub.count('/api/tags')
+    for _ in range(5):
+        assert model.chat([{'role': 'user', 'content': 'hi'}]) == 'hello'
+    assert stub.count('/api/tags') == tags
+    assert stub.count('/api/chat') == 5
+
+
+def test_state_expires_to_unknown():
+    monitor = HealthMonitor(lambda: True, interval=3600, ttl=0.05)
+    assert monitor.is_healthy() is None
+    monitor.refresh()
+    assert monitor.is_healthy() is True
+    time.sleep(0.1)
+    assert monitor.is_healthy() is None
+
+
+def test_failing_check_is_unhealthy():
+    def check():
+        raise ConnectionError('refused')
+
+    monitor = HealthMonitor(check)
+    assert monitor.refresh() is False
+    assert monitor.is_healthy() is False
+    assert monitor.last_error == 'refused'
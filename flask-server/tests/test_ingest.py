@@ -0,0 +1,131 @@
+import pandas as pd
+import pytest
+
+from backend.ingest import (INGREDIENT_FIELDS, INGREDIENT_KEY, clean_ingredients, clean_recipes, object_id,
+                            read_chunks, recipe_ingestion)
+from backend.semantic_cache import HashingEmbedder
+from backend.vector_store import NumpyStore
+
+ROWS = 2500
+
+
+def recipes_csv(path, rows=ROWS):
+    pd.DataFrame({
+        'Title': [f"dish {i}" if i % 50 else None for i in range(rows)],
+        'Ingredients': [f"['salt', 'x{i}']" for i in range(rows)],
+        'Instructions': ['cook'] * rows,
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def numpy_store(path, name='Recipe'):
+    store = NumpyStore(name, str(path), embed=HashingEmbedder(dimensions=64), vector_properties=('title',))
+    if not store.exists():
+        store.create(['title', 'ingredients', 'instructions'])
+    return store
+
+
+@pytest.fixture
+def ingestion():
+    def make(store, **kwargs):
+        settings = dict(batch_size=50, workers=3, chunk_size=200, checkpoint_every=400)
+        settings.update(kwargs)
+        return recipe_ingestion(store, **settings)
+    return make
+
+
+@pytest.fixture(autouse=True)
+def sources(tmp_path, monkeypatch):
+    monkeypatch.setenv('RECIPES_SOURCE', recipes_csv(tmp_path / 'recipes.csv'))
+    monkeypatch.setenv('INGEST_CHECKPOINT_DIR', str(tmp_path / 'checkpoints'))
+
+
+def test_import_writes_every_clean_row(tmp_path, ingestion):
+    store = numpy_store(tmp_path / 'store')
+    report = ingestion(store).run(restart=True)
+    expected = sum(1 for i in range(ROWS) if i % 50)
+    assert store.count() == expected
+    assert report['objects_written'] == expected
+    assert report['rows_skipped'] == ROWS - expected
+    assert not ingestion(store).incomplete()
+
+
+def test_interrupted_import_resumes_exactly(tmp_path, ingestion, monkeypatch):
+    store = numpy_store(tmp_path / 'store')
+    add = NumpyStore.add
+    calls = {'n': 0}
+
+    def flaky(self, objects, ids=None):
+        calls['n'] += 1
+        if calls['n'] == 30:
+            raise RuntimeError('crash')
+        return add(self, objects, ids)
+
+    monkeypatch.setattr(NumpyStore, 'add', flaky)
+    with pytest.raises(RuntimeError):
+        ingestion(store).run(restart=True)
+    monkeypatch.setattr(NumpyStore, 'add', add)
+
+    # A new process: only what was flushed at the last checkpoint survived
+    reopened = numpy_store(tmp_path / 'store')
+    resumed = ingestion(reopened)
+    assert resumed.incomplete()
+    state = resumed.checkpoint.load()
+    assert state['rows_done'] % 400 == 0 and state['rows_done'] > 0
+    assert reopened.count() == state['objects_written']
+
+    report = resumed.run()
+    assert report['resumed_from'] == state['rows_done']
+    titles = [properties['title'] for properties in reopened.iter_objects()]
+    assert len(titles) == len(set(titles)) == sum(1 for i in range(ROWS) if i % 50)
+    assert not resumed.incomplete()
+
+
+def test_rerunning_an_import_does_not_duplicate(tmp_path, ingestion):
+    store = numpy_store(tmp_path / 'store')
+    ingestion(store).run(restart=True)
+    count = store.count()
+    ingestion(store).run(restart=True)
+    assert store.count() == count
+
+
+def test_sync_writes_only_changes(tmp_path, ingestion, monkeypatch):
+    store = numpy_store(tmp_path / 'store')
+    ingestion(store).run(restart=True)
+    assert ingestion(store).sync()['unchanged'] == store.count()
+
+    df = pd.read_csv(tmp_path / 'recipes.csv')
+    df.loc[1, 'Instructions'] = 'bake'
+    df = df.drop(index=[2, 3])
+    df.loc[ROWS] = ['new dish', "['pepper']", 'mix']
+    df.to_csv(tmp_path / 'recipes.csv', index=False)
+
+    report = ingestion(store).sync()
+    assert (report['inserted'], report['updated'], report['deleted']) == (1, 1, 2)
+    assert report['objects_written'] == 2
+    by_title = {properties['title']: properties for properties in store.iter_objects()}
+    assert by_title['dish 1']['instructions'] == 'bake'
+    assert 'dish 2' not in by_title and 'new dish' in by_title
+
+
+@pytest.mark.parametrize('skip', [0, 1, 699, 700, 1900, 2999, 3000])
+def test_parquet_resume_skips_exactly(tmp_path, skip):
+    rows = 3000
+    df = pd.DataFrame({'ingredient': [f'ing {i}' for i in range(rows)], 'class': ['food'] * rows})
+    df.to_parquet(tmp_path / 'ingredients.parquet', row_group_size=700)
+    chunks = list(read_chunks(str(tmp_path / 'ingredients.parquet'), 250, skip=skip))
+    names = [name for chunk in chunks for name in chunk['ingredient']]
+    assert names == [f'ing {i}' for i in range(skip, rows)]
+
+
+def test_cleaning_and_ids():
+    recipes = clean_recipes(pd.DataFrame({'Title': [' A ', None], 'Ingredients': ['x', 'y'],
+                                          'Instructions': ['z', 'w']}))
+    assert recipes.to_dict('records') == [{'title': 'A', 'ingredients': 'x', 'instructions': 'z'}]
+    ingredients = clean_ingredients(pd.DataFrame({'ingredient': [' salt ', '', None]}))
+    assert list(ingredients.columns) == INGREDIENT_FIELDS
+    assert list(ingredients['ingredient']) == ['salt']
+
+    first = object_id('Ingredients', {'ingredient': 'Black  Pepper', 'prompt': 'p'}, INGREDIENT_KEY)
+    assert first == object_id('ingredients', {'ingredient': 'black pepper', 'prompt': 'p'}, INGREDIENT_KEY)
+    assert first != object_id('ingredients', {'ingredient': 'black pepper', 'prompt': 'q'}, INGREDIENT_KEY)
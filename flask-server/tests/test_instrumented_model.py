@@ -0,0 +1,55 @@
+import pytest
+
+from backend import LLM, metrics
+from backend.models.base_model import BaseModel
+from backend.models.instrumented_model import InstrumentedModel
+
+
+class BrokenStream(BaseModel):
+    """Streams two chunks, then loses the connection."""
+    provider = 'fake'
+    model = 'broken'
+    supports_structured_output = False
+
+    def chat(self, messages, **kwargs):
+        return ''
+
+    def stream(self, messages, **kwargs):
+        yield 'Hello'
+        yield ' wor'
+        raise ConnectionError('connection reset')
+
+    def is_available(self):
+        return True
+
+
+def calls(outcome):
+    key = metrics.LLM_CALLS._key(dict(provider='fake', model='broken', stage='unknown', method='stream', outcome=outcome))
+    return metrics.LLM_CALLS._values.get(key, 0)
+
+
+def test_stream_failing_midway_is_recorded_as_error():
+    model = InstrumentedModel(BrokenStream())
+    errors, ok = calls('error'), calls('ok')
+    chunks = []
+    with pytest.raises(ConnectionError):
+        for chunk in model.stream([{'role': 'user', 'content': 'hi'}]):
+            chunks.append(chunk)
+    assert chunks == ['Hello', ' wor']
+    assert calls('error') == errors + 1
+    assert calls('ok') == ok
+
+
+def test_chat_keeps_chunks_of_a_failed_stream(monkeypatch):
+    monkeypatch.setattr(LLM, 'model', InstrumentedModel(BrokenStream()))
+    received = []
+    errors = calls('error')
+    assert LLM.chat([{'role': 'user', 'content': 'hi'}], on_token=received.append) == 'Hello wor'
+    assert received == ['Hello', ' wor']
+    assert calls('error') == errors + 1
+
+
+def test_pipeline_metrics_are_labelled_by_provider_and_model(monkeypatch):
+    monkeypatch.setattr(LLM, 'model', InstrumentedModel(BrokenStream()))
+    LLM.record_attempts('test_stage', 2, True)
+    assert any(key[:3] == ('fake', 'broken', 'test_stage') for key in metrics.LLM_ATTEMPTS._values)
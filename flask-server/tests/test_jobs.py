@@ -0,0 +1,56 @@
+import time
+
+from backend.jobs import Job, JobQueue
+
+
+def wait_done(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    version = job.version
+    while not job.done and time.monotonic() < deadline:
+        version = job.wait(version, 0.1)
+    return job.done
+
+
+def test_failing_provider_limit_does_not_kill_workers():
+    calls = {'n': 0}
+
+    def provider_limit(provider):
+        calls['n'] += 1
+        if calls['n'] == 1:
+            raise RuntimeError('limit unavailable')
+        return 1
+
+    queue = JobQueue(workers=1, provider_limit=provider_limit)
+    jobs = [queue.submit(Job(lambda job, i=i: i, 'ollama')) for i in range(3)]
+    assert all(wait_done(job) for job in jobs)
+    assert [job.result for job in jobs] == [0, 1, 2]
+
+
+def test_job_that_breaks_its_worker_fails_and_the_worker_survives(monkeypatch):
+    queue = JobQueue(workers=1)
+    run = JobQueue._run
+
+    def broken(self, job):
+        if job.request.get('break'):
+            raise RuntimeError('worker error')
+        return run(self, job)
+
+    monkeypatch.setattr(JobQueue, '_run', broken)
+    failed = queue.submit(Job(lambda job: 'never', 'ollama', request={'break': True}))
+    assert wait_done(failed)
+    assert failed.status == 'failed' and failed.error == 'worker error'
+
+    later = queue.submit(Job(lambda job: 'ok', 'ollama'))
+    assert wait_done(later)
+    assert later.result == 'ok'
+    assert queue.get_stats()['running'] == {'ollama': 0}
+
+
+def test_finished_jobs_are_purged_on_completion():
+    queue = JobQueue(workers=1, retention=0)
+    job = queue.submit(Job(lambda job: 'ok', 'ollama'))
+    assert wait_done(job)
+    deadline = time.monotonic() + 5
+    while queue.get(job.id) is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.get(job.id) is None
@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+import time
+
+from backend.llm_cache import ResponseCache
+
+
+def cache(path, **kwargs):
+    return ResponseCache(path=str(path), flush_interval=3600, **kwargs)
+
+
+def rows(path):
+    with sqlite3.connect(str(path)) as db:
+        return dict(db.execute('SELECT key, value FROM cache').fetchall())
+
+
+def test_sets_are_written_in_batches(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    responses = cache(path, max_entries=2)
+    for i in range(10):
+        responses.set(f"ns:{i}", {'i': i})
+    assert rows(path) == {}
+    # Rows evicted from the in-process tier are still served before they are written
+    assert responses.get('ns:0') == {'i': 0}
+
+    responses.flush()
+    assert len(rows(path)) == 10
+    responses.close()
+    assert cache(path).get('ns:9') == {'i': 9}
+
+
+def test_expired_rows_are_purged(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    responses = cache(path, purge_every=5)
+    for i in range(3):
+        responses.set(f"old:{i}", i, ttl=-1)
+    responses.flush()
+    assert len(rows(path)) == 3
+
+    for i in range(2):
+        responses.set(f"new:{i}", i)
+    responses.flush()
+    assert set(rows(path)) == {'new:0', 'new:1'}
+    assert responses.get_stats()['purged'] == 3
+
+
+def test_invalidate_drops_pending_rows(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    responses = cache(path)
+    responses.set('a:1', 1)
+    responses.set('b:1', 1)
+    responses.invalidate('a')
+    responses.flush()
+    assert set(rows(path)) == {'b:1'}
+    assert responses.get('a:1') is None
+
+
+def test_background_writer(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    responses = ResponseCache(path=str(path), flush_interval=0.05)
+    responses.set('ns:1', 'value')
+    deadline = time.monotonic() + 5
+    while not rows(path) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert rows(path) == {'ns:1': '"value"'}
+    responses.close()
+
+
+def test_disk_lookup_does_not_hold_the_lock(tmp_path, monkeypatch):
+    path = tmp_path / 'cache.sqlite3'
+    responses = cache(path, max_entries=1)
+    responses.set('ns:disk', 'on disk')
+    responses.flush()
+    responses.set('ns:memory', 'in memory')
+
+    select = ResponseCache._select
+    selecting, release = threading.Event(), threading.Event()
+
+    def slow(self, key):
+        row = select(self, key)
+        selecting.set()
+        release.wait(5)
+        return row
+
+    monkeypatch.setattr(ResponseCache, '_select', slow)
+    result = {}
+    lookup = threading.Thread(target=lambda: result.update(value=responses.get('ns:disk')))
+    lookup.start()
+    assert selecting.wait(5)
+    # Served while the other lookup is still reading the database
+    assert responses.get('ns:memory') == 'in memory'
+    # Deleted after it was read: returned to that lookup, but not kept in memory
+    responses.delete('ns:disk')
+    release.set()
+    lookup.join(5)
+    assert result['value'] == 'on disk'
+    assert 'ns:disk' not in responses._memory
+    responses.close()
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from backend.models.health_monitor import HealthMonitor
+from backend.models.ollama_pool_model import OllamaPoolModel, _PoolMember
+
+
+class FakeHost:
+    """Ollama host stand-in answering after `latency` seconds."""
+
+    def __init__(self, host, latency=0.05, text='x' * 400):
+        self.host = host
+        self.latency = latency
+        self.text = text
+        self.calls = 0
+        self.health = HealthMonitor(lambda: True, interval=3600)
+        self.health.refresh()
+
+    def chat(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.text
+
+    def is_available(self):
+        return True
+
+
+def pool(*hosts):
+    model = OllamaPoolModel.__new__(OllamaPoolModel)
+    model.model = 'stub'
+    model.members = [_PoolMember(host) for host in hosts]
+    model._lock = threading.Lock()
+    return model
+
+
+def concurrent_chats(model, n):
+    threads = [threading.Thread(target=model.chat, args=([],)) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+
+
+def test_first_measured_host_does_not_draw_all_traffic():
+    a, b, c = FakeHost('a'), FakeHost('b'), FakeHost('c')
+    model = pool(a, b, c)
+    model.chat([])
+    assert a.calls == 1 and model.members[0].tokens_per_second
+
+    concurrent_chats(model, 12)
+    # Unmeasured hosts are weighted like the measured ones, so the load spreads
+    assert b.calls >= 3 and c.calls >= 3
+    assert all(member.tokens_per_second for member in model.members)
+
+
+def test_faster_host_takes_more_of_the_load():
+    fast, slow = FakeHost('fast', latency=0.01), FakeHost('slow', latency=0.1)
+    model = pool(fast, slow)
+    for _ in range(3):
+        concurrent_chats(model, 8)
+    assert fast.calls > slow.calls
+
+
+def test_capacity_counts_concurrent_requests():
+    host = FakeHost('a', latency=0.05)
+    model = pool(host)
+    concurrent_chats(model, 4)
+    # Four concurrent 100-token answers in ~0.05s: about 8000 tokens/sec in total, not 2000 per request
+    assert model.members[0].tokens_per_second > 4000
+
+
+def test_unhealthy_host_is_skipped():
+    a, b = FakeHost('a'), FakeHost('b')
+    a.health.mark_unhealthy('down')
+    model = pool(a, b)
+    for _ in range(3):
+        assert model.chat([]) == b.text
+    assert a.calls == 0
@@ -0,0 +1,39 @@
+import threading
+
+from backend import LLM
+
+
+def entry(name):
+    return {'recipe': name, 'description': f"{name} description"}
+
+
+def test_tokens_use_final_indexes_after_a_retry(monkeypatch):
+    final = [entry('c'), entry('a')]
+
+    def create_recipe_list(on_token=None, on_item=None, **request):
+        # The first attempt streams three entries, then fails to parse
+        for index, name in enumerate('abc'):
+            on_item(entry(name), index)
+        for index, recipe_info in enumerate(final):
+            on_item(recipe_info, index)
+        return final
+
+    lock = threading.Lock()
+    tokens = []
+
+    def write_entry(recipe_info, request, on_token=None):
+        on_token(recipe_info['recipe'])
+        return LLM._format_recipe(recipe_info, {'ingredients': [], 'instructions': []})
+
+    def on_token(index, chunk):
+        with lock:
+            tokens.append((index, chunk))
+
+    monkeypatch.setattr(LLM, 'create_recipe_list', create_recipe_list)
+    monkeypatch.setattr(LLM, '_write_entry', write_entry)
+    events = list(LLM.iter_generated_recipes(['salt'], on_token=on_token, pipelined=True, max_workers=1))
+
+    assert events[0] == ('recipe_list', final)
+    assert sorted((index, recipe['name']) for _, index, recipe in events[1:]) == [(0, 'c'), (1, 'a')]
+    # Writes started for the failed attempt stream under its indexes; the final entries under theirs
+    assert {(0, 'c'), (1, 'a')} <= set(tokens)
@@ -0,0 +1,117 @@
+import json
+import time
+
+import pytest
+
+from backend.models.base_model import BaseModel
+from backend.models.replay_model import ReplayModel, exchange_key
+
+
+class Upstream(BaseModel):
+    """Answers with the given responses in turn, streamed in two chunks."""
+    provider = 'upstream'
+    model = 'test'
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+
+    def chat(self, messages, **kwargs):
+        return self.responses.pop(0)
+
+    def stream(self, messages, **kwargs):
+        response = self.chat(messages)
+        yield response[:3]
+        yield response[3:]
+
+    def chat_structured(self, messages, schema, name='output', **kwargs):
+        return self.chat(messages)
+
+    def is_available(self):
+        return True
+
+
+def messages(system='Write a recipe.', user='Soup'):
+    return [{'role': 'system', 'content': system}, {'role': 'user', 'content': user}]
+
+
+@pytest.mark.parametrize('name', ['corpus.jsonl', 'corpus.jsonl.gz'])
+def test_record_then_replay(tmp_path, name):
+    path = str(tmp_path / name)
+    recorder = ReplayModel(Upstream('tomato soup', 'leek soup', '{"a": 1}'), path=path, simulate_latency=False)
+    assert recorder.provider == 'upstream'
+    assert recorder.chat(messages()) == 'tomato soup'
+    assert ''.join(recorder.stream(messages(user='Leek'))) == 'leek soup'
+    assert recorder.chat_structured(messages(), {'type': 'object'}) == '{"a": 1}'
+    assert recorder.get_stats()['recorded'] == 3
+
+    replay = ReplayModel(path=path, simulate_latency=False)
+    assert replay.provider == 'replay' and replay.size() == 3
+    assert replay.chat(messages()) == 'tomato soup'
+    assert list(replay.stream(messages(user='Leek'))) == ['leek', ' sou', 'p']
+    assert replay.chat_structured(messages(), {'type': 'object'}) == '{"a": 1}'
+    assert replay.get_stats()['hits'] == 3
+
+
+def test_repeated_exchanges_replay_in_order(tmp_path):
+    path = str(tmp_path / 'corpus.jsonl')
+    recorder = ReplayModel(Upstream('not a recipe', 'a recipe'), path=path)
+    recorder.chat(messages())
+    recorder.chat(messages())
+
+    replay = ReplayModel(path=path, simulate_latency=False)
+    assert [replay.chat(messages()) for _ in range(3)] == ['not a recipe', 'a recipe', 'not a recipe']
+
+
+def test_unrecorded_request_falls_back_to_same_system_prompt(tmp_path):
+    path = str(tmp_path / 'corpus.jsonl')
+    recorder = ReplayModel(Upstream('tomato soup', 'leek soup'), path=path)
+    recorder.chat(messages(user='Tomato'))
+    recorder.chat(messages(user='Leek'))
+
+    replay = ReplayModel(path=path, simulate_latency=False)
+    fallback = replay.chat(messages(user='Onion'))
+    assert fallback in ('tomato soup', 'leek soup')
+    # Picked deterministically from the request
+    assert ReplayModel(path=path, simulate_latency=False).chat(messages(user='Onion')) == fallback
+    assert replay.chat(messages(system='List recipes.')) == ''
+    stats = replay.get_stats()
+    assert (stats['hits'], stats['fallbacks'], stats['misses']) == (0, 1, 1)
+
+
+def test_stream_closed_early_is_only_replayed_to_streams(tmp_path):
+    path = str(tmp_path / 'corpus.jsonl')
+    recorder = ReplayModel(Upstream('tomato soup'), path=path)
+    stream = recorder.stream(messages())
+    assert next(stream) == 'tom'
+    stream.close()
+
+    replay = ReplayModel(path=path, simulate_latency=False)
+    assert replay.chat(messages()) == ''
+    assert ''.join(replay.stream(messages())) == 'tom'
+
+
+def write_corpus(path, response, latency, ttft):
+    entry = {'key': exchange_key('chat', messages()), 'kind': 'chat', 'system': '', 'response': response,
+             'latency': latency, 'ttft': ttft}
+    with open(path, 'w') as f:
+        f.write(json.dumps(entry) + '\n')
+
+
+def test_chunks_are_paced_by_recorded_latency(tmp_path):
+    path = str(tmp_path / 'corpus.jsonl')
+    write_corpus(path, 'abcdefghijkl', latency=0.4, ttft=0.2)
+
+    replay = ReplayModel(path=path, simulate_latency=True)
+    entry = replay._lookup('chat', messages())
+    assert replay._chunks(entry) == [(0.2, 'abcd'), (pytest.approx(0.1), 'efgh'), (pytest.approx(0.1), 'ijkl')]
+    assert [delay for delay, _ in ReplayModel(path=path, simulate_latency=True, speed=2)._chunks(entry)] == \
+        [0.1, pytest.approx(0.05), pytest.approx(0.05)]
+    assert [delay for delay, _ in ReplayModel(path=path, simulate_latency=False)._chunks(entry)] == [0.0] * 3
+
+    fast = ReplayModel(path=path, simulate_latency=True, speed=4)
+    started = time.perf_counter()
+    arrivals = []
+    for chunk in fast.stream(messages()):
+        arrivals.append(time.perf_counter() - started)
+    assert arrivals[0] >= 0.05
+    assert arrivals[-1] >= 0.1
@@ -0,0 +1,65 @@
+import os
+
+from backend.semantic_cache import HashingEmbedder, SemanticCache
+
+
+def request(i):
+    return {'ingredients': [f'ingredient{i}', 'garlic'], 'cuisine': 'italian'}
+
+
+def cache(path, **kwargs):
+    return SemanticCache(path=str(path), embed=HashingEmbedder(dimensions=64), save_interval=3600, **kwargs)
+
+
+def test_set_does_not_write_until_flushed(tmp_path):
+    path = tmp_path / 'semantic.npz'
+    semantic = cache(path)
+    for i in range(100):
+        semantic.set('ns', request(i), f'value{i}')
+    assert not os.path.exists(path)
+
+    semantic.flush()
+    assert os.path.exists(path)
+    reloaded = cache(path)
+    assert reloaded.get_stats()['entries'] == 100
+    assert reloaded.get('ns', request(42)) == 'value42'
+
+
+def test_growth_keeps_every_entry_searchable(tmp_path):
+    semantic = cache(tmp_path / 'semantic.npz')
+    for i in range(300):
+        semantic.set('ns', request(i), f'value{i}')
+    assert len(semantic._vectors['ns']) >= 300
+    assert all(semantic.get('ns', request(i)) == f'value{i}' for i in (0, 15, 16, 17, 255, 299))
+
+
+def test_full_namespace_evicts_oldest(tmp_path):
+    semantic = cache(tmp_path / 'semantic.npz', max_entries=50)
+    for i in range(120):
+        semantic.set('ns', request(i), f'value{i}')
+        assert semantic.get_stats()['entries'] <= 50
+    assert semantic.get('ns', request(119)) == 'value119'
+    assert 'value0' not in [entry['value'] for entry in semantic._entries['ns']]
+
+
+def test_reloaded_cache_grows_and_evicts(tmp_path):
+    path = tmp_path / 'semantic.npz'
+    semantic = cache(path, max_entries=20)
+    for i in range(20):
+        semantic.set('ns', request(i), f'value{i}')
+    semantic.close()
+
+    reloaded = cache(path, max_entries=20)
+    reloaded.set('ns', request(20), 'value20')
+    assert reloaded.get('ns', request(20)) == 'value20'
+    assert reloaded.get('ns', request(19)) == 'value19'
+    assert reloaded.get_stats()['entries'] <= 20
+
+
+def test_invalidate_is_persisted(tmp_path):
+    path = tmp_path / 'semantic.npz'
+    semantic = cache(path)
+    semantic.set('ns', request(1), 'value1')
+    semantic.flush()
+    semantic.invalidate()
+    assert cache(path).get_stats()['entries'] == 0
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.singleflight import SingleFlight
+
+
+def run_concurrently(n, target):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight('test')
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return 'value'
+
+    threads = run_concurrently(8, lambda: results.append(flights.do('key', slow)))
+    deadline = time.monotonic() + 5
+    while flights.stats['shared'] < 7 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert flights.get_stats()['in_flight'] == 1
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ['value'] * 8
+    assert flights.stats == {'calls': 1, 'shared': 7}
+    assert flights.in_flight() == {}
+
+
+def test_errors_are_shared_and_not_cached():
+    flights = SingleFlight('test')
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        release.wait(5)
+        raise ValueError('boom')
+
+    def call():
+        try:
+            flights.do('key', failing)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = run_concurrently(3, call)
+    deadline = time.monotonic() + 5
+    while flights.stats['shared'] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3 and len({id(e) for e in errors}) == 1
+
+    # The next call runs again
+    assert flights.do('key', lambda: 'ok') == 'ok'
+    assert flights.stats['calls'] == 2
+
+
+def test_different_keys_do_not_share():
+    flights = SingleFlight('test')
+    assert flights.do('a', lambda: 1) == 1
+    assert flights.do('b', lambda: 2) == 2
+    assert flights.stats == {'calls': 2, 'shared': 0}
+
+
+def test_async_calls_share_one_task_and_survive_a_cancelled_waiter():
+    flights = SingleFlight('test')
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'value'
+
+    async def main():
+        first = asyncio.create_task(flights.ado('key', work))
+        second = asyncio.create_task(flights.ado('key', work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 'value'
+    assert calls == [1]
+    assert flights.stats == {'calls': 1, 'shared': 1}
+    assert flights.in_flight() == {}
@@ -0,0 +1,103 @@
+import os
+
+import pandas as pd
+import pytest
+
+from backend.ingest import recipe_ingestion
+from backend.recipe_vector_DB import RecipeDB
+from backend.semantic_cache import HashingEmbedder
+from backend.snapshot import Snapshot, boot_collection
+from backend.vector_store import NumpyStore
+
+ROWS = 1000
+SCHEMA = os.path.join(os.path.dirname(__file__), '..', 'backend', 'schema2.yaml')
+
+
+def recipes_csv(path, rows=ROWS, prefix='dish'):
+    pd.DataFrame({
+        'Title': [f"{prefix} {i}" for i in range(rows)],
+        'Ingredients': [f"['salt', 'x{i}']" for i in range(rows)],
+        'Instructions': ['cook'] * rows,
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def numpy_store(path):
+    return NumpyStore('Recipe', str(path), embed=HashingEmbedder(dimensions=64), vector_properties=('title',))
+
+
+def ingestion(store):
+    return recipe_ingestion(store, batch_size=50, workers=2, chunk_size=100, checkpoint_every=200)
+
+
+@pytest.fixture(autouse=True)
+def settings(tmp_path, monkeypatch):
+    monkeypatch.setenv('INGEST_CHECKPOINT_DIR', str(tmp_path / 'checkpoints'))
+    monkeypatch.setenv('SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    monkeypatch.delenv('INGEST_SYNC_ON_STARTUP', raising=False)
+
+
+def boot(store, load_calls):
+    def load(restart):
+        load_calls.append(restart)
+        ingestion(store).run(restart=restart)
+
+    return boot_collection(store, ingestion(store), lambda: store.create(['title', 'ingredients', 'instructions']),
+                           load, lambda: ingestion(store).sync())
+
+
+def test_snapshot_of_another_source_keeps_interrupted_import(tmp_path, monkeypatch):
+    # A snapshot of the old source
+    monkeypatch.setenv('RECIPES_SOURCE', recipes_csv(tmp_path / 'old.csv', prefix='old'))
+    old = numpy_store(tmp_path / 'old')
+    assert boot(old, [])['path'] == 'import'
+    assert Snapshot(old).exists()
+
+    # An import of the new source, interrupted after its first checkpoints
+    monkeypatch.setenv('RECIPES_SOURCE', recipes_csv(tmp_path / 'new.csv'))
+    store = numpy_store(tmp_path / 'new')
+    store.create(['title', 'ingredients', 'instructions'])
+    add = NumpyStore.add
+    calls = {'n': 0}
+
+    def flaky(self, objects, ids=None):
+        calls['n'] += 1
+        if calls['n'] == 12:
+            raise RuntimeError('crash')
+        return add(self, objects, ids)
+
+    monkeypatch.setattr(NumpyStore, 'add', flaky)
+    with pytest.raises(RuntimeError):
+        ingestion(store).run(restart=True)
+    monkeypatch.setattr(NumpyStore, 'add', add)
+
+    reopened = numpy_store(tmp_path / 'new')
+    rows_done = ingestion(reopened).checkpoint.load()['rows_done']
+    assert rows_done > 0
+
+    load_calls = []
+    report = boot(reopened, load_calls)
+    assert report['path'] == 'resumed_import'
+    assert 'another source' in report['attempts'][0]['error']
+    assert load_calls == [False]
+    titles = [properties['title'] for properties in reopened.iter_objects()]
+    assert sorted(titles) == sorted(f"dish {i}" for i in range(ROWS))
+
+
+def test_sync_refreshes_snapshot(tmp_path, monkeypatch):
+    source = tmp_path / 'recipes.csv'
+    monkeypatch.setenv('RECIPES_SOURCE', recipes_csv(source, rows=300))
+    monkeypatch.setenv('VECTOR_STORE', 'numpy')
+    monkeypatch.setenv('VECTOR_STORE_PATH', str(tmp_path / 'store'))
+    db = RecipeDB(schema_path=SCHEMA)
+    assert db.boot_report['path'] == 'import'
+    assert db.snapshot.manifest()['count'] == 300
+
+    created_at = db.snapshot.manifest()['created_at']
+    assert db.sync()['inserted'] == 0
+    assert db.snapshot.manifest()['created_at'] == created_at
+
+    recipes_csv(source, rows=320)
+    assert db.sync()['inserted'] == 20
+    assert db.snapshot.manifest()['count'] == 320
+    db.close()
@@ -0,0 +1,100 @@
+import importlib
+import threading
+
+import pytest
+
+from backend.startup import BackendNotReady, BackendRegistry
+
+
+def wait_ready(backends):
+    assert backends.ready.wait(5)
+
+
+def test_initializes_in_order_and_times_phases():
+    backends = BackendRegistry()
+    order = []
+    backends.register('first', lambda: order.append('first') or 1)
+    backends.register('second', lambda: order.append('second') or 2)
+    with pytest.raises(BackendNotReady, match='still initializing'):
+        backends.get('first')
+    assert backends.status()['backends'] == {'first': 'initializing', 'second': 'initializing'}
+
+    backends.initialize()
+    assert order == ['first', 'second']
+    assert (backends.get('first'), backends.get('second')) == (1, 2)
+    status = backends.status()
+    assert status['ready'] and status['backends'] == {'first': 'ready', 'second': 'ready'}
+    assert [phase['phase'] for phase in status['phases']] == ['first', 'second']
+
+
+def test_background_start_goes_from_initializing_to_ready():
+    backends = BackendRegistry()
+    release = threading.Event()
+    backends.register('db', lambda: release.wait(5) and 'db')
+    backends.start()
+    assert backends.status()['backends'] == {'db': 'initializing'}
+    assert not backends.is_ready()
+
+    release.set()
+    wait_ready(backends)
+    assert backends.get('db') == 'db'
+    assert backends.is_ready()
+
+
+def test_failed_backend_is_reported_and_others_still_start():
+    backends = BackendRegistry()
+
+    def broken():
+        raise RuntimeError('no database')
+
+    backends.register('broken', broken)
+    backends.register('llm', lambda: 'llm')
+    backends.initialize()
+    assert backends.get('llm') == 'llm'
+    with pytest.raises(BackendNotReady, match='broken failed to initialize: no database'):
+        backends.get('broken')
+    status = backends.status()
+    assert not status['ready']
+    assert status['backends'] == {'broken': 'failed: no database', 'llm': 'ready'}
+
+
+def test_readyz_and_routes_while_initializing(flask_app):
+    release = threading.Event()
+    flask_app.backends.register('ingredient_db', lambda: release.wait(5) and IngredientDB())
+    flask_app.backends.start()
+    client = flask_app.app.test_client()
+
+    assert client.get('/healthz').status_code == 200
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.get_json()['backends'] == {'ingredient_db': 'initializing'}
+    response = client.get('/suggest_ingredients?query=garlic')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert 'still initializing' in response.get_json()['error']
+
+    release.set()
+    wait_ready(flask_app.backends)
+    assert client.get('/readyz').status_code == 200
+    assert client.get('/suggest_ingredients?query=garlic').get_json() == ['Garlic', 'garlic bread']
+
+
+class IngredientDB:
+    def suggest_ingredients(self, query, limit=5):
+        return ['Garlic Bread']
+
+
+@pytest.mark.parametrize('mode, calls', [('eager', ['initialize']), ('manual', []), ('background', ['start'])])
+def test_startup_modes(flask_app, monkeypatch, mode, calls):
+    made = []
+    try:
+        # Importing the app again applies STARTUP_MODE
+        with monkeypatch.context() as patch:
+            patch.setenv('STARTUP_MODE', mode)
+            patch.setattr(BackendRegistry, 'initialize', lambda self: made.append('initialize'))
+            patch.setattr(BackendRegistry, 'start', lambda self: made.append('start'))
+            app = importlib.reload(flask_app)
+            assert list(app.backends._factories) == ['ingredient_db', 'recipe_db', 'llm']
+        assert made == calls
+    finally:
+        importlib.reload(flask_app)
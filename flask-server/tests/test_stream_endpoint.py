@@ -0,0 +1,153 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from backend import LLM, cancellation
+from backend.models.base_model import BaseModel
+
+RECIPE_LIST = ("<final_output>[{'recipe': 'Soup', 'description': 'Warm'}, "
+               "{'recipe': 'Salad', 'description': 'Fresh'}]</final_output>")
+RECIPE = "<final_output>{'ingredients': ['salt'], 'instructions': ['cook']}</final_output>"
+
+
+class KitchenModel(BaseModel):
+    """Streams a recipe list or a recipe in small chunks, depending on the prompt."""
+    provider = 'kitchen'
+    model = 'test'
+
+    def __init__(self, recipe_list=RECIPE_LIST, delay=0.0):
+        self.recipe_list = recipe_list
+        self.delay = delay
+        self.produced = 0
+
+    def _response(self, messages):
+        return self.recipe_list if messages[-1]['content'].startswith('The ingredients') else RECIPE
+
+    def chat(self, messages, **kwargs):
+        return self._response(messages)
+
+    def stream(self, messages, **kwargs):
+        response = self._response(messages)
+        for i in range(0, len(response), 16):
+            time.sleep(self.delay)
+            self.produced += 1
+            yield response[i:i + 16]
+
+    async def astream(self, messages, **kwargs):
+        response = self._response(messages)
+        for i in range(0, len(response), 16):
+            await asyncio.sleep(self.delay)
+            self.produced += 1
+            yield response[i:i + 16]
+
+    def is_available(self):
+        return True
+
+
+@pytest.fixture(params=[False, True], ids=['threads', 'async'])
+def app(flask_app, monkeypatch, request):
+    monkeypatch.setattr(flask_app, 'LLM_ASYNC', request.param)
+    monkeypatch.setattr(LLM, 'response_cache', None)
+    monkeypatch.setattr(LLM, 'semantic_cache', None)
+    monkeypatch.setattr(LLM, 'STRUCTURED_OUTPUT', False)
+    flask_app.backends.register('llm', lambda: LLM)
+    flask_app.backends.initialize()
+    return flask_app
+
+
+def events(body):
+    """(event, data) pairs of an SSE body, with comments as ('comment', text)."""
+    parsed = []
+    for block in body.split('\n\n'):
+        if block.startswith(':'):
+            parsed.append(('comment', block[1:].strip()))
+        elif block:
+            event, data = block.split('\n')
+            parsed.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return parsed
+
+
+def post(app, ingredients=('salt',), **options):
+    return app.app.test_client().post('/generate_recipe/stream',
+                                      json={'ingredients': list(ingredients), **options}, buffered=False)
+
+
+def test_streams_tokens_list_recipes_and_done(app, monkeypatch):
+    monkeypatch.setattr(LLM, 'model', KitchenModel())
+    response = post(app, ingredients=['salt', 'pepper'])
+    assert response.mimetype == 'text/event-stream'
+    stream = events(response.get_data(as_text=True))
+    names = [event for event, _ in stream]
+
+    assert names[-1] == 'done' and stream[-1][1] == {'count': 2}
+    assert names.index('recipe_list') < names.index('recipe')
+    assert stream[names.index('recipe_list')][1] == [{'name': 'Soup', 'description': 'Warm'},
+                                                     {'name': 'Salad', 'description': 'Fresh'}]
+    recipes = {data['index']: data['recipe'] for event, data in stream if event == 'recipe'}
+    assert recipes[0]['name'] == 'Soup' and recipes[1]['name'] == 'Salad'
+    assert recipes[0]['ingredients'] == ['salt']
+
+    tokens = [data for event, data in stream if event == 'token']
+    assert ''.join(token['text'] for token in tokens if token['index'] is None) == RECIPE_LIST
+    assert ''.join(token['text'] for token in tokens if token['index'] == 1) == RECIPE
+
+
+def test_without_tokens(app, monkeypatch):
+    monkeypatch.setattr(LLM, 'model', KitchenModel())
+    stream = events(post(app, ingredients=['basil'], stream_tokens=False).get_data(as_text=True))
+    assert 'token' not in [event for event, _ in stream]
+    assert stream[-1] == ('done', {'count': 2})
+
+
+def test_error_event_when_no_list_is_generated(app, monkeypatch):
+    monkeypatch.setattr(LLM, 'model', KitchenModel(recipe_list='no recipes today'))
+    stream = events(post(app, ingredients=['gravel'], stream_tokens=False).get_data(as_text=True))
+    assert stream == [('error', {'error': 'No recipes could be generated'})]
+
+
+def test_keepalive_while_waiting(app, monkeypatch):
+    monkeypatch.setattr(app, 'SSE_KEEPALIVE', 0.01)
+    monkeypatch.setattr(LLM, 'model', KitchenModel(delay=0.01))
+    stream = events(post(app, ingredients=['thyme']).get_data(as_text=True))
+    assert ('comment', 'keepalive') in stream
+    assert stream[-1] == ('done', {'count': 2})
+
+
+def test_closing_the_response_cancels_the_generation(app, monkeypatch):
+    model = KitchenModel(delay=0.05)
+    monkeypatch.setattr(LLM, 'model', model)
+    response = post(app, ingredients=['saffron'], request_id='closed-early')
+    first = next(response.iter_encoded())
+    assert first.startswith(b'event: token')
+    token = cancellation.registry._tokens['closed-early']
+    response.close()
+
+    assert token.cancelled and token.reason == 'client_disconnect'
+    deadline = time.monotonic() + 5
+    while 'closed-early' in cancellation.registry.in_flight() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not any(t.name == 'generate_recipe_stream' for t in threading.enumerate())
+    # A shared model call still running stops at its next chunk
+    produced = model.produced
+    time.sleep(0.3)
+    assert model.produced <= produced + 1
+
+
+def test_job_generates_recipes(app, monkeypatch):
+    monkeypatch.setattr(LLM, 'model', KitchenModel())
+    client = app.app.test_client()
+    response = client.post('/jobs', json={'ingredients': ['sage']})
+    assert response.status_code == 202
+    location = response.headers['Location']
+
+    deadline = time.monotonic() + 5
+    job = client.get(location).get_json()
+    while job['status'] not in ('succeeded', 'failed') and time.monotonic() < deadline:
+        time.sleep(0.02)
+        job = client.get(location).get_json()
+    assert job['status'] == 'succeeded'
+    assert [recipe['name'] for recipe in job['result']['recipes']] == ['Soup', 'Salad']
+    assert job['progress']['recipes_done'] == 2
@@ -0,0 +1,63 @@
+import pytest
+
+from backend.stream_parser import FinalOutputParser, parse_final_output
+
+RECIPES = ("<think>plan</think><final_output>[{'title': 'Soup', 'ingredients': ['water', 'salt']}, "
+           "{'title': \"Chef's } [cake]\", 'ingredients': ['flour']}]</final_output> trailing")
+
+
+def feed_in_chunks(parser, text, size):
+    for start in range(0, len(text), size):
+        if parser.feed(text[start:start + size]):
+            return start + size
+    return None
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, len(RECIPES)])
+def test_list_items_arrive_as_they_complete(size):
+    seen = []
+    parser = FinalOutputParser('list', validate=lambda item: 'title' in item, on_item=seen.append)
+    stopped_at = feed_in_chunks(parser, RECIPES, size)
+
+    # Generation can stop at the close tag, before the trailing text
+    assert stopped_at is not None and stopped_at < len(RECIPES) + size
+    assert parser.closed
+    assert [item['title'] for item in seen] == ['Soup', "Chef's } [cake]"]
+    assert parser.result() == seen
+
+
+def test_open_tag_split_across_chunks():
+    parser = FinalOutputParser('dict')
+    for chunk in ['noise <final_', 'output>{"title": "A"', '}</final_', 'output>']:
+        parser.feed(chunk)
+    assert parser.closed
+    assert parser.result() == {'title': 'A'}
+
+
+def test_close_tag_inside_string_does_not_close():
+    parser = FinalOutputParser('dict')
+    parser.feed("<final_output>{'title': 'a </final_output> b'")
+    assert not parser.closed
+    parser.feed("}</final_output>")
+    assert parser.closed
+    assert parser.result() == {'title': 'a </final_output> b'}
+
+
+def test_invalid_item_stops_early():
+    parser = FinalOutputParser('list', validate=lambda item: 'title' in item)
+    assert parser.feed("<final_output>[{'name': 'no title'}, ") is True
+    assert parser.error.startswith('invalid recipe entry')
+    assert parser.result() is None
+
+
+def test_fallback_without_tags():
+    assert parse_final_output("Here you go: [{'title': 'Soup'}] enjoy") == [{'title': 'Soup'}]
+    assert parse_final_output("{'title': 'Soup'}", kind='dict') == {'title': 'Soup'}
+
+
+def test_wrong_kind_and_garbage():
+    parser = FinalOutputParser('list')
+    parser.feed("<final_output>{'title': 'Soup'}</final_output>")
+    assert parser.result() is None
+    assert 'expected a non-empty list' in parser.error
+    assert parse_final_output('no output at all') is None
@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+
+from backend.semantic_cache import HashingEmbedder
+from backend.vector_store import NumpyStore
+
+TITLES = ['apple pie', 'garlic bread', 'tomato soup', 'lemon tart']
+
+
+def store(path):
+    numpy_store = NumpyStore('Recipe', str(path), embed=HashingEmbedder(dimensions=64), vector_properties=('title',))
+    numpy_store.create(['title', 'cuisine'])
+    return numpy_store
+
+
+def test_group_counts_and_filters(tmp_path):
+    recipes = store(tmp_path)
+    recipes.add([{'title': title, 'cuisine': 'french' if i % 2 else 'italian'} for i, title in enumerate(TITLES)])
+    assert recipes.group_counts('cuisine') == {'french': 2, 'italian': 2}
+    assert [r['title'] for r in recipes.fetch(10, {'cuisine': 'french'})] == ['garlic bread', 'lemon tart']
+
+
+def test_upsert_keeps_running_queries_consistent(tmp_path):
+    recipes = store(tmp_path)
+    recipes.add([{'title': title} for title in TITLES], ids=[str(i) for i in range(len(TITLES))])
+    recipes.flush()
+
+    # What a query holds once it released the lock
+    with recipes._lock:
+        vectors, objects = recipes._matrix(), recipes._objects
+    before = np.array(vectors)
+    recipes.add([{'title': 'zucchini fritters'}], ids=['0'])
+    assert np.array_equal(vectors, before)
+    assert objects[0]['title'] == 'apple pie'
+
+    hits = recipes.near_text('zucchini fritters', 1)
+    assert hits[0]['properties']['title'] == 'zucchini fritters'
+    assert recipes.count() == len(TITLES)
+
+
+def test_queries_during_upserts(tmp_path):
+    recipes = store(tmp_path)
+    recipes.add([{'title': title} for title in TITLES], ids=[str(i) for i in range(len(TITLES))])
+    embed = recipes.embed
+    query = embed('apple pie')
+    stop = threading.Event()
+    errors = []
+
+    def upsert():
+        i = 0
+        while not stop.is_set():
+            recipes.add([{'title': TITLES[i % len(TITLES)]}], ids=[str((i + 1) % len(TITLES))])
+            i += 1
+
+    writer = threading.Thread(target=upsert)
+    writer.start()
+    try:
+        for _ in range(300):
+            for hit in recipes.near_text('apple pie', 2):
+                # The distance must be the one of the object returned with it
+                expected = 1 - float(embed(hit['properties']['title']) @ query)
+                if abs(hit['distance'] - expected) > 1e-5:
+                    errors.append(hit)
+    finally:
+        stop.set()
+        writer.join(5)
+    assert not errors